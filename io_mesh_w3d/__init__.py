@@ -6,6 +6,7 @@ from bpy.props import (
     PointerProperty,
     BoolProperty,
     EnumProperty,
+    FloatProperty,
     IntProperty,
     StringProperty,
 )
@@ -370,11 +371,58 @@ class ExportW3D(bpy.types.Operator, ExportHelper, ReportHelper):
         description='Remove duplicate reference meshes before export',
         default=False)
 
+    reuse_linked_mesh_data: BoolProperty(
+        name='Reuse linked mesh data',
+        description='Process objects sharing the same mesh data and modifiers only once and export every object with that data',
+        default=False)
+
     build_new_aabtree: BoolProperty(
         name='Export new AABTree',
         description='Force regeneration of the AABTree chunk',
         default=True)
 
+    exact_bounding_sphere: BoolProperty(
+        name='Exact bounding spheres',
+        description='Compute the minimal bounding sphere of each mesh instead of a fast approximation',
+        default=False)
+
+    optimize_vertex_cache: BoolProperty(
+        name='Optimize vertex cache',
+        description='Reorder triangles and vertices for better GPU vertex cache reuse',
+        default=False)
+
+    incremental_export: BoolProperty(
+        name='Reuse unchanged meshes',
+        description='Keep processed meshes between exports and only rebuild the ones that changed',
+        default=False)
+
+    batch_static_meshes: BoolProperty(
+        name='Batch static meshes',
+        description='Merge rigid meshes sharing a bone, materials and geometry flags into one mesh to save draw calls',
+        default=False)
+
+    generated_lod_count: IntProperty(
+        name='Generated LODs',
+        description='Number of simplified LOD levels generated for every mesh of the HLod',
+        default=0,
+        min=0,
+        max=3)
+
+    terrain_tile_count: IntProperty(
+        name='Terrain tiles',
+        description='Split terrain meshes into a grid with this many tiles per side, '
+                    'each tile gets its own bounding volumes and AABBTree',
+        default=1,
+        min=1,
+        max=16)
+
+    lod_triangle_ratio: FloatProperty(
+        name='LOD triangle ratio',
+        description='Share of triangles every generated LOD level keeps of the previous one',
+        default=0.5,
+        min=0.05,
+        max=0.95)
+
     existing_skeleton_path: StringProperty(
         name='Existing skeleton',
         description='Path to an existing .w3d skeleton file',
@@ -400,6 +448,11 @@ class ExportW3D(bpy.types.Operator, ExportHelper, ReportHelper):
         description='Display a popup with all export log messages when the process completes',
         default=False)
 
+    sync_output: BoolProperty(
+        name='Flush files to disk',
+        description='Wait until the exported file is physically written before replacing the previous file',
+        default=False)
+
     will_save_settings: BoolProperty(default=False)
 
     PERSISTED_PROPS = (
@@ -415,10 +468,19 @@ class ExportW3D(bpy.types.Operator, ExportHelper, ReportHelper):
         'apply_modifiers',
         'optimize_collision',
         'deduplicate_reference_meshes',
+        'reuse_linked_mesh_data',
         'build_new_aabtree',
+        'exact_bounding_sphere',
+        'optimize_vertex_cache',
+        'incremental_export',
+        'batch_static_meshes',
+        'generated_lod_count',
+        'lod_triangle_ratio',
+        'terrain_tile_count',
         'animation_frame_start',
         'animation_frame_end',
         'export_review_log',
+        'sync_output',
     )
 
     scene_key = 'w3dExportSettings'
@@ -462,10 +524,19 @@ class ExportW3D(bpy.types.Operator, ExportHelper, ReportHelper):
             'apply_modifiers': self.apply_modifiers,
             'optimize_collision': self.optimize_collision,
             'deduplicate_reference_meshes': self.deduplicate_reference_meshes,
+            'reuse_linked_mesh_data': self.reuse_linked_mesh_data,
             'build_new_aabtree': self.build_new_aabtree,
+            'exact_bounding_sphere': self.exact_bounding_sphere,
+            'optimize_vertex_cache': self.optimize_vertex_cache,
+            'incremental_export': self.incremental_export,
+            'batch_static_meshes': self.batch_static_meshes,
+            'generated_lod_count': self.generated_lod_count,
+            'lod_triangle_ratio': self.lod_triangle_ratio,
+            'terrain_tile_count': self.terrain_tile_count,
             'existing_skeleton_path': self.existing_skeleton_path if self.use_existing_skeleton else '',
             'force_vertex_materials': self.force_vertex_materials,
             'frame_range': (self.animation_frame_start, self.animation_frame_end),
+            'sync_output': self.sync_output,
         }
 
         result = save_data(self, export_settings)
@@ -504,6 +575,8 @@ class ExportW3D(bpy.types.Operator, ExportHelper, ReportHelper):
         col = self.layout.box().column()
         col.prop(self, 'export_mode')
         col.prop(self, 'export_review_log')
+        if self.file_format == 'W3D':
+            col.prop(self, 'sync_output')
 
     def draw_processing_settings(self):
         col = self.layout.box().column()
@@ -512,7 +585,19 @@ class ExportW3D(bpy.types.Operator, ExportHelper, ReportHelper):
         col.prop(self, 'smooth_vertex_normals')
         col.prop(self, 'optimize_collision')
         col.prop(self, 'deduplicate_reference_meshes')
+        if not self.deduplicate_reference_meshes:
+            col.prop(self, 'reuse_linked_mesh_data')
         col.prop(self, 'build_new_aabtree')
+        col.prop(self, 'exact_bounding_sphere')
+        col.prop(self, 'optimize_vertex_cache')
+        col.prop(self, 'incremental_export')
+        if self.export_mode in {'HM', 'HAM'}:
+            col.prop(self, 'batch_static_meshes')
+            col.prop(self, 'generated_lod_count')
+            if self.generated_lod_count > 0:
+                col.prop(self, 'lod_triangle_ratio')
+        if self.export_mode == 'TERRAIN':
+            col.prop(self, 'terrain_tile_count')
 
     def draw_use_existing_skeleton(self):
         col = self.layout.box().column()
@@ -552,6 +637,19 @@ class ImportW3D(bpy.types.Operator, ImportHelper, ReportHelper):
         name='Keep rigid meshes static',
         description='Reuse existing rigid meshes instead of reparenting them when importing animation data',
         default=False)
+    share_identical_meshes: BoolProperty(
+        name='Share identical meshes',
+        description='Link meshes with identical geometry and materials to one mesh datablock, '
+                    'every object keeps its own name, transform and settings',
+        default=False)
+    reuse_materials: EnumProperty(
+        name='Reuse materials',
+        description='Create materials that are identical in content only once',
+        items=[
+            ('NONE', 'Off', 'Every mesh gets its own materials'),
+            ('IMPORT', 'Per import', 'Identical materials are shared within one import'),
+            ('SESSION', 'Per session', 'Identical materials are shared with earlier imports of this session')],
+        default='NONE')
     write_import_log: BoolProperty(
         name='Write import log',
         description='Write a sidecar log file with import messages and imported object state for version comparisons',
@@ -634,6 +732,8 @@ class ImportW3D(bpy.types.Operator, ImportHelper, ReportHelper):
     def draw(self, context):
         layout = self.layout
         layout.prop(self, 'keep_rigid_meshes_static')
+        layout.prop(self, 'share_identical_meshes')
+        layout.prop(self, 'reuse_materials')
         layout.prop(self, 'write_import_log')
 
 
@@ -1144,6 +1244,7 @@ class MESH_PROPERTIES_PANEL_PT_w3d(Panel):
         export_box.label(text='Export Options')
         export_box.prop(settings, 'export_transform')
         export_box.prop(settings, 'export_geometry')
+        export_box.prop(settings, 'allow_batching')
         if hlod_role == 'LOD':
             export_box.prop(settings, 'geometry_type')
         else:
@@ -174,6 +174,12 @@ class Mesh:
 
         # non struct properties
         self.multi_bone_skinned = False
+        self.lod_level = 0
+        self.lod_source = ''
+        self.batched_meshes = []
+        self.tile_source = ''
+        # serialized chunk data of the lists with the same name, created in the processing stage of the export
+        self.packed_data = dict()
 
     def validate(self, context):
         if len(self.header.mesh_name) >= STRING_LENGTH and context.file_format == 'W3D':
@@ -208,6 +214,13 @@ class Mesh:
     def identifier(self):
         return self.header.container_name + '.' + self.name()
 
+    def write_data(self, name, io_stream, write_func):
+        packed = self.packed_data.get(name)
+        if packed is not None:
+            io_stream.write(packed)
+        else:
+            write_list(getattr(self, name), io_stream, write_func)
+
     def get_material_pass(self):
         if not self.material_passes:
             mat_pass = MaterialPass(shader_material_ids=[0])
@@ -222,12 +235,12 @@ class Mesh:
             (chunk_type, chunk_size, subchunk_end) = read_chunk_head(io_stream)
 
             if chunk_type == W3D_CHUNK_VERTICES:
-                result.verts = read_list(io_stream, subchunk_end, read_vector)
+                result.verts = read_vector_list(io_stream, subchunk_end)
             elif chunk_type == W3D_CHUNK_VERTICES_2:
                 context.info('-> vertices 2 chunk is not supported')
                 io_stream.seek(chunk_size, 1)
             elif chunk_type == W3D_CHUNK_VERTEX_NORMALS:
-                result.normals = read_list(io_stream, subchunk_end, read_vector)
+                result.normals = read_vector_list(io_stream, subchunk_end)
             elif chunk_type == W3D_CHUNK_NORMALS_2:
                 context.info('-> normals 2 chunk is not supported')
                 io_stream.seek(chunk_size, 1)
@@ -238,7 +251,7 @@ class Mesh:
             elif chunk_type == W3D_CHUNK_MESH_HEADER:
                 result.header = MeshHeader.read(io_stream)
             elif chunk_type == W3D_CHUNK_TRIANGLES:
-                result.triangles = read_list(io_stream, subchunk_end, Triangle.read)
+                result.triangles = TriangleBuffer.read(io_stream, subchunk_end)
             elif chunk_type == W3D_CHUNK_VERTEX_SHADE_INDICES:
                 result.shade_ids = read_list(io_stream, subchunk_end, read_long)
             elif chunk_type == W3D_CHUNK_MATERIAL_INFO:
@@ -293,7 +306,7 @@ class Mesh:
             size += vec_list_size(self.normals_2)
         size += vec_list_size(self.tangents)
         size += vec_list_size(self.bitangents)
-        size += list_size(self.triangles)
+        size += triangles_size(self.triangles)
         size += list_size(self.vert_infs)
         size += list_size(self.shaders)
         size += list_size(self.textures)
@@ -327,29 +340,32 @@ class Mesh:
             write_string(self.user_text, io_stream)
 
         write_chunk_head(W3D_CHUNK_VERTICES, io_stream, vec_list_size(self.verts, False))
-        write_list(self.verts, io_stream, write_vector)
+        self.write_data('verts', io_stream, write_vector)
 
         if self.multi_bone_skinned and self.verts_2:
             write_chunk_head(W3D_CHUNK_VERTICES_2, io_stream, vec_list_size(self.verts_2, False))
-            write_list(self.verts_2, io_stream, write_vector)
+            self.write_data('verts_2', io_stream, write_vector)
 
         write_chunk_head(W3D_CHUNK_VERTEX_NORMALS, io_stream, vec_list_size(self.normals, False))
-        write_list(self.normals, io_stream, write_vector)
+        self.write_data('normals', io_stream, write_vector)
 
         if self.multi_bone_skinned and self.normals_2:
             write_chunk_head(W3D_CHUNK_NORMALS_2, io_stream, vec_list_size(self.normals_2, False))
-            write_list(self.normals_2, io_stream, write_vector)
+            self.write_data('normals_2', io_stream, write_vector)
 
         if self.tangents:
             write_chunk_head(W3D_CHUNK_TANGENTS, io_stream, vec_list_size(self.tangents, False))
-            write_list(self.tangents, io_stream, write_vector)
+            self.write_data('tangents', io_stream, write_vector)
 
         if self.bitangents:
             write_chunk_head(W3D_CHUNK_BITANGENTS, io_stream, vec_list_size(self.bitangents, False))
-            write_list(self.bitangents, io_stream, write_vector)
+            self.write_data('bitangents', io_stream, write_vector)
 
-        write_chunk_head(W3D_CHUNK_TRIANGLES, io_stream, list_size(self.triangles, False))
-        write_list(self.triangles, io_stream, Triangle.write)
+        write_chunk_head(W3D_CHUNK_TRIANGLES, io_stream, triangles_size(self.triangles, False))
+        if isinstance(self.triangles, TriangleBuffer):
+            self.triangles.write(io_stream)
+        else:
+            write_list(self.triangles, io_stream, Triangle.write)
 
         if self.vert_infs:
             write_chunk_head(W3D_CHUNK_VERTEX_INFLUENCES, io_stream, list_size(self.vert_infs, False))
@@ -357,7 +373,7 @@ class Mesh:
 
         if self.shade_ids:
             write_chunk_head(W3D_CHUNK_VERTEX_SHADE_INDICES, io_stream, long_list_size(self.shade_ids, False))
-            write_list(self.shade_ids, io_stream, write_long)
+            self.write_data('shade_ids', io_stream, write_long)
 
         if self.mat_info is not None:
             self.mat_info.write(io_stream)
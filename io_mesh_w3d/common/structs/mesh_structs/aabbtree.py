@@ -144,6 +144,8 @@ class AABBTree:
         self.header = header
         self.poly_indices = poly_indices if poly_indices is not None else []
         self.nodes = nodes if nodes is not None else []
+        # serialized chunk data of the lists with the same name, created in the processing stage of the export
+        self.packed_data = dict()
 
     @staticmethod
     def read(context, io_stream, chunk_end):
@@ -175,14 +177,21 @@ class AABBTree:
 
         if self.poly_indices:
             write_chunk_head(W3D_CHUNK_AABBTREE_POLYINDICES, io_stream, long_list_size(self.poly_indices, False))
-            write_list(self.poly_indices, io_stream, write_long)
+            self.write_data('poly_indices', io_stream, write_long)
 
         if self.nodes:
             write_chunk_head(
                 W3D_CHUNK_AABBTREE_NODES,
                 io_stream,
                 list_size(self.nodes, False))
-            write_list(self.nodes, io_stream, AABBTreeNode.write)
+            self.write_data('nodes', io_stream, AABBTreeNode.write)
+
+    def write_data(self, name, io_stream, write_func):
+        packed = self.packed_data.get(name)
+        if packed is not None:
+            io_stream.write(packed)
+        else:
+            write_list(getattr(self, name), io_stream, write_func)
 
     @staticmethod
     def parse(xml_aabbtree):
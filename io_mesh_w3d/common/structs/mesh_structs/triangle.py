@@ -1,8 +1,11 @@
 # <pep8 compliant>
 # Written by Stephan Vedder and Michael Schnabel
 
+import numpy as np
 from mathutils import Vector
 from io_mesh_w3d.w3d.io_binary import *
+from io_mesh_w3d.w3d.utils.helpers import list_size
+from io_mesh_w3d.common.utils.mesh_processing import TRIANGLE_DTYPE
 from io_mesh_w3d.w3x.io_xml import *
 
 
@@ -40,6 +43,9 @@ surface_types = [
     'UnderwaterDirt',
     'UnderwaterTiberiumDirt']
 
+# int face attribute holding the surface type index + 1, faces with 0 keep the surface type of their material
+SURFACE_TYPE_ATTRIBUTE = 'w3d_surface_type'
+
 
 class Triangle:
     def __init__(self, vert_ids=None, surface_type=13, normal=Vector((0.0, 0.0, 0.0)), distance=0.0):
@@ -105,3 +111,145 @@ class Triangle:
         create_vector(self.normal, triangle, 'Nrm')
         xml_distance = create_node(triangle, 'Dist')
         xml_distance.text = format(self.distance)
+
+
+class TriangleView(Triangle):
+    """Triangle backed by one record of a TriangleBuffer, assigning to its fields writes to the buffer.
+
+    The fields are read from the buffer on access, so vert_ids and normal are fresh copies every time.
+    """
+
+    def __init__(self, buffer, index):
+        self._buffer = buffer
+        self._index = index
+
+    def _field(self, name):
+        return self._buffer.data[name]
+
+    @property
+    def vert_ids(self):
+        return self._field('vert_ids')[self._index].tolist()
+
+    @vert_ids.setter
+    def vert_ids(self, value):
+        self._field('vert_ids')[self._index] = value
+
+    @property
+    def surface_type(self):
+        return int(self._field('surface_type')[self._index])
+
+    @surface_type.setter
+    def surface_type(self, value):
+        self._field('surface_type')[self._index] = value
+
+    @property
+    def normal(self):
+        return Vector(self._field('normal')[self._index].tolist())
+
+    @normal.setter
+    def normal(self, value):
+        self._field('normal')[self._index] = tuple(value)
+
+    @property
+    def distance(self):
+        return float(self._field('distance')[self._index])
+
+    @distance.setter
+    def distance(self, value):
+        self._field('distance')[self._index] = value
+
+
+class TriangleBuffer:
+    """Array backed list of triangles, indexing and iterating yields TriangleView objects."""
+
+    def __init__(self, vert_ids, surface_types, normals, distances):
+        self.data = np.zeros(len(vert_ids), dtype=TRIANGLE_DTYPE)
+        self.data['vert_ids'] = vert_ids
+        self.data['surface_type'] = surface_types
+        self.data['normal'] = normals
+        self.data['distance'] = distances
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        # negative indices are resolved here, so a view keeps pointing at the same record
+        index = range(len(self.data))[index]
+        if isinstance(index, range):
+            return [TriangleView(self, i) for i in index]
+        return TriangleView(self, index)
+
+    def __setitem__(self, index, triangle):
+        index = range(len(self.data))[index]
+        if isinstance(index, range):
+            raise TypeError('slice assignment is not supported by TriangleBuffer')
+        view = TriangleView(self, index)
+        view.vert_ids = triangle.vert_ids
+        view.surface_type = triangle.surface_type
+        view.normal = triangle.normal
+        view.distance = triangle.distance
+
+    def __iter__(self):
+        for index in range(len(self.data)):
+            yield TriangleView(self, index)
+
+    @property
+    def vert_ids(self):
+        return self.data['vert_ids']
+
+    @property
+    def surface_types(self):
+        return self.data['surface_type']
+
+    def reorder(self, order, vertex_remap):
+        self.data = self.data[order]
+        self.data['vert_ids'] = vertex_remap[self.data['vert_ids']]
+
+    @staticmethod
+    def read(io_stream, chunk_end):
+        # the chunk has the same layout as the records, no Triangle is created while reading
+        data = io_stream.read(chunk_end - io_stream.tell())
+        count = len(data) // TRIANGLE_DTYPE.itemsize
+        records = np.frombuffer(data, dtype=TRIANGLE_DTYPE, count=count)
+        return TriangleBuffer(records['vert_ids'], records['surface_type'], records['normal'], records['distance'])
+
+    @staticmethod
+    def from_triangles(triangles):
+        if isinstance(triangles, TriangleBuffer):
+            return triangles
+        return TriangleBuffer(
+            [tri.vert_ids for tri in triangles],
+            [tri.surface_type for tri in triangles],
+            [tuple(tri.normal) for tri in triangles],
+            [tri.distance for tri in triangles])
+
+    @staticmethod
+    def concatenate(buffers, vertex_offsets):
+        data = np.concatenate([buffer.data for buffer in buffers])
+        start = 0
+        for buffer, offset in zip(buffers, vertex_offsets):
+            data['vert_ids'][start:start + len(buffer)] += offset
+            start += len(buffer)
+        return TriangleBuffer(data['vert_ids'], data['surface_type'], data['normal'], data['distance'])
+
+    def set_surface_type(self, indices, name):
+        if name not in surface_types:
+            return
+        self.data['surface_type'][indices] = surface_types.index(name)
+
+    def size(self, include_head=True):
+        if len(self.data) == 0:
+            return 0
+        size = self.data.nbytes
+        if include_head:
+            size += HEAD
+        return size
+
+    def write(self, io_stream):
+        io_stream.write(self.data.tobytes())
+
+
+def triangles_size(triangles, include_head=True):
+    if isinstance(triangles, TriangleBuffer):
+        return triangles.size(include_head)
+    return list_size(triangles, include_head)
@@ -1,7 +1,9 @@
 # <pep8 compliant>
 # Written by Stephan Vedder and Michael Schnabel
 
+import numpy as np
 from io_mesh_w3d.w3d.io_binary import *
+from io_mesh_w3d.w3d.utils.helpers import list_size, write_list
 from io_mesh_w3d.w3x.io_xml import *
 
 
@@ -82,3 +84,66 @@ class RGBA:
 
     def __str__(self):
         return f'RGBA({self.r}, {self.g}, {self.b}, {self.a})'
+
+
+class RGBABuffer:
+    """Array backed list of colors, the data is packed like the W3D color chunks."""
+
+    def __init__(self, data):
+        self.data = np.ascontiguousarray(data, dtype=np.uint8).reshape(-1, 4)
+
+    @staticmethod
+    def from_colors(colors, scale=255):
+        # truncated like RGBA(vec) does
+        colors = np.clip(np.asarray(colors, dtype=np.float32).reshape(-1, 4) * scale, 0, 255)
+        return RGBABuffer(colors.astype(np.uint8))
+
+    @staticmethod
+    def read(io_stream, chunk_end):
+        data = io_stream.read(chunk_end - io_stream.tell())
+        return RGBABuffer(np.frombuffer(data, dtype=np.uint8, count=len(data) // 4 * 4))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        r, g, b, a = self.data[index].tolist()
+        return RGBA(r=r, g=g, b=b, a=a)
+
+    def __iter__(self):
+        for index in range(len(self.data)):
+            yield self[index]
+
+    def to_vector_rgba(self, scale=255.0):
+        return self.data.astype(np.float32) / scale
+
+    def take(self, order):
+        return RGBABuffer(self.data[order])
+
+    @staticmethod
+    def concatenate(buffers):
+        return RGBABuffer(np.concatenate([buffer.data for buffer in buffers]))
+
+    def size(self, include_head=True):
+        if len(self.data) == 0:
+            return 0
+        size = self.data.nbytes
+        if include_head:
+            size += HEAD
+        return size
+
+    def write(self, io_stream):
+        io_stream.write(self.data.tobytes())
+
+
+def rgba_list_size(colors, include_head=True):
+    if isinstance(colors, RGBABuffer):
+        return colors.size(include_head)
+    return list_size(colors, include_head)
+
+
+def write_rgba_list(colors, io_stream):
+    if isinstance(colors, RGBABuffer):
+        colors.write(io_stream)
+    else:
+        write_list(colors, io_stream, RGBA.write)
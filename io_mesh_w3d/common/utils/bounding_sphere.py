@@ -0,0 +1,132 @@
+# <pep8 compliant>
+# Bounding sphere computation on plain coordinate arrays.
+
+import numpy as np
+
+RITTER_MAX_ITERATIONS = 64
+EPSILON = 1e-7
+
+
+def _as_points(points):
+    points = np.asarray(points, dtype=np.float64)
+    return points.reshape(-1, 3)
+
+
+def ritter_sphere(points):
+    """Approximate bounding sphere (Ritter) of an (n, 3) point array."""
+    points = _as_points(points)
+    if len(points) == 0:
+        return np.zeros(3), 0.0
+
+    x = points[np.argmax(((points - points[0]) ** 2).sum(axis=1))]
+    y = points[np.argmax(((points - x) ** 2).sum(axis=1))]
+    center = (x + y) * 0.5
+    radius = float(np.sqrt(((x - y) ** 2).sum())) * 0.5
+
+    # grow the sphere towards the farthest outlier until every point is inside
+    for _ in range(RITTER_MAX_ITERATIONS):
+        dist_sq = ((points - center) ** 2).sum(axis=1)
+        index = int(np.argmax(dist_sq))
+        dist = float(np.sqrt(dist_sq[index]))
+        if dist <= radius:
+            break
+        delta = (dist - radius) * 0.5
+        center = center + (points[index] - center) * (delta / dist)
+        radius += delta
+
+    radius = max(radius, float(np.sqrt(((points - center) ** 2).sum(axis=1).max())))
+    return center, radius
+
+
+def _sphere_from_boundary(boundary):
+    count = len(boundary)
+    if count == 1:
+        return boundary[0].copy(), 0.0
+    if count == 2:
+        center = (boundary[0] + boundary[1]) * 0.5
+        return center, float(((boundary[0] - center) ** 2).sum())
+    if count == 3:
+        return _circumsphere_3(*boundary)
+    return _circumsphere_4(*boundary)
+
+
+def _circumsphere_3(a, b, c):
+    ab = b - a
+    ac = c - a
+    normal = np.cross(ab, ac)
+    denom = 2.0 * (normal ** 2).sum()
+    if denom < EPSILON * EPSILON:
+        # collinear: the sphere spanned by the two farthest points
+        return _largest_pair_sphere((a, b, c))
+    offset = ((ab ** 2).sum() * np.cross(ac, normal) + (ac ** 2).sum() * np.cross(normal, ab)) / denom
+    return a + offset, float((offset ** 2).sum())
+
+
+def _circumsphere_4(a, b, c, d):
+    matrix = np.array([b - a, c - a, d - a])
+    rhs = 0.5 * np.array([(matrix[0] ** 2).sum(), (matrix[1] ** 2).sum(), (matrix[2] ** 2).sum()])
+    if abs(np.linalg.det(matrix)) < EPSILON:
+        # coplanar: fall back to the smallest three point sphere containing all four
+        best = None
+        for tri, other in (((a, b, c), d), ((a, b, d), c), ((a, c, d), b), ((b, c, d), a)):
+            center, radius_sq = _circumsphere_3(*tri)
+            if _contains(center, radius_sq, other) and (best is None or radius_sq < best[1]):
+                best = (center, radius_sq)
+        return best if best is not None else _largest_pair_sphere((a, b, c, d))
+    offset = np.linalg.solve(matrix, rhs)
+    return a + offset, float((offset ** 2).sum())
+
+
+def _largest_pair_sphere(candidates):
+    best = None
+    for i in range(len(candidates)):
+        for j in range(i + 1, len(candidates)):
+            sphere = _sphere_from_boundary((candidates[i], candidates[j]))
+            if best is None or sphere[1] > best[1]:
+                best = sphere
+    return best
+
+
+def _contains(center, radius_sq, point):
+    return ((point - center) ** 2).sum() <= radius_sq * (1.0 + EPSILON) + EPSILON
+
+
+def _next_outside(points, start, stop, center, radius_sq):
+    if start >= stop:
+        return -1
+    dist_sq = ((points[start:stop] - center) ** 2).sum(axis=1)
+    outside = np.flatnonzero(dist_sq > radius_sq * (1.0 + EPSILON) + EPSILON)
+    if len(outside) == 0:
+        return -1
+    return start + int(outside[0])
+
+
+def _welzl(points, stop, boundary):
+    center, radius_sq = _sphere_from_boundary(boundary)
+    if len(boundary) == 4:
+        return center, radius_sq
+
+    index = _next_outside(points, 0, stop, center, radius_sq)
+    while index >= 0:
+        center, radius_sq = _welzl(points, index, boundary + [points[index]])
+        index = _next_outside(points, index + 1, stop, center, radius_sq)
+    return center, radius_sq
+
+
+def minimal_sphere(points, seed=0):
+    """Exact minimal bounding sphere (randomized incremental Welzl) of an (n, 3) point array."""
+    points = _as_points(points)
+    if len(points) == 0:
+        return np.zeros(3), 0.0
+
+    points = np.unique(points, axis=0)
+    np.random.default_rng(seed).shuffle(points)
+
+    center, radius_sq = _sphere_from_boundary([points[0]])
+    index = _next_outside(points, 1, len(points), center, radius_sq)
+    while index >= 0:
+        center, radius_sq = _welzl(points, index, [points[index]])
+        index = _next_outside(points, index + 1, len(points), center, radius_sq)
+
+    radius = float(np.sqrt(((points - center) ** 2).sum(axis=1).max()))
+    return center, radius
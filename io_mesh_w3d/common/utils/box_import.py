@@ -6,7 +6,7 @@ from io_mesh_w3d.common.utils.helpers import *
 from io_mesh_w3d.common.structs.collision_box import *
 
 
-def create_box(box, coll):
+def create_box(box, coll, links=None):
     x = box.extend[0] / 2.0
     y = box.extend[1] / 2.0
     z = box.extend[2]
@@ -43,7 +43,7 @@ def create_box(box, coll):
     mat.diffuse_color = box.color.to_vector_rgba()
     cube.materials.append(mat)
     box_object.location = box.center
-    link_object_to_active_scene(box_object, coll)
+    link_object_to_active_scene(box_object, coll, links)
 
 
 def rig_box(box, hierarchy, rig, sub_object):
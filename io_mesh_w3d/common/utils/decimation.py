@@ -0,0 +1,190 @@
+# <pep8 compliant>
+# Quadric error metric simplification of triangle index buffers.
+
+import heapq
+
+import numpy as np
+
+# collapses that turn a remaining triangle further than this (cosine) are rejected
+MIN_NORMAL_COSINE = 0.2
+
+
+def face_normals(positions, indices):
+    """Return the unit normals and the doubled areas of the (n, 3) triangles."""
+    corners = positions[indices]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    return normals / np.where(lengths > 0.0, lengths, 1.0)[:, None], lengths
+
+
+def vertex_quadrics(positions, indices):
+    normals, areas = face_normals(positions, indices)
+    planes = np.empty((len(indices), 4))
+    planes[:, :3] = normals
+    planes[:, 3] = -np.einsum('ij,ij->i', normals, positions[indices[:, 0]])
+
+    face_quadrics = np.einsum('i,ij,ik->ijk', areas, planes, planes)
+    quadrics = np.zeros((len(positions), 4, 4))
+    for corner in range(3):
+        np.add.at(quadrics, indices[:, corner], face_quadrics)
+    return quadrics
+
+
+def border_vertices(indices, vertex_count):
+    """Vertices on open or non manifold edges of the (n, 3) index buffer."""
+    border = np.zeros(vertex_count, dtype=bool)
+    if len(indices) == 0:
+        return border
+    edges = np.sort(indices[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    unique, counts = np.unique(edges, axis=0, return_counts=True)
+    border[unique[counts != 2].ravel()] = True
+    return border
+
+
+def weld_vertices(positions):
+    """Map every vertex to the first vertex at the same position, e.g. the split vertices of uv seams."""
+    _, first, inverse = np.unique(positions, axis=0, return_index=True, return_inverse=True)
+    return first[inverse.reshape(-1)]
+
+
+def _normal(a, b, c):
+    u = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    v = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+    return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+
+def _turns_too_far(before, after):
+    dot = before[0] * after[0] + before[1] * after[1] + before[2] * after[2]
+    length = (before[0] ** 2 + before[1] ** 2 + before[2] ** 2) * (after[0] ** 2 + after[1] ** 2 + after[2] ** 2)
+    return length <= 0.0 or dot <= MIN_NORMAL_COSINE * length ** 0.5
+
+
+def decimate(positions, indices, target_count, vertex_keys=None):
+    """Collapse edges of the (n, 3) index buffer until at most target_count triangles are left.
+
+    Vertices are only collapsed into one of their neighbours (half edge collapse), so all per vertex
+    data stays valid. Vertices at the same position are treated as one: they share their error quadric,
+    and they only collapse all together, each into the copy of the target it shares an edge with, so
+    seams stay closed. Border vertices of that welded mesh never move and a vertex only collapses into
+    neighbours with the same key, e.g. the same bone influences. Returns the indices of the remaining
+    triangles and their updated (m, 3) index buffer.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    vertex_count = len(positions)
+    if len(indices) <= target_count:
+        return np.arange(len(indices)), indices.copy()
+
+    keys = np.zeros(vertex_count, dtype=np.int64) if vertex_keys is None else np.asarray(vertex_keys)
+    weld = weld_vertices(positions)
+    locked = border_vertices(weld[indices], vertex_count)[weld]
+    # the quadrics are kept per welded vertex, at the index of its first copy
+    quadrics = vertex_quadrics(positions, weld[indices])
+    homogeneous = np.ones((vertex_count, 4))
+    homogeneous[:, :3] = positions
+
+    copies = [[] for _ in range(vertex_count)]
+    for vert_id, welded in enumerate(weld.tolist()):
+        copies[welded].append(vert_id)
+    weld = weld.tolist()
+
+    points = positions.tolist()
+    triangles = indices.tolist()
+    alive = [True] * len(triangles)
+    vertex_faces = [set() for _ in range(vertex_count)]
+    for tri_index, triangle in enumerate(triangles):
+        for vert_id in triangle:
+            vertex_faces[vert_id].add(tri_index)
+
+    versions = [0] * vertex_count
+    removed = [False] * vertex_count
+
+    def cost(source, target):
+        point = homogeneous[target]
+        return float(point @ (quadrics[weld[source]] + quadrics[weld[target]]) @ point)
+
+    def neighbours(vert_id):
+        return {other for tri_index in vertex_faces[vert_id] for other in triangles[tri_index]} - {vert_id}
+
+    def can_collapse(source, target):
+        shared = [tri_index for tri_index in vertex_faces[source] if target in triangles[tri_index]]
+        if not shared or len(neighbours(source) & neighbours(target)) != len(shared):
+            return False
+
+        for tri_index in vertex_faces[source]:
+            triangle = triangles[tri_index]
+            if target in triangle:
+                continue
+            corners = [points[vert_id] for vert_id in triangle]
+            before = _normal(*corners)
+            corners[triangle.index(source)] = points[target]
+            if _turns_too_far(before, _normal(*corners)):
+                return False
+        return True
+
+    def collapse_pairs(source, target):
+        # every remaining copy of the source needs exactly one copy of the target next to it
+        target_copies = {vert_id for vert_id in copies[weld[target]] if not removed[vert_id]}
+        pairs = []
+        for vert_id in copies[weld[source]]:
+            # loose copies are not part of any triangle and stay where they are
+            if removed[vert_id] or not vertex_faces[vert_id]:
+                continue
+            candidates = neighbours(vert_id) & target_copies
+            if len(candidates) != 1:
+                return None
+            pairs.append((vert_id, candidates.pop()))
+        return pairs
+
+    # initial candidates, both directions of every edge
+    edges = np.unique(np.sort(indices[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1), axis=0)
+    edges = np.concatenate((edges, edges[:, ::-1]))
+    edges = edges[~locked[edges[:, 0]] & (keys[edges[:, 0]] == keys[edges[:, 1]])]
+    welded_edges = np.asarray(weld)[edges]
+    edge_points = homogeneous[edges[:, 1]]
+    edge_quadrics = quadrics[welded_edges[:, 0]] + quadrics[welded_edges[:, 1]]
+    costs = np.einsum('ij,ijk,ik->i', edge_points, edge_quadrics, edge_points)
+    heap = [(cost_, source, target, 0, 0) for cost_, (source, target) in zip(costs.tolist(), edges.tolist())]
+    heapq.heapify(heap)
+
+    face_count = len(triangles)
+    while face_count > target_count and heap:
+        _, source, target, source_version, target_version = heapq.heappop(heap)
+        if removed[source] or removed[target]:
+            continue
+        if versions[source] != source_version or versions[target] != target_version:
+            continue
+        pairs = collapse_pairs(source, target)
+        if pairs is None or not all(can_collapse(*pair) for pair in pairs):
+            continue
+
+        for pair_source, pair_target in pairs:
+            for tri_index in vertex_faces[pair_source]:
+                triangle = triangles[tri_index]
+                if pair_target in triangle:
+                    alive[tri_index] = False
+                    face_count -= 1
+                    for vert_id in triangle:
+                        if vert_id != pair_source:
+                            vertex_faces[vert_id].discard(tri_index)
+                else:
+                    triangle[triangle.index(pair_source)] = pair_target
+                    vertex_faces[pair_target].add(tri_index)
+            vertex_faces[pair_source] = set()
+            removed[pair_source] = True
+            versions[pair_target] += 1
+        quadrics[weld[target]] += quadrics[weld[source]]
+
+        for _, pair_target in pairs:
+            for other in neighbours(pair_target):
+                if keys[other] != keys[pair_target]:
+                    continue
+                if not locked[pair_target]:
+                    heapq.heappush(heap, (cost(pair_target, other), pair_target, other,
+                                          versions[pair_target], versions[other]))
+                if not locked[other]:
+                    heapq.heappush(heap, (cost(other, pair_target), other, pair_target,
+                                          versions[other], versions[pair_target]))
+
+    kept = np.flatnonzero(alive)
+    return kept, np.array([triangles[tri_index] for tri_index in kept], dtype=np.int64).reshape(-1, 3)
@@ -0,0 +1,284 @@
+# <pep8 compliant>
+# Cache of processed meshes for incremental exports.
+
+import copy
+import hashlib
+import io
+import xml.etree.ElementTree as ET
+
+import bpy
+import numpy as np
+
+from io_mesh_w3d.common.structs.mesh_structs.triangle import SURFACE_TYPE_ATTRIBUTE
+
+MAX_RNA_DEPTH = 6
+
+
+class MeshCacheEntry:
+    def __init__(self, fingerprint, mesh_struct, textures, lod_meshes=None):
+        self.fingerprint = fingerprint
+        self.mesh_struct = mesh_struct
+        self.textures = textures
+        self.lod_meshes = lod_meshes if lod_meshes is not None else []
+        # the copies handed out by the current export, written in place of the cached structs
+        self.copies = []
+        self.chunks = dict()
+
+    def structs(self):
+        return [self.mesh_struct] + self.lod_meshes + self.copies
+
+
+class MeshExportCache:
+    def __init__(self):
+        self.entries = dict()
+        # the entries keep their structs alive, so the ids stay unique while they are indexed
+        self.struct_entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.struct_entries.clear()
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, name, fingerprint):
+        entry = self.entries.get(name)
+        if entry is not None and entry.fingerprint == fingerprint:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, name, fingerprint, mesh_struct, textures, lod_meshes=None):
+        self.remove(name)
+        entry = MeshCacheEntry(fingerprint, mesh_struct, list(textures), lod_meshes)
+        self.entries[name] = entry
+        for struct in entry.structs():
+            self.struct_entries[id(struct)] = entry
+
+    def register_copies(self, entry, copies):
+        self._unindex(entry, entry.copies)
+        entry.copies = list(copies)
+        for struct in entry.copies:
+            self.struct_entries[id(struct)] = entry
+
+    def remove(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+        self._unindex(entry, entry.structs())
+
+    def _unindex(self, entry, structs):
+        for struct in structs:
+            if self.struct_entries.get(id(struct)) is entry:
+                del self.struct_entries[id(struct)]
+
+    def prune(self, names):
+        for name in list(self.entries.keys()):
+            if name not in names:
+                self.remove(name)
+
+    def entry_of(self, mesh_struct):
+        return self.struct_entries.get(id(mesh_struct))
+
+
+MESH_CACHE = MeshExportCache()
+
+
+def _chunk_key(file_format, mesh_struct):
+    return file_format, mesh_struct.header.container_name, mesh_struct.header.mesh_name
+
+
+def write_mesh_chunk(mesh_struct, io_stream):
+    entry = MESH_CACHE.entry_of(mesh_struct)
+    if entry is None:
+        mesh_struct.write(io_stream)
+        return
+
+    key = _chunk_key('W3D', mesh_struct)
+    if key not in entry.chunks:
+        buffer = io.BytesIO()
+        mesh_struct.write(buffer)
+        entry.chunks[key] = buffer.getvalue()
+    io_stream.write(entry.chunks[key])
+
+
+def create_mesh_node(mesh_struct, parent):
+    entry = MESH_CACHE.entry_of(mesh_struct)
+    if entry is None:
+        mesh_struct.create(parent)
+        return
+
+    key = _chunk_key('W3X', mesh_struct)
+    if key not in entry.chunks:
+        holder = ET.Element('holder')
+        mesh_struct.create(holder)
+        entry.chunks[key] = holder[0]
+    # pretty printing modifies the written nodes, so hand out copies only
+    parent.append(copy.deepcopy(entry.chunks[key]))
+
+
+##########################################################################
+# Fingerprinting
+##########################################################################
+
+
+def _update(hasher, value):
+    hasher.update(repr(value).encode('utf-8'))
+    hasher.update(b'\0')
+
+
+def _update_array(hasher, collection, attribute, dtype, components=1):
+    data = np.empty(len(collection) * components, dtype=dtype)
+    if len(data):
+        collection.foreach_get(attribute, data)
+    hasher.update(data.tobytes())
+
+
+def _plain_value(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, set):
+        return tuple(sorted(value))
+    if isinstance(value, bpy.types.ID):
+        return value.name, getattr(value, 'filepath', '')
+    try:
+        return tuple(_plain_value(item) for item in value)
+    except TypeError:
+        return str(value)
+
+
+def hash_custom_properties(hasher, struct, depth=0):
+    # only the properties registered by this add-on, everything else is covered explicitly
+    if struct is None or depth > MAX_RNA_DEPTH:
+        _update(hasher, None)
+        return
+
+    for prop in struct.bl_rna.properties:
+        if not prop.is_runtime:
+            continue
+        value = getattr(struct, prop.identifier, None)
+        _update(hasher, prop.identifier)
+        if prop.type == 'POINTER' and not isinstance(value, bpy.types.ID):
+            hash_custom_properties(hasher, value, depth + 1)
+        elif prop.type == 'COLLECTION':
+            for item in value:
+                hash_custom_properties(hasher, item, depth + 1)
+        else:
+            _update(hasher, _plain_value(value))
+
+
+def hash_material(hasher, material):
+    if material is None:
+        _update(hasher, None)
+        return
+
+    _update(hasher, material.name)
+    hash_custom_properties(hasher, material)
+    if material.node_tree is None:
+        return
+
+    for node in material.node_tree.nodes:
+        _update(hasher, (node.bl_idname, node.name))
+        image = getattr(node, 'image', None)
+        if image is not None:
+            _update(hasher, _plain_value(image))
+        for socket in node.inputs:
+            if hasattr(socket, 'default_value'):
+                _update(hasher, (socket.identifier, _plain_value(socket.default_value)))
+    for link in material.node_tree.links:
+        _update(hasher, (link.from_node.name, link.from_socket.identifier,
+                         link.to_node.name, link.to_socket.identifier))
+
+
+def hash_geometry(hasher, mesh_object, mesh, vertex_weights):
+    _update(hasher, (len(mesh.vertices), len(mesh.loops), len(mesh.polygons)))
+    _update_array(hasher, mesh.vertices, 'co', np.float32, 3)
+    _update_array(hasher, mesh.vertices, 'normal', np.float32, 3)
+    _update_array(hasher, mesh.loops, 'vertex_index', np.int32)
+    _update_array(hasher, mesh.polygons, 'loop_start', np.int32)
+    _update_array(hasher, mesh.polygons, 'loop_total', np.int32)
+    _update_array(hasher, mesh.polygons, 'material_index', np.int32)
+
+    for uv_layer in mesh.uv_layers:
+        _update(hasher, uv_layer.name)
+        _update_array(hasher, uv_layer.data, 'uv', np.float32, 2)
+
+    for layer in getattr(mesh, 'vertex_colors', []):
+        _update(hasher, layer.name)
+        _update_array(hasher, layer.data, 'color', np.float32, 4)
+
+    if mesh_object.vertex_groups:
+        _update(hasher, [group.name for group in mesh_object.vertex_groups])
+    for values in vertex_weights:
+        hasher.update(values.tobytes())
+
+    surface_types = mesh.attributes.get(SURFACE_TYPE_ATTRIBUTE)
+    if surface_types is not None:
+        _update(hasher, (surface_types.domain, surface_types.data_type))
+        if surface_types.domain == 'FACE' and surface_types.data_type == 'INT':
+            _update_array(hasher, surface_types.data, 'value', np.int32)
+
+    if bpy.app.version < (4, 0, 0):
+        _update(hasher, [face_map.name for face_map in mesh_object.face_maps])
+        for face_map in mesh.face_maps:
+            _update_array(hasher, face_map.data, 'value', np.int32)
+
+
+def mesh_fingerprint(mesh_object, mesh, vertex_weights, rig, hierarchy, export_state):
+    hasher = hashlib.blake2b(digest_size=20)
+    _update(hasher, export_state)
+
+    hash_geometry(hasher, mesh_object, mesh, vertex_weights)
+    hash_custom_properties(hasher, mesh_object.data)
+    hash_custom_properties(hasher, mesh)
+    hash_custom_properties(hasher, mesh_object)
+
+    _update(hasher, _plain_value(mesh_object.matrix_local))
+    _update(hasher, (mesh_object.parent.name if mesh_object.parent else None,
+                     mesh_object.parent_type, mesh_object.parent_bone))
+    _update(hasher, [constraint.name for constraint in mesh_object.constraints])
+
+    for material in mesh.materials:
+        hash_material(hasher, material)
+
+    if hierarchy is not None:
+        _update(hasher, [pivot.name for pivot in hierarchy.pivots])
+    if rig is not None:
+        _update(hasher, _plain_value(rig.matrix_local))
+        for bone in rig.data.bones:
+            _update(hasher, (bone.name, _plain_value(bone.matrix_local)))
+
+    return hasher.hexdigest()
+
+
+def linked_data_key(mesh_object, apply_modifiers=True):
+    # objects with the same key evaluate to identical export data, only their names and headers differ
+    modifiers = []
+    if apply_modifiers:
+        for modifier in mesh_object.modifiers:
+            settings = []
+            for prop in modifier.bl_rna.properties:
+                if prop.identifier in ['rna_type', 'name']:
+                    continue
+                value = getattr(modifier, prop.identifier, None)
+                # the result depends on the placement of the other object, the rig is in rest pose though
+                if isinstance(value, bpy.types.Object) and modifier.type != 'ARMATURE':
+                    return None
+                settings.append((prop.identifier, _plain_value(value)))
+            modifiers.append((modifier.type, tuple(settings)))
+
+    _, _, scale = mesh_object.matrix_local.decompose()
+    face_maps = tuple(face_map.name for face_map in mesh_object.face_maps) if bpy.app.version < (4, 0, 0) else ()
+    return (
+        mesh_object.data.as_pointer(),
+        tuple(modifiers),
+        tuple(round(value, 6) for value in scale),
+        tuple(group.name for group in mesh_object.vertex_groups),
+        tuple((slot.link, slot.material.name_full if slot.material else None)
+              for slot in mesh_object.material_slots),
+        face_maps)
@@ -0,0 +1,40 @@
+# <pep8 compliant>
+# Atomic file output for the exporters.
+
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _file_mode(filepath):
+    try:
+        return stat.S_IMODE(os.stat(filepath).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_output(filepath, sync=False):
+    """Open a buffered temporary file next to filepath, it replaces filepath only if the block succeeds.
+
+    Readers of filepath see either the old or the complete new file, never a partially written one.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    handle, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(filepath) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+            yield file
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+        os.chmod(temp_path, _file_mode(filepath))
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -4,6 +4,8 @@
 import bpy
 import os
 import sys
+import numpy as np
+from contextlib import contextmanager
 from mathutils import Quaternion, Matrix, Vector
 from bpy_extras.image_utils import load_image
 
@@ -20,9 +22,14 @@ def get_objects(type, object_list=None):  # MESH, ARMATURE
 
 
 def switch_to_pose(rig, pose):
-    if rig is not None:
+    # returns the previous pose position for restoring it, the scene is only evaluated again on changes
+    if rig is None:
+        return None
+    previous = rig.data.pose_position
+    if previous != pose:
         rig.data.pose_position = pose
         bpy.context.view_layer.update()
+    return previous
 
 
 def insensitive_path(path):
@@ -47,12 +54,72 @@ def get_collection(hlod=None, index=''):
     return bpy.context.scene.collection
 
 
-def link_object_to_active_scene(obj, coll):
+class DeferredLinks:
+    """The objects created during one import, linked to their collections and selected together at its end.
+
+    Linking, selecting and activating one object after the other makes blender resync the view layer every time.
+    """
+
+    def __init__(self):
+        self.links = []
+        self.hidden = []
+
+    def link(self, obj, coll):
+        self.links.append((obj, coll))
+
+    def hide(self, obj):
+        self.hidden.append(obj)
+
+    def apply(self):
+        for obj, coll in self.links:
+            coll.objects.link(obj)
+        for obj in self.hidden:
+            obj.hide_set(True)
+        for obj, _ in self.links:
+            # hidden objects end up unselected, like hiding them after selecting did
+            if not obj.hide_get():
+                obj.select_set(True)
+        if self.links:
+            bpy.context.view_layer.objects.active = self.links[-1][0]
+        self.links = []
+        self.hidden = []
+
+
+def link_object_to_active_scene(obj, coll, links=None):
+    # objects that are needed in the view layer right away, e.g. for mode switches, are linked without links
+    if links is not None:
+        links.link(obj, coll)
+        return
     coll.objects.link(obj)
     bpy.context.view_layer.objects.active = obj
     obj.select_set(True)
 
 
+def hide_object(obj, links=None):
+    # hiding needs the object in the view layer
+    if links is not None:
+        links.hide(obj)
+        return
+    obj.hide_set(True)
+
+
+@contextmanager
+def deferred_links():
+    """Yield the DeferredLinks of one import and link its objects at the end of the block.
+
+    Global undo is off inside the block, so the operators run during the import push no undo steps.
+    """
+    links = DeferredLinks()
+    preferences = bpy.context.preferences.edit
+    use_global_undo = preferences.use_global_undo
+    preferences.use_global_undo = False
+    try:
+        yield links
+    finally:
+        preferences.use_global_undo = use_global_undo
+        links.apply()
+
+
 def rig_object(obj, hierarchy, rig, sub_object):
     obj.parent = rig
     obj.parent_type = 'ARMATURE'
@@ -65,7 +132,7 @@ def rig_object(obj, hierarchy, rig, sub_object):
     obj.parent_type = 'BONE'
 
 
-def create_uvlayer(context, mesh, b_mesh, tris, mat_pass):
+def create_uvlayer(context, mesh, tris, mat_pass):
     tx_coords = None
     if mat_pass.tx_coords:
         tx_coords = mat_pass.tx_coords
@@ -86,13 +153,10 @@ def create_uvlayer(context, mesh, b_mesh, tris, mat_pass):
         return
 
     uv_layer = mesh.uv_layers.new(do_init=False)
-    for i, face in enumerate(b_mesh.faces):
-        for loop in face.loops:
-            idx = tris[i][loop.index % 3]
-            uv_layer.data[loop.index].uv = tx_coords[idx].xy
+    uv_layer.data.foreach_set('uv', loop_uvs(tx_coords, tris).ravel())
 
 
-def create_uvlayer_2(context, mesh, b_mesh, tris, mat_pass):
+def create_uvlayer_2(context, mesh, tris, mat_pass):
     tx_coords_2 = None
     if mat_pass.tx_coords_2:
         tx_coords_2 = mat_pass.tx_coords_2
@@ -101,10 +165,13 @@ def create_uvlayer_2(context, mesh, b_mesh, tris, mat_pass):
         return
 
     uv_layer = mesh.uv_layers.new(do_init=False)
-    for i, face in enumerate(b_mesh.faces):
-        for loop in face.loops:
-            idx = tris[i][loop.index % 3]
-            uv_layer.data[loop.index].uv = tx_coords_2[idx].xy
+    uv_layer.data.foreach_set('uv', loop_uvs(tx_coords_2, tris).ravel())
+
+
+def loop_uvs(tx_coords, tris):
+    # the loops of triangle i are 3 * i, 3 * i + 1 and 3 * i + 2
+    uvs = np.asarray(tx_coords, dtype=np.float32)[:, :2]
+    return uvs[np.asarray(tris, dtype=np.int64).ravel()]
 
 
 extensions = ['.dds', '.tga', '.jpg', '.jpeg', '.png', '.bmp']
@@ -31,7 +31,7 @@ def retrieve_hierarchy(context, container_name):
     if len(rigs) > 0:
         rig = rigs[0]
 
-        switch_to_pose(rig, 'REST')
+        previous_pose = switch_to_pose(rig, 'REST')
 
         root.translation = rig.delta_location
         root.rotation = rig.delta_rotation_quaternion
@@ -42,7 +42,7 @@ def retrieve_hierarchy(context, container_name):
         for bone in rig.pose.bones:
             process_bone(bone, pivot_id_dict, hierarchy)
 
-        switch_to_pose(rig, 'POSE')
+        switch_to_pose(rig, previous_pose)
 
     if len(rigs) > 1:
         context.error(f'only one armature per scene allowed! Exporting only the first one: {rigs[0].name}')
@@ -65,6 +65,90 @@ def create_lod_array(meshes, hierarchy, container_name, lod_arrays):
     return lod_arrays
 
 
+def apply_static_batches(hlod, meshes):
+    # merged meshes replace the sub object of their first member, the others are dropped
+    replaced = dict()
+    for mesh in meshes:
+        for name in mesh.batched_meshes:
+            replaced[name] = mesh if name == mesh.batched_meshes[0] else None
+    if not replaced:
+        return hlod
+
+    for lod_array in hlod.lod_arrays:
+        sub_objects = []
+        for sub_object in lod_array.sub_objects:
+            if sub_object.name not in replaced:
+                sub_objects.append(sub_object)
+            elif replaced[sub_object.name] is not None:
+                mesh = replaced[sub_object.name]
+                sub_objects.append(HLodSubObject(
+                    name=mesh.name(),
+                    identifier=mesh.identifier(),
+                    bone_index=sub_object.bone_index))
+        lod_array.sub_objects = sub_objects
+        lod_array.header.model_count = len(sub_objects)
+    return hlod
+
+
+def apply_terrain_tiles(hlod, meshes):
+    # the tiles of a terrain mesh take the place of its sub object
+    tiles = dict()
+    for mesh in meshes:
+        if mesh.tile_source and mesh.lod_level == 0:
+            tiles.setdefault(mesh.tile_source, []).append(mesh)
+    if not tiles:
+        return hlod
+
+    for lod_array in hlod.lod_arrays:
+        sub_objects = []
+        for sub_object in lod_array.sub_objects:
+            if sub_object.name not in tiles:
+                sub_objects.append(sub_object)
+                continue
+            for mesh in tiles[sub_object.name]:
+                sub_objects.append(HLodSubObject(
+                    name=mesh.name(),
+                    identifier=mesh.identifier(),
+                    bone_index=sub_object.bone_index))
+        lod_array.sub_objects = sub_objects
+        lod_array.header.model_count = len(sub_objects)
+    return hlod
+
+
+def append_generated_lod_arrays(hlod, meshes):
+    generated = dict()
+    for mesh in meshes:
+        if mesh.lod_level > 0:
+            generated.setdefault(mesh.lod_level, dict())[mesh.lod_source] = mesh
+    if not generated or not hlod.lod_arrays:
+        return hlod
+
+    # every lod array is a complete model, meshes without a generated lod keep the closest detailed one
+    top_array = hlod.lod_arrays[-1]
+    current = {sub_object.name: sub_object for sub_object in top_array.sub_objects}
+    lower_arrays = []
+    for level in sorted(generated.keys()):
+        lod_array = HLodLodArray(
+            header=HLodArrayHeader(
+                model_count=len(top_array.sub_objects),
+                max_screen_size=screen_sizes[min(level, len(screen_sizes) - 1)]),
+            sub_objects=[])
+
+        for sub_object in top_array.sub_objects:
+            mesh = generated[level].get(sub_object.name)
+            if mesh is not None:
+                current[sub_object.name] = HLodSubObject(
+                    name=mesh.name(),
+                    identifier=mesh.identifier(),
+                    bone_index=sub_object.bone_index)
+            lod_array.sub_objects.append(current[sub_object.name])
+        lower_arrays.append(lod_array)
+
+    hlod.lod_arrays = list(reversed(lower_arrays)) + hlod.lod_arrays
+    hlod.header.lod_count = len(hlod.lod_arrays)
+    return hlod
+
+
 def create_attachment_array(role, hierarchy, objects):
     attachments = [
         obj for obj in objects
@@ -3,6 +3,9 @@
 
 import bpy
 import bmesh
+import hashlib
+import io
+from contextlib import contextmanager
 from bpy_extras import node_shader_utils
 
 from io_mesh_w3d.common.utils.helpers import *
@@ -10,75 +13,199 @@ from io_mesh_w3d.w3d.structs.mesh_structs.vertex_material import *
 from io_mesh_w3d.common.utils.material_settings_bridge import populate_settings_from_material
 
 
+##########################################################################
+# material cache
+##########################################################################
+
+# materials that are identical in content are created once, keyed by a digest of their source structs
+MATERIAL_CACHE = dict()
+MATERIAL_KEY_PROPERTY = 'w3d_material_key'
+
+
+def _digest(structs, extra=()):
+    io_stream = io.BytesIO()
+    for struct in structs:
+        struct.write(io_stream)
+    io_stream.write(repr(list(extra)).encode())
+    return hashlib.blake2b(io_stream.getvalue(), digest_size=16).hexdigest()
+
+
+def _first_texture_id(mat_pass):
+    if not mat_pass.tx_stages or not mat_pass.tx_stages[0].tx_ids or not len(mat_pass.tx_stages[0].tx_ids[0]):
+        return -1
+    return int(mat_pass.tx_stages[0].tx_ids[0][0])
+
+
+def vertex_material_key(structure):
+    # only the first texture id of a pass decides which material gets a texture node
+    extra = [len(structure.vert_materials), len(structure.shaders), len(structure.textures)]
+    extra += [_first_texture_id(mat_pass) for mat_pass in structure.material_passes]
+    return _digest(structure.vert_materials + structure.shaders + structure.textures, extra)
+
+
+def shader_material_key(shader_mat):
+    return _digest([shader_mat])
+
+
+def cached_materials(material_cache, key):
+    names = material_cache.get(key)
+    if names is None:
+        return None
+    # materials may have been removed, renamed or replaced by loading another file
+    materials = [bpy.data.materials.get(name) for name in names]
+    if any(material is None or material.get(MATERIAL_KEY_PROPERTY) != key for material in materials):
+        del material_cache[key]
+        return None
+    return materials
+
+
+def store_materials(material_cache, key, materials):
+    for material in materials:
+        material[MATERIAL_KEY_PROPERTY] = key
+    material_cache[key] = [material.name for material in materials]
+
+
+##########################################################################
+# material templates
+##########################################################################
+
+# while a material_templates block is open, new materials are copies of one prebuilt material per kind
+MATERIAL_TEMPLATES = []
+TEXTURE_NODE_NAME = 'W3D Texture'
+
+
+@contextmanager
+def material_templates():
+    """Build the node graph of every material kind once and create the materials of the block as its copies.
+
+    The templates are removed again when the block ends.
+    """
+    templates = dict()
+    MATERIAL_TEMPLATES.append(templates)
+    try:
+        yield templates
+    finally:
+        MATERIAL_TEMPLATES.remove(templates)
+        for template in templates.values():
+            bpy.data.materials.remove(template)
+
+
+def setup_material(material, material_type):
+    material.material_type = material_type
+    material.use_nodes = True
+    material.show_transparent_back = False
+    if material_type == 'VERTEX_MATERIAL':
+        material.blend_method = 'CLIP'
+
+
+def new_material(name, kind, material_type):
+    if not MATERIAL_TEMPLATES:
+        material = bpy.data.materials.new(name)
+        setup_material(material, material_type)
+        return material
+
+    templates = MATERIAL_TEMPLATES[-1]
+    template = templates.get(kind)
+    if template is None:
+        # the leading dot hides the template in the material lists
+        template = bpy.data.materials.new('.W3D ' + kind)
+        setup_material(template, material_type)
+        # prebuilt like the principled wrapper links it, vertex materials also take the alpha from it
+        texture_node(template, link_alpha=material_type == 'VERTEX_MATERIAL')
+        templates[kind] = template
+    material = template.copy()
+    material.name = name
+    return material
+
+
+def texture_node(material, link_alpha=True):
+    node_tree = material.node_tree
+    node = node_tree.nodes.get(TEXTURE_NODE_NAME)
+    if node is not None:
+        return node
+
+    bsdf_node = node_tree.nodes.get('Principled BSDF')
+    node = node_tree.nodes.new('ShaderNodeTexImage')
+    node.name = TEXTURE_NODE_NAME
+    node.location = (-350, 300)
+    links = node_tree.links
+    links.new(node.outputs['Color'], bsdf_node.inputs['Base Color'])
+    if link_alpha:
+        links.new(node.outputs['Alpha'], bsdf_node.inputs['Alpha'])
+    return node
+
+
+def remove_unused_texture_node(material):
+    node = material.node_tree.nodes.get(TEXTURE_NODE_NAME)
+    if node is not None and node.image is None:
+        material.node_tree.nodes.remove(node)
+
+
 ##########################################################################
 # vertex material
 ##########################################################################
 
-def create_vertex_material(context, principleds, structure, mesh, b_mesh, name, triangles, mesh_ob):
+def create_vertex_material(context, principleds, structure, mesh, name, triangles, mesh_ob, material_cache=None):
+    key = None
+    materials = None
+    if material_cache is not None:
+        key = vertex_material_key(structure)
+        materials = cached_materials(material_cache, key)
+        if materials is not None:
+            for material in materials:
+                mesh.materials.append(material)
+                principleds.append(node_shader_utils.PrincipledBSDFWrapper(material, is_readonly=False))
 
     if len(structure.material_passes) == 1 and len(
             structure.textures) > 1:  # condition for multiple materials per single mesh object
-        # Create the same amount of materials as textures used for this mesh
-        source_mat = structure.vert_materials[0]
-        for texture in structure.textures:
-            source_mat.vm_name = texture.id
-            (material, principled) = create_material_from_vertex_material(name, source_mat)
-            mesh.materials.append(material)
-            principleds.append(principled)
-
-        create_uvlayer(context, mesh, b_mesh, triangles, structure.material_passes[0])
-
-        # Load textures
-        for tex_id, texture in enumerate(structure.textures):
-            texture = structure.textures[tex_id]
-            tex = find_texture(context, texture.file, texture.id)
-            node_tree = mesh.materials[tex_id].node_tree
-            bsdf_node = node_tree.nodes.get('Principled BSDF')
-            texture_node = node_tree.nodes.new('ShaderNodeTexImage')
-            texture_node.image = tex
-            texture_node.location = (-350, 300)
-            links = node_tree.links
-            links.new(texture_node.outputs['Color'], bsdf_node.inputs['Base Color'])
-            links.new(texture_node.outputs['Alpha'], bsdf_node.inputs['Alpha'])
-
-        # Assign material to appropriate object faces
-        bpy.ops.object.mode_set(mode='EDIT')
-        bm = bmesh.from_edit_mesh(mesh_ob.data)
-        bm.faces.ensure_lookup_table()
-        for i, face in enumerate(bm.faces):
-            if(i < len(structure.material_passes[0].tx_stages[0].tx_ids[0])):
-                bm.faces[i].material_index = structure.material_passes[0].tx_stages[0].tx_ids[0][i]
-            else:
-                bm.faces[i].material_index = structure.material_passes[0].tx_stages[0].tx_ids[0][0]
-        bpy.ops.object.mode_set(mode='OBJECT')
+        if materials is None:
+            # Create the same amount of materials as textures used for this mesh
+            source_mat = structure.vert_materials[0]
+            for texture in structure.textures:
+                source_mat.vm_name = texture.id
+                (material, principled) = create_material_from_vertex_material(name, source_mat)
+                mesh.materials.append(material)
+                principleds.append(principled)
+
+        create_uvlayer(context, mesh, triangles, structure.material_passes[0])
+
+        # Load textures, cached materials have them already
+        if materials is None:
+            for tex_id, texture in enumerate(structure.textures):
+                texture_node(mesh.materials[tex_id]).image = find_texture(context, texture.file, texture.id)
+
+        # Assign material to appropriate object faces, faces without a texture id use the first one
+        tx_ids = structure.material_passes[0].tx_stages[0].tx_ids[0]
+        material_indices = [tx_ids[i] if i < len(tx_ids) else tx_ids[0] for i in range(len(mesh.polygons))]
+        mesh.polygons.foreach_set('material_index', material_indices)
     else:
-        for vertMat in structure.vert_materials:
-            (material, principled) = create_material_from_vertex_material(name, vertMat)
-            mesh.materials.append(material)
-            principleds.append(principled)
+        if materials is None:
+            for vertMat in structure.vert_materials:
+                (material, principled) = create_material_from_vertex_material(name, vertMat)
+                mesh.materials.append(material)
+                principleds.append(principled)
 
         for mat_pass in structure.material_passes:
-            create_uvlayer(context, mesh, b_mesh, triangles, mat_pass)
+            create_uvlayer(context, mesh, triangles, mat_pass)
 
-            if mat_pass.tx_stages:
+            if mat_pass.tx_stages and materials is None:
                 tx_stage = mat_pass.tx_stages[0]
                 mat_id = mat_pass.vertex_material_ids[0]
                 tex_id = tx_stage.tx_ids[0][0]
                 texture = structure.textures[tex_id]
-                tex = find_texture(context, texture.file, texture.id)
-                node_tree = mesh.materials[tex_id].node_tree
-                bsdf_node = node_tree.nodes.get('Principled BSDF')
-                texture_node = node_tree.nodes.new('ShaderNodeTexImage')
-                texture_node.image = tex
-                texture_node.location = (-350, 300)
-                links = node_tree.links
-                links.new(texture_node.outputs['Color'], bsdf_node.inputs['Base Color'])
-                links.new(texture_node.outputs['Alpha'], bsdf_node.inputs['Alpha'])
+                texture_node(mesh.materials[tex_id]).image = find_texture(context, texture.file, texture.id)
+
+    if materials is not None:
+        return
 
     # Iterate through all materials and set their blend mode to Alpha Clip for transparency
     for material in mesh.materials:
         if material:
             material.blend_method = 'CLIP'
+            remove_unused_texture_node(material)
+
+    if key is not None:
+        store_materials(material_cache, key, mesh.materials)
 
 
 def create_material_from_vertex_material(name, vert_mat):
@@ -88,10 +215,7 @@ def create_material_from_vertex_material(name, vert_mat):
         principled = node_shader_utils.PrincipledBSDFWrapper(material, is_readonly=False)
         return material, principled
 
-    material = bpy.data.materials.new(name)
-    material.material_type = 'VERTEX_MATERIAL'
-    material.use_nodes = True
-    material.show_transparent_back = False
+    material = new_material(name, 'VERTEX_MATERIAL', 'VERTEX_MATERIAL')
 
     attributes = {'DEFAULT'}
     attribs = vert_mat.vm_info.attributes
@@ -129,17 +253,21 @@ def create_material_from_vertex_material(name, vert_mat):
 # shader material
 ##########################################################################
 
-def create_material_from_shader_material(context, name, shader_mat):
+def create_material_from_shader_material(context, name, shader_mat, material_cache=None):
+    key = None
+    if material_cache is not None:
+        key = shader_material_key(shader_mat)
+        materials = cached_materials(material_cache, key)
+        if materials is not None:
+            return materials[0], node_shader_utils.PrincipledBSDFWrapper(materials[0], is_readonly=False)
+
     name = name + '.' + shader_mat.header.type_name
     if name in bpy.data.materials:
         material = bpy.data.materials[name]
         principled = node_shader_utils.PrincipledBSDFWrapper(material, is_readonly=False)
         return material, principled
 
-    material = bpy.data.materials.new(name)
-    material.material_type = 'SHADER_MATERIAL'
-    material.use_nodes = True
-    material.show_transparent_back = False
+    material = new_material(name, 'SHADER_MATERIAL.' + shader_mat.header.type_name, 'SHADER_MATERIAL')
 
     material.technique = shader_mat.header.technique
 
@@ -247,7 +375,10 @@ def create_material_from_shader_material(context, name, shader_mat):
         else:
             context.error('shader property not implemented: ' + prop.name)
 
+    remove_unused_texture_node(material)
     populate_settings_from_material(material)
+    if key is not None:
+        store_materials(material_cache, key, [material])
     return material, principled
 
 
@@ -1,11 +1,13 @@
 # <pep8 compliant>
 # Written by Stephan Vedder and Michael Schnabel
 
+import copy
 import os
 
 import bpy
 import bmesh
 import math
+import numpy as np
 from mathutils import Vector, Matrix
 from bpy_extras import node_shader_utils
 
@@ -17,12 +19,24 @@ from io_mesh_w3d.common.structs.mesh_structs.aabbtree import (
     Children,
     Polys,
 )
+from io_mesh_w3d.common.structs.rgba import RGBABuffer
 from io_mesh_w3d.common.structs.mesh_structs.texture import Texture, TextureInfo
 from io_mesh_w3d.w3d.structs.mesh_structs.material_pass import TextureStage
 from io_mesh_w3d.common.utils.helpers import *
 from io_mesh_w3d.common.utils.material_export import *
+from io_mesh_w3d.common.utils.vertex_split import split_vertices
+from io_mesh_w3d.common.utils.export_cache import MESH_CACHE, mesh_fingerprint, linked_data_key
+from io_mesh_w3d.common.utils.mesh_processing import (
+    LEAF_FLAG,
+    PACKED_VECTORS,
+    bounding_sphere,
+    process_mesh_jobs,
+    split_terrain_job,
+)
 from io_mesh_w3d.common.utils.object_settings_bridge import (
     should_export_geometry,
+    should_export_transform,
+    allows_static_batching,
     apply_object_settings_to_header,
     is_hlod_attachment,
 )
@@ -33,6 +47,9 @@ from io_mesh_w3d.common.utils.material_settings_bridge import (
     apply_pass_to_material,
 )
 
+MAX_BATCH_VERTICES = 65535
+MAX_TERRAIN_TILES = 16
+
 
 def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materials=False):
     mesh_structs = []
@@ -41,25 +58,57 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
     smooth_normals = export_options.get('smooth_vertex_normals', True)
     apply_modifiers = export_options.get('apply_modifiers', True)
     deduplicate = export_options.get('deduplicate_reference_meshes', False)
+    share_linked = export_options.get('reuse_linked_mesh_data', False) and not deduplicate
     force_full = export_options.get('renegade_workflow', False)
     build_aabbtree = export_options.get('build_new_aabtree', True) or force_full
+    process_options = {
+        'exact_sphere': export_options.get('exact_bounding_sphere', False),
+        'build_aabbtree': build_aabbtree,
+        'optimize_vertex_cache': export_options.get('optimize_vertex_cache', False),
+        'lod_count': export_options.get('generated_lod_count', 0),
+        'lod_ratio': export_options.get('lod_triangle_ratio', 0.5),
+        'pack_chunks': context.file_format == 'W3D',
+    }
+    incremental = export_options.get('incremental_export', False)
+    batch_static = export_options.get('batch_static_meshes', False)
+    terrain_tiles = export_options.get('terrain_tile_count', 1) if export_options.get('terrain_mode', False) else 1
+    batch_keys = dict()
+    material_cache = dict()
+    material_slots = 0
     seen_mesh_data = set()
+    linked_sources = dict()
+    linked_instances = []
+    processing_jobs = []
+    cache_updates = []
+    lod_meshes = dict()
+    export_state = (context.file_format, container_name, force_vertex_materials, sorted(export_options.items()))
+
+    if incremental:
+        MESH_CACHE.reset_statistics()
+    else:
+        MESH_CACHE.clear()
 
     naming_error = False
+    skinning_error = False
     bone_names = [bone.name for bone in rig.pose.bones] if rig is not None else []
 
-    switch_to_pose(rig, 'REST')
+    mesh_objects = [mesh_object for mesh_object in get_objects('MESH')
+                    if mesh_object.data.object_type == 'MESH'
+                    and not is_hlod_attachment(mesh_object)
+                    and should_export_geometry(mesh_object)]
 
-    depsgraph = bpy.context.evaluated_depsgraph_get()
+    # all changes to the scene happen before the single evaluation in rest pose
+    for mesh_object in mesh_objects:
+        if mesh_object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        if smooth_normals:
+            smooth_mesh_normals(mesh_object.data)
 
-    for mesh_object in get_objects('MESH'):
-        if mesh_object.data.object_type != 'MESH':
-            continue
-        if is_hlod_attachment(mesh_object):
-            continue
-        if not should_export_geometry(mesh_object):
-            continue
+    previous_pose = switch_to_pose(rig, 'REST')
 
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    for mesh_object in mesh_objects:
         source_object = mesh_object
 
         if deduplicate:
@@ -72,19 +121,19 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
                 continue
             seen_mesh_data.add(data_id)
 
-        if smooth_normals:
-            mesh_data = source_object.data
-            if mesh_data and hasattr(mesh_data, 'polygons'):
-                try:
-                    mesh_data.use_auto_smooth = True
-                    mesh_data.auto_smooth_angle = math.radians(180.0)
-                    for poly in mesh_data.polygons:
-                        poly.use_smooth = True
-                except AttributeError:
-                    pass
-
-        if mesh_object.mode != 'OBJECT':
-            bpy.ops.object.mode_set(mode='OBJECT')
+        linked_key = linked_data_key(mesh_object, apply_modifiers) if share_linked else None
+        if linked_key is not None and linked_key in linked_sources:
+            source_struct = linked_sources[linked_key]
+            mesh_struct, meta = create_linked_instance(mesh_object, source_struct, container_name)
+            apply_constraint_flags(context, mesh_object, mesh_struct, meta)
+            if not check_bone_name(context, mesh_object, mesh_struct, bone_names):
+                naming_error = True
+                continue
+            mesh_structs.append(mesh_struct)
+            linked_instances.append((mesh_struct, source_struct))
+            # the processed data of the source is handed to its instances, so it must stay a mesh of its own
+            batch_keys.pop(id(source_struct), None)
+            continue
 
         mesh_struct = Mesh()
         mesh_struct.header = MeshHeader(
@@ -112,54 +161,75 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
 
         mesh = temp_mesh
         try:
-            b_mesh = prepare_bmesh(context, mesh)
+            vertex_weights = gather_vertex_weights(mesh_object, mesh)
+            if incremental:
+                fingerprint = mesh_fingerprint(mesh_object, mesh, vertex_weights, rig, hierarchy, export_state)
+                entry = MESH_CACHE.lookup(mesh_object.name, fingerprint)
+                if entry is not None:
+                    cached_struct, cached_lods = create_cached_copies(entry, mesh_object.name, container_name)
+                    mesh_structs.append(cached_struct)
+                    lod_meshes[id(cached_struct)] = cached_lods
+                    merge_used_textures(used_textures, entry.textures)
+                    if batch_static:
+                        batch_keys[id(cached_struct)] = static_batch_key(
+                            mesh_object, mesh, cached_struct, bone_names)
+                    if linked_key is not None:
+                        linked_sources[linked_key] = cached_struct
+                    continue
+
+            mesh_textures = []
+            triangulate_mesh(mesh)
 
             if len(mesh.vertices) == 0:
                 context.warning(f'mesh \'{mesh.name}\' does not have a single vertex!')
                 continue
 
-            center, radius = calculate_mesh_sphere(mesh)
-            header.sph_center = center
-            header.sph_radius = radius
+            coords = vertex_coords(mesh)
+
+            loop_uvs = gather_loop_uvs(mesh)
+            vertex_map, loop_map, loop_to_split = split_multi_uv_vertices(context, mesh, loop_uvs)
 
             if mesh.uv_layers:
                 mesh.calc_tangents()
 
-            header.vert_count = len(mesh.vertices)
-
-            loop_dict = dict()
-            for loop in mesh.loops:
-                loop_dict[loop.vertex_index] = loop
+            header.vert_count = len(vertex_map)
 
             _, _, scale = mesh_object.matrix_local.decompose()
 
-            is_skinned = False
-            for vertex in mesh.vertices:
-                if vertex.groups:
-                    is_skinned = True
+            group_counts, group_ids, group_weights = vertex_weights
+            is_skinned = bool(group_counts.any())
+            group_starts = (np.cumsum(group_counts) - group_counts).tolist()
+            group_counts = group_counts.tolist()
+            group_ids = group_ids.tolist()
+            group_weights = group_weights.tolist()
 
             unskinned_vertices_error = False
             overskinned_vertices_error = False
 
-            for i, vertex in enumerate(mesh.vertices):
+            positions = scaled_vertex_positions(coords, vertex_map, scale)
+            vertex_data = zip(vertex_map.tolist(), loop_map.tolist(), positions.tolist())
+            for i, (vert_index, loop_index, position) in enumerate(vertex_data):
+                vertex = mesh.vertices[vert_index]
+                group_count = group_counts[vert_index]
+                start = group_starts[vert_index]
                 mesh_struct.shade_ids.append(i)
                 matrix = Matrix.Identity(4)
                 matrix_2 = Matrix.Identity(4)
 
-                if vertex.groups:
+                if group_count:
                     vert_inf = VertexInfluence()
-                    vert_inf.bone_idx = find_bone_index(hierarchy, mesh_object, vertex.groups[0].group)
-                    vert_inf.bone_inf = vertex.groups[0].weight
+                    vert_inf.bone_idx = find_bone_index(hierarchy, mesh_object, group_ids[start])
+                    vert_inf.bone_inf = group_weights[start]
 
                     # add extra influenced bones
-                    if len(vertex.groups) > 1:
+                    if group_count > 1:
                         mesh_struct.multi_bone_skinned = True
-                        vert_inf.xtra_idx = find_bone_index(hierarchy, mesh_object, vertex.groups[1].group)
-                        vert_inf.xtra_inf = vertex.groups[1].weight
-                    if len(vertex.groups) > 2:
+                        vert_inf.xtra_idx = find_bone_index(hierarchy, mesh_object, group_ids[start + 1])
+                        vert_inf.xtra_inf = group_weights[start + 1]
+                    if group_count > 2:
                         overskinned_vertices_error = True
                         context.error(
-                            f'mesh \'{mesh_object.name}\' vertex {i} is influenced by more than 2 bones ({len(vertex.groups)})! Make sure you do weight painting on vertex basis not per face.')
+                            f'mesh \'{mesh_object.name}\' vertex {i} is influenced by more than 2 bones ({group_count})! Make sure you do weight painting on vertex basis not per face.')
 
                     if vert_inf.bone_inf < 0.01 and vert_inf.xtra_inf < 0.01:
                         context.warning(f'mesh \'{mesh_object.name}\' vertex {i} both bone weights where 0!')
@@ -193,17 +263,15 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
                     unskinned_vertices_error = True
                     context.error(f'skinned mesh \'{mesh_object.name}\' vertex {i} is not rigged to any bone!')
 
-                vertex.co.x *= scale.x
-                vertex.co.y *= scale.y
-                vertex.co.z *= scale.z
-                mesh_struct.verts.append(matrix @ vertex.co)
-                mesh_struct.verts_2.append(matrix_2 @ vertex.co)
+                position = Vector(position)
+                mesh_struct.verts.append(matrix @ position)
+                mesh_struct.verts_2.append(matrix_2 @ position)
 
                 _, rotation, _ = matrix.decompose()
                 _, rotation_2, _ = matrix_2.decompose()
 
-                if i in loop_dict:
-                    loop = loop_dict[i]
+                if loop_index >= 0:
+                    loop = mesh.loops[loop_index]
                     # do NOT use loop.normal here! that might result in weird shading issues
                     mesh_struct.normals.append(rotation @ vertex.normal)
                     mesh_struct.normals_2.append(rotation_2 @ vertex.normal)
@@ -223,7 +291,8 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
                         mesh_struct.bitangents.append((rotation @ vertex.normal))
 
             if unskinned_vertices_error or overskinned_vertices_error:
-                return ([], [])
+                skinning_error = True
+                break
 
             header.min_corner = Vector(
                 (mesh_object.bound_box[0][0],
@@ -234,63 +303,27 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
                  mesh_object.bound_box[6][1],
                  mesh_object.bound_box[6][2]))
 
-            for poly in mesh.polygons:
-                surface_type = 13
-                if 0 <= poly.material_index < len(mesh.materials):
-                    surface_type = resolve_triangle_surface_type(mesh.materials[poly.material_index])
-
-                triangle = Triangle(
-                    vert_ids=list(poly.vertices),
-                    surface_type=surface_type,
-                    normal=Vector(poly.normal))
-
-                vec1 = mesh.vertices[poly.vertices[0]].co
-                vec2 = mesh.vertices[poly.vertices[1]].co
-                vec3 = mesh.vertices[poly.vertices[2]].co
-                tri_pos = (vec1 + vec2 + vec3) / 3.0
-                triangle.distance = tri_pos.length
-                mesh_struct.triangles.append(triangle)
+            mesh_struct.triangles = build_triangles(mesh, loop_to_split, positions)
 
             if bpy.app.version < (4, 0, 0):
                 face_maps = mesh_object.face_maps
             else:
                 face_maps = mesh.face_maps
 
-            if context.file_format == 'W3X' and len(face_maps) > 0:
+            has_surface_types = len(face_maps) > 0 or SURFACE_TYPE_ATTRIBUTE in mesh.attributes
+            if context.file_format == 'W3X' and has_surface_types:
                 context.warning('triangle surface types (mesh face maps) are not supported in W3X file format!')
             else:
                 face_map_names = [map.name for map in face_maps]
                 Triangle.validate_face_map_names(context, face_map_names)
 
-                if bpy.app.version < (4, 0, 0):
-                    for map in mesh.face_maps:
-                        for i, val in enumerate(map.data):
-                            mesh_struct.triangles[i].set_surface_type(face_map_names[val.value])
-                else:
-                    for map in mesh.face_maps:
-                        for val in map.value:
-                            if val.value < len(mesh_struct.triangles):
-                                mesh_struct.triangles[val.value].set_surface_type(map.name)
+                apply_face_map_surface_types(context, mesh, face_map_names, mesh_struct.triangles)
 
             header.face_count = len(mesh_struct.triangles)
 
-            center, radius = calculate_mesh_sphere(mesh)
-            header.sphCenter = center
-            header.sphRadius = radius
-
             tx_stages = []
-            for i, uv_layer in enumerate(mesh.uv_layers):
-                stage = TextureStage(
-                    tx_ids=[[i]],
-                    tx_coords=[[Vector((0.0, 0.0))] * len(mesh_struct.verts)])
-
-                for j, face in enumerate(b_mesh.faces):
-                    for loop in face.loops:
-                        vert_index = mesh_struct.triangles[j].vert_ids[loop.index % 3]
-                        stage.tx_coords[0][vert_index] = uv_layer.data[loop.index].uv.copy()
-                tx_stages.append(stage)
-
-            b_mesh.free()
+            for i, tx_coords in enumerate(scatter_uv_coords(loop_uvs, loop_to_split, len(vertex_map))):
+                tx_stages.append(TextureStage(tx_ids=[[i]], tx_coords=[tx_coords]))
 
             texture_cache = {}
 
@@ -299,89 +332,63 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
                     context.warning(f'mesh \'{mesh_object.name}\' uses a invalid/empty material!')
                     continue
 
-                settings = getattr(material, 'w3d_material_settings', None)
-                pass_configs = list(settings.passes) if settings and settings.passes else [None]
-                original_state = snapshot_material_state(material) if settings and settings.passes else None
-
-                try:
-                    if not settings or not settings.passes:
-                        apply_material_settings_to_legacy(material)
-
-                    for pass_config in pass_configs:
-                        if pass_config is not None:
-                            apply_pass_to_material(material, settings, pass_config)
+                material_key = getattr(material, 'name_full', material.name)
+                if material_key not in material_cache:
+                    material_cache[material_key] = retrieve_material_templates(
+                        context, material, force_vertex_materials)
+                material_slots += 1
 
-                        mat_pass = MaterialPass()
+                for template in material_cache[material_key]:
+                    pass_config = template.pass_config
+                    merge_used_textures(mesh_textures, template.textures)
 
-                        principled = node_shader_utils.PrincipledBSDFWrapper(material, is_readonly=True)
+                    mat_pass = MaterialPass()
+                    custom_stage = False
 
-                        used_textures = get_used_textures(material, principled, used_textures)
+                    if template.shader_material is not None:
+                        mat_pass.shader_material_ids = [len(mesh_struct.shader_materials)]
+                        if pass_config is None and i < len(tx_stages):
+                            mat_pass.tx_coords = tx_stages[i].tx_coords[0]
+                            if len(mesh.materials) == 1 and len(tx_stages) == 2:
+                                mat_pass.tx_coords_2 = tx_stages[i + 1].tx_coords[0]
 
-                        custom_stage = False
+                        mesh_struct.shader_materials.append(template.shader_material)
 
-                        if context.file_format == 'W3X' or (
-                                material.material_type == 'SHADER_MATERIAL' and not force_vertex_materials):
-                            mat_pass.shader_material_ids = [len(mesh_struct.shader_materials)]
-                            if pass_config is None and i < len(tx_stages):
-                                mat_pass.tx_coords = tx_stages[i].tx_coords[0]
-                                if len(mesh.materials) == 1 and len(tx_stages) == 2:
-                                    mat_pass.tx_coords_2 = tx_stages[i + 1].tx_coords[0]
-
-                            mesh_struct.shader_materials.append(
-                                retrieve_shader_material(context, material, principled))
-
-                        else:
-                            shader = retrieve_shader(material)
-                            mesh_struct.shaders.append(shader)
-                            mat_pass.shader_ids = [len(mesh_struct.shaders) - 1]
-                            mat_pass.vertex_material_ids = [len(mesh_struct.vert_materials)]
-
-                            mesh_struct.vert_materials.append(
-                                retrieve_vertex_material(material, principled, settings, pass_config))
-
-                            if pass_config is None:
-                                base_col_tex = principled.base_color_texture
-                                if base_col_tex is not None and base_col_tex.image is not None:
-                                    info = TextureInfo()
-                                    img = base_col_tex.image
-                                    filepath = os.path.basename(img.filepath)
-                                    if filepath == '':
-                                        filepath = img.name
-                                    tex = Texture(
-                                        id=img.name,
-                                        file=filepath,
-                                        texture_info=info)
-                                    mesh_struct.textures.append(tex)
-                                    shader.texturing = 1
-
-                                    if i < len(tx_stages):
-                                        mat_pass.tx_stages.append(tx_stages[i])
-
-                        if pass_config is not None:
-                            custom_stage |= add_stage_from_settings(
-                                pass_config.stage0,
-                                pass_config.uv_channel_stage0,
-                                tx_stages,
-                                mesh_struct,
-                                texture_cache,
-                                mat_pass)
-                            custom_stage |= add_stage_from_settings(
-                                pass_config.stage1,
-                                pass_config.uv_channel_stage1,
-                                tx_stages,
-                                mesh_struct,
-                                texture_cache,
-                                mat_pass)
-                            if custom_stage and context.file_format != 'W3X' and mesh_struct.shaders:
-                                mesh_struct.shaders[-1].texturing = 1
-
-                        mesh_struct.material_passes.append(mat_pass)
-                finally:
-                    if original_state is not None:
-                        restore_material_state(material, original_state)
-
-            if build_aabbtree:
-                mesh_struct.aabbtree = build_aabb_tree(mesh_struct)
+                    else:
+                        # the shader is the only part changed per mesh
+                        shader = copy.copy(template.shader)
+                        mesh_struct.shaders.append(shader)
+                        mat_pass.shader_ids = [len(mesh_struct.shaders) - 1]
+                        mat_pass.vertex_material_ids = [len(mesh_struct.vert_materials)]
+
+                        mesh_struct.vert_materials.append(template.vert_material)
+
+                        if template.texture is not None:
+                            mesh_struct.textures.append(template.texture)
+                            shader.texturing = 1
+
+                            if i < len(tx_stages):
+                                mat_pass.tx_stages.append(tx_stages[i])
+
+                    if pass_config is not None:
+                        custom_stage |= add_stage_from_settings(
+                            pass_config.stage0,
+                            pass_config.uv_channel_stage0,
+                            tx_stages,
+                            mesh_struct,
+                            texture_cache,
+                            mat_pass)
+                        custom_stage |= add_stage_from_settings(
+                            pass_config.stage1,
+                            pass_config.uv_channel_stage1,
+                            tx_stages,
+                            mesh_struct,
+                            texture_cache,
+                            mat_pass)
+                        if custom_stage and context.file_format != 'W3X' and mesh_struct.shaders:
+                            mesh_struct.shaders[-1].texturing = 1
+
+                    mesh_struct.material_passes.append(mat_pass)
 
             for layer in mesh.vertex_colors:
                 if '_' in layer.name:
@@ -389,51 +396,29 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
                 else:
                     index = 0
                 if 'DCG' in layer.name:
-                    target = mesh_struct.material_passes[index].dcg
+                    channel = 'dcg'
                 elif 'DIG' in layer.name:
-                    target = mesh_struct.material_passes[index].dig
+                    channel = 'dig'
                 elif 'SCG' in layer.name:
-                    target = mesh_struct.material_passes[index].scg
+                    channel = 'scg'
                 else:
                     context.warning(f'vertex color layer name \'{layer.name}\' is not one of [DCG, DIG, SCG]')
                     continue
 
-                target = [RGBA] * len(mesh.vertices)
+                if index >= len(mesh_struct.material_passes):
+                    context.warning(f'vertex color layer \'{layer.name}\' of mesh \'{mesh_object.name}\' '
+                                    f'has no material pass {index}!')
+                    continue
 
-                for i, loop in enumerate(mesh.loops):
-                    target[loop.vertex_index] = RGBA(layer.data[i].color)
+                setattr(mesh_struct.material_passes[index], channel, vertex_color_buffer(layer, loop_map))
 
             header.vert_channel_flags = VERTEX_CHANNEL_LOCATION | VERTEX_CHANNEL_NORMAL
 
-            if mesh_struct.vert_infs:
-                header.attrs |= GEOMETRY_TYPE_SKIN
-                header.vert_channel_flags |= VERTEX_CHANNEL_BONE_ID
+            apply_constraint_flags(context, mesh_object, mesh_struct, meta)
 
-                if len(mesh_object.constraints) > 0:
-                    context.warning(f'mesh \'{mesh_object.name }\' is rigged and thus does not support any constraints!')
-
-            else:
-                if not meta.get('handled_orientation'):
-                    if len(mesh_object.constraints) > 1:
-                        context.warning(
-                            f'mesh \'{mesh_object.name}\' has multiple constraints applied, only \'Copy Rotation\' OR \'Damped Track\' are supported!')
-                    for constraint in mesh_object.constraints:
-                        if constraint.name == 'Copy Rotation':
-                            header.attrs |= GEOMETRY_TYPE_CAMERA_ORIENTED
-                            break
-                        if constraint.name == 'Damped Track':
-                            header.attrs |= GEOMETRY_TYPE_CAMERA_ALIGNED
-                            break
-                        context.warning(f'mesh \'{mesh_object.name}\' constraint \'{constraint.name}\' is not supported!')
-
-            if mesh_object.name in bone_names:
-                if not (mesh_struct.is_skin() or mesh_object.parent_type ==
-                        'BONE' and mesh_object.parent_bone == mesh_object.name):
-                    naming_error = True
-                    context.error(
-                        f'mesh \'{mesh_object.name}\' has same name as bone \'{mesh_object.name}\' but is not configured properly!')
-                    context.info('EITHER apply an armature modifier to it, create a vertex group with the same name as the mesh and do the weight painting OR set the armature as parent object and the identically named bone as parent bone.')
-                    continue
+            if not check_bone_name(context, mesh_object, mesh_struct, bone_names):
+                naming_error = True
+                continue
 
             if mesh_struct.shader_materials:
                 header.vert_channel_flags |= VERTEX_CHANNEL_TANGENT | VERTEX_CHANNEL_BITANGENT
@@ -450,6 +435,17 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
             mesh_struct.header.matl_count = max(
                 len(mesh_struct.vert_materials), len(mesh_struct.shader_materials))
             mesh_structs.append(mesh_struct)
+            merge_used_textures(used_textures, mesh_textures)
+            if terrain_tiles > 1:
+                # tiles take their bounds from their split vertices, in the space of the untiled bounds
+                coords = coords[vertex_map]
+            processing_jobs.append((mesh_struct, coords, positions))
+            if batch_static:
+                batch_keys[id(mesh_struct)] = static_batch_key(mesh_object, mesh, mesh_struct, bone_names)
+            if incremental:
+                cache_updates.append((mesh_object.name, fingerprint, mesh_struct, mesh_textures))
+            if linked_key is not None:
+                linked_sources[linked_key] = mesh_struct
 
         finally:
             if apply_modifiers:
@@ -458,32 +454,565 @@ def retrieve_meshes(context, hierarchy, rig, container_name, force_vertex_materi
             elif temp_mesh is not None:
                 bpy.data.meshes.remove(temp_mesh)
 
-    switch_to_pose(rig, 'POSE')
+    switch_to_pose(rig, previous_pose)
 
-    if naming_error:
+    if naming_error or skinning_error:
         return [], []
 
+    if material_cache:
+        context.info(f'converted {len(material_cache)} materials for {material_slots} material slots')
+
+    retrieved_names = {mesh_struct.header.mesh_name for mesh_struct in mesh_structs}
+    if batch_static:
+        mesh_count = len(mesh_structs)
+        mesh_structs, processing_jobs, batch_count = batch_static_meshes(
+            mesh_structs, processing_jobs, batch_keys)
+        context.info(
+            f'static batching: merged {mesh_count - len(mesh_structs) + batch_count} meshes into '
+            f'{batch_count} batches, mesh draw calls {mesh_count} -> {len(mesh_structs)}')
+
+    # linked meshes hand their processed data to each other, so they are not split into terrain tiles
+    linked_ids = {id(mesh_struct) for pair in linked_instances for mesh_struct in pair}
+    tile_grid = min(terrain_tiles, MAX_TERRAIN_TILES) if terrain_tiles > 1 else 0
+    messages, workers, generated_lods, tiled_meshes = process_meshes(
+        processing_jobs, process_options, tile_grid, linked_ids)
+    for message in messages:
+        context.info(message)
+    lod_meshes.update(generated_lods)
+    if workers > 0:
+        lod_count = sum(len(lods) for lods in generated_lods.values())
+        mesh_count = len(processing_jobs) + lod_count + sum(len(tiles) - 1 for tiles in tiled_meshes.values())
+        context.info(f'processed {mesh_count} meshes in {workers} worker processes')
+
+    if tiled_meshes:
+        # the tiles take the place of the mesh they were split from
+        tile_count = sum(len(tiles) for tiles in tiled_meshes.values())
+        mesh_structs = [tile for mesh_struct in mesh_structs
+                        for tile in tiled_meshes.get(id(mesh_struct), [mesh_struct])]
+        context.info(f'terrain tiling: split {len(tiled_meshes)} meshes into {tile_count} tiles')
+
+    for instance, source_struct in linked_instances:
+        share_linked_geometry(instance, source_struct)
+        lod_meshes[id(instance)] = [create_linked_lod(instance, lod) for lod in lod_meshes.get(id(source_struct), [])]
+    if linked_instances:
+        context.info(f'reused the evaluated mesh data for {len(linked_instances)} linked duplicates')
+
+    if incremental:
+        # batch members and tiled meshes are only written as part of other meshes and were never processed
+        processed_ids = {id(mesh_struct) for (mesh_struct, _, _) in processing_jobs
+                         if id(mesh_struct) not in tiled_meshes}
+        for (name, fingerprint, mesh_struct, mesh_textures) in cache_updates:
+            if id(mesh_struct) not in processed_ids:
+                continue
+            MESH_CACHE.store(name, fingerprint, mesh_struct, mesh_textures, lod_meshes.get(id(mesh_struct), []))
+        MESH_CACHE.prune(retrieved_names)
+        context.info(f'incremental export: reused {MESH_CACHE.hits} cached meshes, rebuilt {MESH_CACHE.misses}')
+
+    # generated lod meshes directly follow the mesh they were created from
+    mesh_structs = [lod for mesh_struct in mesh_structs for lod in [mesh_struct] + lod_meshes.get(id(mesh_struct), [])]
     return mesh_structs, used_textures
 
 
+def merge_used_textures(used_textures, textures):
+    for texture in textures:
+        if texture not in used_textures:
+            used_textures.append(texture)
+
+
+def apply_constraint_flags(context, mesh_object, mesh_struct, meta):
+    header = mesh_struct.header
+    if mesh_struct.vert_infs:
+        header.attrs |= GEOMETRY_TYPE_SKIN
+        header.vert_channel_flags |= VERTEX_CHANNEL_BONE_ID
+
+        if len(mesh_object.constraints) > 0:
+            context.warning(f'mesh \'{mesh_object.name }\' is rigged and thus does not support any constraints!')
+
+    else:
+        if not meta.get('handled_orientation'):
+            if len(mesh_object.constraints) > 1:
+                context.warning(
+                    f'mesh \'{mesh_object.name}\' has multiple constraints applied, only \'Copy Rotation\' OR \'Damped Track\' are supported!')
+            for constraint in mesh_object.constraints:
+                if constraint.name == 'Copy Rotation':
+                    header.attrs |= GEOMETRY_TYPE_CAMERA_ORIENTED
+                    break
+                if constraint.name == 'Damped Track':
+                    header.attrs |= GEOMETRY_TYPE_CAMERA_ALIGNED
+                    break
+                context.warning(f'mesh \'{mesh_object.name}\' constraint \'{constraint.name}\' is not supported!')
+
+
+def check_bone_name(context, mesh_object, mesh_struct, bone_names):
+    if mesh_object.name not in bone_names:
+        return True
+    if mesh_struct.is_skin() or mesh_object.parent_type == 'BONE' and mesh_object.parent_bone == mesh_object.name:
+        return True
+    context.error(
+        f'mesh \'{mesh_object.name}\' has same name as bone \'{mesh_object.name}\' but is not configured properly!')
+    context.info('EITHER apply an armature modifier to it, create a vertex group with the same name as the mesh and do the weight painting OR set the armature as parent object and the identically named bone as parent bone.')
+    return False
+
+
+def create_linked_instance(mesh_object, source, container_name):
+    # shares the data of the source mesh, the header is built from the object like for any other mesh
+    instance = copy.copy(source)
+    instance.header = MeshHeader(
+        mesh_name=mesh_object.name,
+        container_name=container_name)
+
+    header = instance.header
+    meta = apply_object_settings_to_header(mesh_object, header)
+    if header.sort_level == 0:
+        header.sort_level = mesh_object.data.sort_level
+    for name in ['vert_count', 'face_count', 'matl_count', 'vert_channel_flags', 'min_corner', 'max_corner']:
+        setattr(header, name, getattr(source.header, name))
+    return instance, meta
+
+
+def create_cached_copies(entry, mesh_name, container_name):
+    # the export modifies the headers of the written meshes, so every hit gets its own headers
+    cached = copy.copy(entry.mesh_struct)
+    cached.header = copy.copy(entry.mesh_struct.header)
+    cached.header.mesh_name = mesh_name
+    cached.header.container_name = container_name
+    lods = [create_linked_lod(cached, lod) for lod in entry.lod_meshes]
+    MESH_CACHE.register_copies(entry, [cached] + lods)
+    return cached, lods
+
+
+def share_linked_geometry(instance, source):
+    # processing replaces the buffers of the source, so the instance picks them up afterwards
+    header = instance.header
+    instance.__dict__.update(source.__dict__)
+    instance.header = header
+    header.sph_center = source.header.sph_center
+    header.sph_radius = source.header.sph_radius
+
+
+def create_linked_lod(instance, lod):
+    linked = copy.copy(lod)
+    linked.header = copy.copy(instance.header)
+    linked.header.mesh_name = lod_mesh_name(instance.header.mesh_name, lod.lod_level)
+    for name in ['vert_count', 'face_count', 'min_corner', 'max_corner', 'sph_center', 'sph_radius']:
+        setattr(linked.header, name, getattr(lod.header, name))
+    linked.lod_source = instance.header.mesh_name
+    return linked
+
+
+def processing_job(mesh_struct, coords, positions, options):
+    # a snapshot of the mesh in plain arrays, the workers get neither the struct nor any mathutils value
+    vertex_count = len(mesh_struct.verts)
+    names = PACKED_VECTORS if options['pack_chunks'] else ['verts']
+    if not mesh_struct.multi_bone_skinned:
+        names = [name for name in names if name not in ['verts_2', 'normals_2']]
+    vectors = dict()
+    for name in names:
+        values = getattr(mesh_struct, name)
+        if len(values) == vertex_count and vertex_count > 0:
+            vectors[name] = np.array(values, dtype=np.float32).reshape(-1, 3)
+
+    shade_ids = None
+    if len(mesh_struct.shade_ids) == vertex_count:
+        shade_ids = np.array(mesh_struct.shade_ids, dtype=np.int64)
+
+    job = {
+        'name': mesh_struct.header.mesh_name,
+        'vertex_count': vertex_count,
+        'coords': np.asarray(coords, dtype=np.float32).reshape(-1, 3),
+        'triangles': TriangleBuffer.from_triangles(mesh_struct.triangles).data,
+        'shade_ids': shade_ids,
+        'vectors': vectors,
+    }
+    if options['lod_count'] > 0:
+        job['lod_names'] = [lod_mesh_name(mesh_struct.header.mesh_name, level)
+                            for level in range(1, options['lod_count'] + 1)]
+        job['positions'] = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        job['skin_keys'] = skin_keys(mesh_struct)
+    return job
+
+
+def apply_processing_result(mesh_struct, result):
+    if result['vertex_order'] is not None:
+        reorder_vertex_lists(mesh_struct, result['vertex_order'])
+    if result['shade_ids'] is not None:
+        mesh_struct.shade_ids = result['shade_ids'].tolist()
+
+    triangles = result['triangles']
+    mesh_struct.triangles = TriangleBuffer(
+        triangles['vert_ids'], triangles['surface_type'], triangles['normal'], triangles['distance'])
+
+    center, radius = result['sphere']
+    mesh_struct.header.sph_center = Vector(center)
+    mesh_struct.header.sph_radius = radius
+
+    if result['aabbtree'] is not None:
+        mesh_struct.aabbtree = create_aabb_tree(*result['aabbtree'])
+    mesh_struct.packed_data = result['packed_data']
+    mesh_struct.header.vert_count = len(mesh_struct.verts)
+    mesh_struct.header.face_count = len(mesh_struct.triangles)
+
+
+def apply_mesh_result(mesh_struct, result):
+    # the lods take their vertex data from the unprocessed source mesh
+    lods = [(create_lod_mesh(mesh_struct, lod['level']), lod) for lod in result['lods']]
+    apply_processing_result(mesh_struct, result)
+    for lod, lod_result in lods:
+        apply_processing_result(lod, lod_result)
+    return [lod for lod, _ in lods]
+
+
+def process_meshes(jobs, options, tile_grid=0, excluded_ids=None):
+    # the workers send back arrays and serialized chunk data, the structs are only touched in this process
+    excluded_ids = excluded_ids if excluded_ids is not None else set()
+    entries = []
+    for (mesh_struct, coords, positions) in jobs:
+        job = processing_job(mesh_struct, coords, positions, options)
+        tiles = []
+        if tile_grid > 1 and can_split_into_tiles(mesh_struct, excluded_ids):
+            tiles = split_terrain_job(job, positions, tile_grid)
+        if len(tiles) < 2:
+            entries.append((mesh_struct, None, job))
+            continue
+
+        # every tile is a job of its own, so the tiles of one mesh are processed in parallel
+        for tile_id, tile_job in tiles:
+            tile_job['name'] = terrain_tile_name(mesh_struct.header.mesh_name, tile_id)
+            if 'lod_names' in job:
+                tile_job['lod_names'] = [lod_mesh_name(tile_job['name'], level)
+                                         for level in range(1, len(job['lod_names']) + 1)]
+            entries.append((mesh_struct, tile_id, tile_job))
+
+    results, workers = process_mesh_jobs([job for (_, _, job) in entries], options)
+
+    messages = []
+    lod_meshes = dict()
+    tiled_meshes = dict()
+    for (mesh_struct, tile_id, job), (job_messages, result) in zip(entries, results):
+        if tile_id is not None:
+            tile = create_terrain_tile(mesh_struct, tile_id, job['coords'])
+            tiled_meshes.setdefault(id(mesh_struct), []).append(tile)
+            mesh_struct = tile
+        lod_meshes[id(mesh_struct)] = apply_mesh_result(mesh_struct, result)
+        messages.extend(job_messages)
+    return messages, workers, lod_meshes, tiled_meshes
+
+
+def lod_mesh_name(name, level):
+    suffix = f'_LOD{level}'
+    return name[:STRING_LENGTH - 1 - len(suffix)] + suffix
+
+
+def skin_keys(mesh_struct):
+    # vertices may only be merged with vertices that follow the same bones
+    if len(mesh_struct.vert_infs) != len(mesh_struct.verts):
+        return None
+    bones = np.array([(inf.bone_idx, inf.xtra_idx if inf.xtra_inf > 0 else -1)
+                      for inf in mesh_struct.vert_infs], dtype=np.int64).reshape(-1, 2)
+    return np.unique(bones, axis=0, return_inverse=True)[1].reshape(-1)
+
+
+def copy_material_passes(mesh_struct):
+    # the vertex data of the copies is replaced on remapping, the passes of the source are left alone
+    result = []
+    for mat_pass in mesh_struct.material_passes:
+        pass_copy = copy.copy(mat_pass)
+        pass_copy.tx_stages = [copy.copy(stage) for stage in mat_pass.tx_stages]
+        result.append(pass_copy)
+    return result
+
+
+def create_lod_mesh(mesh_struct, level):
+    lod = copy.copy(mesh_struct)
+    lod.header = copy.copy(mesh_struct.header)
+    lod.header.mesh_name = lod_mesh_name(mesh_struct.header.mesh_name, level)
+    lod.aabbtree = None
+    lod.lod_level = level
+    lod.lod_source = mesh_struct.header.mesh_name
+    lod.batched_meshes = []
+    lod.material_passes = copy_material_passes(mesh_struct)
+    return lod
+
+
+def terrain_tile_name(name, index):
+    suffix = f'_T{index}'
+    return name[:STRING_LENGTH - 1 - len(suffix)] + suffix
+
+
+def create_terrain_tile(mesh_struct, index, coords):
+    # the vertex data is taken from the source mesh when the processing result is applied
+    tile = copy.copy(mesh_struct)
+    tile.header = copy.copy(mesh_struct.header)
+    tile.header.mesh_name = terrain_tile_name(mesh_struct.header.mesh_name, index)
+    tile.aabbtree = None
+    tile.tile_source = mesh_struct.header.mesh_name
+    tile.material_passes = copy_material_passes(mesh_struct)
+    tile.header.min_corner = Vector(coords.min(axis=0).tolist())
+    tile.header.max_corner = Vector(coords.max(axis=0).tolist())
+    return tile
+
+
+def can_split_into_tiles(mesh_struct, excluded_ids):
+    return not (mesh_struct.vert_infs or mesh_struct.batched_meshes or id(mesh_struct) in excluded_ids)
+
+
+def static_batch_key(mesh_object, mesh, mesh_struct, bone_names):
+    # meshes that share pivot, materials, flags and vertex layout render identically when merged
+    if not allows_static_batching(mesh_object) or mesh_object.name in bone_names:
+        return None
+    if mesh_struct.is_skin() or mesh_struct.vert_infs or mesh_struct.is_camera_oriented() \
+            or mesh_struct.is_camera_aligned():
+        return None
+    if mesh_struct.prelit_vertex is not None or mesh_struct.prelit_unlit is not None \
+            or mesh_struct.prelit_lightmap_multi_pass is not None \
+            or mesh_struct.prelit_lightmap_multi_texture is not None:
+        return None
+
+    if mesh_object.parent_type == 'BONE' and mesh_object.parent_bone:
+        pivot = mesh_object.parent_bone
+    elif not should_export_transform(mesh_object):
+        pivot = 'ROOTTRANSFORM'
+    else:
+        # the mesh has a pivot of its own
+        return None
+
+    layout = (
+        bool(mesh_struct.tangents),
+        tuple((bool(mat_pass.dcg), bool(mat_pass.dig), bool(mat_pass.scg),
+               bool(mat_pass.tx_coords), bool(mat_pass.tx_coords_2),
+               tuple(len(stage.tx_coords) for stage in mat_pass.tx_stages))
+              for mat_pass in mesh_struct.material_passes))
+    materials = tuple(material.name if material is not None else None for material in mesh.materials)
+    header = mesh_struct.header
+    return (pivot, materials, header.attrs, header.sort_level, header.vert_channel_flags,
+            mesh_struct.user_text, layout)
+
+
+def merge_mesh_structs(mesh_structs):
+    first = mesh_structs[0]
+    merged = copy.copy(first)
+    merged.header = copy.copy(first.header)
+    merged.aabbtree = None
+    merged.batched_meshes = [mesh_struct.header.mesh_name for mesh_struct in mesh_structs]
+
+    offsets = np.cumsum([0] + [len(mesh_struct.verts) for mesh_struct in mesh_structs[:-1]]).tolist()
+    merged.triangles = TriangleBuffer.concatenate(
+        [TriangleBuffer.from_triangles(mesh_struct.triangles) for mesh_struct in mesh_structs], offsets)
+
+    # uv buffers are shared between passes and stages, keep them shared
+    merged_lists = dict()
+
+    def merge(lists):
+        key = tuple(id(values) for values in lists)
+        if key not in merged_lists:
+            if all(isinstance(values, RGBABuffer) for values in lists):
+                result = RGBABuffer.concatenate(lists)
+            else:
+                result = [value for values in lists for value in values]
+            merged_lists[key] = (lists, tuple(result) if isinstance(lists[0], tuple) else result)
+        return merged_lists[key][1]
+
+    for name in ['verts', 'verts_2', 'normals', 'normals_2', 'tangents', 'bitangents']:
+        setattr(merged, name, merge([getattr(mesh_struct, name) for mesh_struct in mesh_structs]))
+    merged.shade_ids = [shade_id + offset for (mesh_struct, offset) in zip(mesh_structs, offsets)
+                        for shade_id in mesh_struct.shade_ids]
+
+    merged.material_passes = []
+    for i, mat_pass in enumerate(first.material_passes):
+        passes = [mesh_struct.material_passes[i] for mesh_struct in mesh_structs]
+        merged_pass = copy.copy(mat_pass)
+        for name in ['dcg', 'dig', 'scg', 'tx_coords', 'tx_coords_2']:
+            setattr(merged_pass, name, merge([getattr(other, name) for other in passes]))
+        merged_pass.tx_stages = []
+        for j, stage in enumerate(mat_pass.tx_stages):
+            merged_stage = copy.copy(stage)
+            merged_stage.tx_coords = [merge([other.tx_stages[j].tx_coords[k] for other in passes])
+                                      for k in range(len(stage.tx_coords))]
+            merged_pass.tx_stages.append(merged_stage)
+        merged.material_passes.append(merged_pass)
+
+    header = merged.header
+    header.vert_count = len(merged.verts)
+    header.face_count = len(merged.triangles)
+    header.min_corner = Vector([min(mesh_struct.header.min_corner[i] for mesh_struct in mesh_structs)
+                                for i in range(3)])
+    header.max_corner = Vector([max(mesh_struct.header.max_corner[i] for mesh_struct in mesh_structs)
+                                for i in range(3)])
+    return merged
+
+
+def batch_static_meshes(mesh_structs, jobs, batch_keys, max_vertices=MAX_BATCH_VERTICES):
+    groups = dict()
+    for mesh_struct in mesh_structs:
+        key = batch_keys.get(id(mesh_struct))
+        if key is None:
+            continue
+        batches = groups.setdefault(key, [[]])
+        if sum(len(member.verts) for member in batches[-1]) + len(mesh_struct.verts) > max_vertices:
+            batches.append([])
+        batches[-1].append(mesh_struct)
+
+    # the merged mesh takes the place and the name of its first member
+    replaced = dict()
+    merged_ids = set()
+    batch_jobs = []
+    for batches in groups.values():
+        for members in batches:
+            if len(members) < 2:
+                continue
+            merged = merge_mesh_structs(members)
+            replaced[id(members[0])] = merged
+            merged_ids.update(id(member) for member in members)
+            points = np.array(merged.verts, dtype=np.float32).reshape(-1, 3)
+            batch_jobs.append((merged, points, points))
+
+    result = []
+    for mesh_struct in mesh_structs:
+        if id(mesh_struct) in replaced:
+            result.append(replaced[id(mesh_struct)])
+        elif id(mesh_struct) not in merged_ids:
+            result.append(mesh_struct)
+    jobs = [job for job in jobs if id(job[0]) not in merged_ids] + batch_jobs
+    return result, jobs, len(batch_jobs)
+
+
+def reorder_vertex_lists(mesh_struct, vertex_order):
+    # vertices missing in vertex_order are dropped, the shade ids refer to vertices and are remapped by the callers
+    vert_count = len(mesh_struct.verts)
+    order = vertex_order.tolist()
+
+    # uv buffers are shared between passes and stages, keep them shared
+    remapped = dict()
+
+    def reorder(values):
+        if len(values) != vert_count:
+            return values
+        key = id(values)
+        if key not in remapped:
+            if isinstance(values, RGBABuffer):
+                result = values.take(order)
+            else:
+                result = [values[i] for i in order]
+            remapped[key] = (values, tuple(result) if isinstance(values, tuple) else result)
+        return remapped[key][1]
+
+    for name in ['verts', 'verts_2', 'normals', 'normals_2', 'tangents', 'bitangents', 'vert_infs']:
+        setattr(mesh_struct, name, reorder(getattr(mesh_struct, name)))
+
+    for mat_pass in mesh_struct.material_passes:
+        mat_pass.dcg = reorder(mat_pass.dcg)
+        mat_pass.dig = reorder(mat_pass.dig)
+        mat_pass.scg = reorder(mat_pass.scg)
+        mat_pass.tx_coords = reorder(mat_pass.tx_coords)
+        mat_pass.tx_coords_2 = reorder(mat_pass.tx_coords_2)
+        for stage in mat_pass.tx_stages:
+            stage.tx_coords = [reorder(tx_coords) for tx_coords in stage.tx_coords]
+
+
 ##########################################################################
 # Helper methods
 ##########################################################################
 
 
-def prepare_bmesh(context, mesh):
+def smooth_mesh_normals(mesh):
+    if mesh is None or not hasattr(mesh, 'polygons'):
+        return
+    try:
+        mesh.use_auto_smooth = True
+        mesh.auto_smooth_angle = math.radians(180.0)
+        mesh.polygons.foreach_set('use_smooth', np.ones(len(mesh.polygons), dtype=bool))
+        mesh.update()
+    except AttributeError:
+        pass
+
+
+def vertex_color_buffer(layer, loop_map):
+    # every split vertex takes the color of the loop it was created from
+    colors = np.empty(len(layer.data) * 4, dtype=np.float32)
+    layer.data.foreach_get('color', colors)
+    colors = colors.reshape(-1, 4)
+
+    vertex_colors = np.ones((len(loop_map), 4), dtype=np.float32)
+    connected = loop_map >= 0
+    vertex_colors[connected] = colors[loop_map[connected]]
+    return RGBABuffer.from_colors(vertex_colors)
+
+
+def triangulate_mesh(mesh):
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    if np.all(loop_totals == 3):
+        return
+
     b_mesh = bmesh.new()
     b_mesh.from_mesh(mesh)
     bmesh.ops.triangulate(b_mesh, faces=b_mesh.faces)
     b_mesh.to_mesh(mesh)
+    b_mesh.free()
     mesh.update()
 
-    b_mesh = bmesh.new()
-    b_mesh.from_mesh(mesh)
-    b_mesh = split_multi_uv_vertices(context, mesh, b_mesh)
-    b_mesh.to_mesh(mesh)
-    mesh.update()
-    return b_mesh
+
+def vertex_coords(mesh):
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coords)
+    return coords.reshape(-1, 3)
+
+
+def scaled_vertex_positions(coords, vertex_map, scale):
+    return coords[vertex_map] * np.array(scale, dtype=np.float32)
+
+
+def build_triangles(mesh, loop_to_split, positions):
+    count = len(mesh.polygons)
+    loop_starts = np.empty(count, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loop_starts)
+    normals = np.empty(count * 3, dtype=np.float32)
+    mesh.polygons.foreach_get('normal', normals)
+    material_indices = np.empty(count, dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', material_indices)
+
+    vert_ids = loop_to_split[loop_starts[:, None] + np.arange(3)]
+
+    surface_types = np.full(count, 13, dtype=np.uint32)
+    if mesh.materials:
+        material_surface_types = np.array(
+            [resolve_triangle_surface_type(material) for material in mesh.materials], dtype=np.uint32)
+        valid = (material_indices >= 0) & (material_indices < len(material_surface_types))
+        surface_types[valid] = material_surface_types[material_indices[valid]]
+
+    distances = np.linalg.norm(positions[vert_ids].mean(axis=1), axis=1)
+    return TriangleBuffer(vert_ids, surface_types, normals.reshape(-1, 3), distances)
+
+
+def apply_face_map_surface_types(context, mesh, face_map_names, triangles):
+    # face maps are the surface types the user edits, they take precedence over the surface type attribute the
+    # importer creates since 4.0, which is only used for meshes without face maps
+    attribute = mesh.attributes.get(SURFACE_TYPE_ATTRIBUTE)
+    if face_map_names:
+        if attribute is not None:
+            context.info(f'mesh \'{mesh.name}\' has face maps, its \'{SURFACE_TYPE_ATTRIBUTE}\' attribute is ignored')
+        if bpy.app.version < (4, 0, 0):
+            # per face indices into the face maps, -1 for faces without a face map
+            for map in mesh.face_maps:
+                values = np.empty(len(map.data), dtype=np.int32)
+                map.data.foreach_get('value', values)
+                for index, name in enumerate(face_map_names):
+                    triangles.set_surface_type(np.flatnonzero(values == index), name)
+        else:
+            # the face map collection of files saved before the surface type attribute
+            for map in mesh.face_maps:
+                values = np.empty(len(map.value), dtype=np.int32)
+                map.value.foreach_get('value', values)
+                triangles.set_surface_type(values[(values >= 0) & (values < len(triangles))], map.name)
+    elif attribute is not None and attribute.domain == 'FACE' and attribute.data_type == 'INT':
+        values = np.empty(len(attribute.data), dtype=np.int32)
+        attribute.data.foreach_get('value', values)
+        values = values[:len(triangles)] - 1
+        invalid = values >= len(surface_types)
+        if invalid.any():
+            context.warning(f'mesh \'{mesh.name}\' has {np.count_nonzero(invalid)} faces with an invalid surface type')
+        assigned = np.flatnonzero((values >= 0) & ~invalid)
+        triangles.surface_types[assigned] = values[assigned]
 
 
 def resolve_triangle_surface_type(material):
@@ -503,93 +1032,73 @@ def resolve_triangle_surface_type(material):
         return 13
 
 
-def build_aabb_tree(mesh_struct, max_polys_per_leaf=4):
-    tris = mesh_struct.triangles or []
-    verts = mesh_struct.verts or []
-    if not tris or not verts:
-        return None
-
-    def tri_bounds(indices):
-        min_corner = Vector((float('inf'), float('inf'), float('inf')))
-        max_corner = Vector((float('-inf'), float('-inf'), float('-inf')))
-        for tri_idx in indices:
-            tri = tris[tri_idx]
-            for vert_id in tri.vert_ids:
-                vert = verts[vert_id]
-                min_corner.x = min(min_corner.x, vert.x)
-                min_corner.y = min(min_corner.y, vert.y)
-                min_corner.z = min(min_corner.z, vert.z)
-                max_corner.x = max(max_corner.x, vert.x)
-                max_corner.y = max(max_corner.y, vert.y)
-                max_corner.z = max(max_corner.z, vert.z)
-        return min_corner, max_corner
-
-    class _Node:
-        __slots__ = ('indices', 'front', 'back', 'min', 'max')
-
-        def __init__(self, indices):
-            self.indices = indices
-            self.front = None
-            self.back = None
-            self.min = Vector((0.0, 0.0, 0.0))
-            self.max = Vector((0.0, 0.0, 0.0))
-
-    def build(indices):
-        node = _Node(indices)
-        node.min, node.max = tri_bounds(indices)
-        if len(indices) <= max_polys_per_leaf:
-            return node
-        extent = node.max - node.min
-        axis = 0
-        if extent.y > extent.x and extent.y >= extent.z:
-            axis = 1
-        elif extent.z > extent.x and extent.z >= extent.y:
-            axis = 2
-        centroids = []
-        for idx in indices:
-            tri = tris[idx]
-            cx = sum(verts[vid][axis] for vid in tri.vert_ids) / 3.0
-            centroids.append((cx, idx))
-        centroids.sort(key=lambda item: item[0])
-        mid = len(centroids) // 2
-        if mid == 0 or mid == len(centroids):
-            return node
-        left_indices = [idx for _, idx in centroids[:mid]]
-        right_indices = [idx for _, idx in centroids[mid:]]
-        if not left_indices or not right_indices:
-            return node
-        node.front = build(left_indices)
-        node.back = build(right_indices)
-        node.indices = None
-        return node
-
-    root = build(list(range(len(tris))))
-
-    nodes = []
-    poly_indices = []
-
-    def flatten(node):
-        index = len(nodes)
-        nodes.append(None)
-        if node.front is None or node.back is None:
-            begin = len(poly_indices)
-            poly_indices.extend(node.indices or [])
-            nodes[index] = AABBTreeNode(
-                min=node.min,
-                max=node.max,
-                polys=Polys(begin=begin, count=len(node.indices or [])))
+def create_aabb_tree(nodes, poly_indices):
+    tree = AABBTree(
+        header=AABBTreeHeader(node_count=len(nodes), poly_count=len(poly_indices)),
+        poly_indices=poly_indices.tolist())
+    for node_min, node_max, front, back in zip(
+            nodes['min'].tolist(), nodes['max'].tolist(), nodes['front'].tolist(), nodes['back'].tolist()):
+        node = AABBTreeNode(min=Vector(node_min), max=Vector(node_max))
+        if front & LEAF_FLAG:
+            node.polys = Polys(begin=front & ~LEAF_FLAG, count=back)
         else:
-            front_index = flatten(node.front)
-            back_index = flatten(node.back)
-            nodes[index] = AABBTreeNode(
-                min=node.min,
-                max=node.max,
-                children=Children(front=front_index, back=back_index))
-        return index
+            node.children = Children(front=front, back=back)
+        tree.nodes.append(node)
+    tree.packed_data = {'poly_indices': poly_indices.tobytes(), 'nodes': nodes.tobytes()}
+    return tree
 
-    flatten(root)
-    header = AABBTreeHeader(node_count=len(nodes), poly_count=len(poly_indices))
-    return AABBTree(header=header, poly_indices=poly_indices, nodes=nodes)
+
+class MaterialPassTemplate:
+    def __init__(self, pass_config=None, textures=None):
+        self.pass_config = pass_config
+        self.textures = textures if textures is not None else []
+        self.shader_material = None
+        self.shader = None
+        self.vert_material = None
+        self.texture = None
+
+
+def retrieve_material_templates(context, material, force_vertex_materials=False):
+    # the mesh independent part of every pass, computed once per material and export
+    settings = getattr(material, 'w3d_material_settings', None)
+    pass_configs = list(settings.passes) if settings and settings.passes else [None]
+    original_state = snapshot_material_state(material) if settings and settings.passes else None
+    templates = []
+
+    try:
+        if not settings or not settings.passes:
+            apply_material_settings_to_legacy(material)
+
+        for pass_config in pass_configs:
+            if pass_config is not None:
+                apply_pass_to_material(material, settings, pass_config)
+
+            principled = node_shader_utils.PrincipledBSDFWrapper(material, is_readonly=True)
+            template = MaterialPassTemplate(pass_config, get_used_textures(material, principled, []))
+
+            if context.file_format == 'W3X' or (
+                    material.material_type == 'SHADER_MATERIAL' and not force_vertex_materials):
+                template.shader_material = retrieve_shader_material(context, material, principled)
+            else:
+                template.shader = retrieve_shader(material)
+                template.vert_material = retrieve_vertex_material(material, principled, settings, pass_config)
+
+                if pass_config is None:
+                    base_col_tex = principled.base_color_texture
+                    if base_col_tex is not None and base_col_tex.image is not None:
+                        img = base_col_tex.image
+                        filepath = os.path.basename(img.filepath)
+                        if filepath == '':
+                            filepath = img.name
+                        template.texture = Texture(
+                            id=img.name,
+                            file=filepath,
+                            texture_info=TextureInfo())
+            templates.append(template)
+    finally:
+        if original_state is not None:
+            restore_material_state(material, original_state)
+    return templates
 
 
 def add_stage_from_settings(stage_settings, uv_channel, tx_templates, mesh_struct, cache, mat_pass):
@@ -602,7 +1111,7 @@ def add_stage_from_settings(stage_settings, uv_channel, tx_templates, mesh_struc
 
     stage = TextureStage(
         tx_ids=[[tex_index]],
-        tx_coords=copy_uv_coords(tx_templates, uv_channel))
+        tx_coords=shared_uv_coords(tx_templates, uv_channel))
 
     mat_pass.tx_stages.append(stage)
     return True
@@ -637,7 +1146,7 @@ def ensure_texture_slot(stage_settings, mesh_struct, cache):
     return index
 
 
-def copy_uv_coords(tx_templates, uv_channel):
+def shared_uv_coords(tx_templates, uv_channel):
     if not tx_templates:
         return []
     if uv_channel is None or uv_channel <= 0:
@@ -647,8 +1156,8 @@ def copy_uv_coords(tx_templates, uv_channel):
     template = tx_templates[index]
     if not template.tx_coords:
         return []
-    coords = [vec.copy() for vec in template.tx_coords[0]]
-    return [coords]
+    # the uv buffers are immutable, so stages on the same channel can share them
+    return [template.tx_coords[0]]
 
 
 def find_bone_index(hierarchy, mesh_object, group):
@@ -659,79 +1168,62 @@ def find_bone_index(hierarchy, mesh_object, group):
     raise Exception(f'no matching armature bone found for vertex group \'{mesh_object.vertex_groups[group].name}\'')
 
 
-def split_multi_uv_vertices(context, mesh, b_mesh):
-    b_mesh.verts.ensure_lookup_table()
+def gather_vertex_weights(mesh_object, mesh):
+    # vertex groups have no foreach_get, this is the only pass over them per mesh and export
+    if not mesh_object.vertex_groups:
+        return np.zeros(len(mesh.vertices), dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
 
-    for ver in b_mesh.verts:
-        ver.select_set(False)
+    groups = [vertex.groups for vertex in mesh.vertices]
+    counts = np.fromiter(map(len, groups), dtype=np.int32, count=len(groups))
+    elements = [element for vertex_groups in groups for element in vertex_groups]
+    group_ids = np.fromiter((element.group for element in elements), dtype=np.int32, count=len(elements))
+    weights = np.fromiter((element.weight for element in elements), dtype=np.float32, count=len(elements))
+    return counts, group_ids, weights
 
+
+def gather_loop_uvs(mesh):
+    loop_count = len(mesh.loops)
+    loop_uvs = np.empty((loop_count, 2 * len(mesh.uv_layers)), dtype=np.float32)
+    uvs = np.empty(loop_count * 2, dtype=np.float32)
     for i, uv_layer in enumerate(mesh.uv_layers):
-        tx_coords = [None] * len(uv_layer.data)
-        for j, face in enumerate(b_mesh.faces):
-            for loop in face.loops:
-                vert_index = mesh.polygons[j].vertices[loop.index % 3]
-                if tx_coords[vert_index] is None:
-                    tx_coords[vert_index] = uv_layer.data[loop.index].uv
-                elif tx_coords[vert_index] != uv_layer.data[loop.index].uv:
-                    b_mesh.verts[vert_index].select_set(True)
-                    vert_index2 = mesh.polygons[j].vertices[(loop.index + 1) % 3]
-                    b_mesh.verts[vert_index2].select_set(True)
-                    vert_index3 = mesh.polygons[j].vertices[(loop.index - 1) % 3]
-                    b_mesh.verts[vert_index3].select_set(True)
-
-    split_edges = [e for e in b_mesh.edges if e.verts[0].select and e.verts[1].select]
-
-    if len(split_edges) > 0:
-        bmesh.ops.split_edges(b_mesh, edges=split_edges)
-        context.info(f'mesh \'{mesh.name}\' vertices have been split because of multiple uv coordinates per vertex!')
+        uv_layer.data.foreach_get('uv', uvs)
+        loop_uvs[:, 2 * i:2 * i + 2] = uvs.reshape(-1, 2)
+    return loop_uvs
 
-    return b_mesh
 
+def scatter_uv_coords(loop_uvs, loop_to_split, vert_count):
+    buffers = []
+    for i in range(loop_uvs.shape[1] // 2):
+        coords = np.zeros((vert_count, 2), dtype=np.float32)
+        coords[loop_to_split] = loop_uvs[:, 2 * i:2 * i + 2]
+        buffers.append(tuple(Vector(uv).freeze() for uv in coords.tolist()))
+    return buffers
 
-def vertices_to_vectors(vertices):
-    vectors = []
-    for vert in vertices:
-        vectors.append(Vector(vert.co.xyz))
-    return vectors
 
+def split_multi_uv_vertices(context, mesh, loop_uvs=None):
+    if loop_uvs is None:
+        loop_uvs = gather_loop_uvs(mesh)
 
-def distance(vec1, vec2):
-    x = (vec1.x - vec2.x) ** 2
-    y = (vec1.y - vec2.y) ** 2
-    z = (vec1.z - vec2.z) ** 2
-    return (x + y + z) ** 0.5
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
 
+    vertex_map, loop_map, loop_to_split = split_vertices(loop_vertices, loop_uvs, len(mesh.vertices))
+
+    if len(vertex_map) > len(mesh.vertices):
+        context.info(f'mesh \'{mesh.name}\' vertices have been split because of multiple uv coordinates per vertex!')
+
+    return vertex_map, loop_map, loop_to_split
 
-def find_most_distant_point(vertex, vertices):
-    result = vertices[0]
-    dist = 0
-    for x in vertices:
-        curr_dist = distance(x, vertex)
-        if curr_dist > dist:
-            dist = curr_dist
-            result = x
-    return result
 
+def calculate_mesh_sphere(mesh, exact=False):
+    return calculate_sphere(vertex_coords(mesh), exact=exact)
 
-def validate_all_points_inside_sphere(center, radius, vertices):
-    for vertex in vertices:
-        curr_dist = distance(vertex, center)
-        if curr_dist > radius:
-            delta = (curr_dist - radius) / 2
-            radius += delta
-            center += (vertex - center).normalized() * delta
-    return center, radius
 
+def calculate_sphere(points, exact=False):
+    center, radius = bounding_sphere(points, exact=exact)
+    return Vector(center), radius
 
-def calculate_mesh_sphere(mesh):
-    vertices = vertices_to_vectors(mesh.vertices)
-    x = find_most_distant_point(vertices[0], vertices)
-    y = find_most_distant_point(x, vertices)
-    z = (x - y) / 2
-    center = y + z
-    radius = z.length
 
-    return validate_all_points_inside_sphere(center, radius, vertices)
 ANIM_MODE_TO_INT = {
     'LOOP': 0,
     'PINGPONG': 1,
@@ -2,21 +2,32 @@
 # Written by Stephan Vedder and Michael Schnabel
 
 import bpy
-import bmesh
+import hashlib
+import io
+import numpy as np
+from io_mesh_w3d.common.structs.rgba import RGBA, RGBABuffer
+from io_mesh_w3d.common.structs.mesh_structs.triangle import TriangleBuffer, surface_types, SURFACE_TYPE_ATTRIBUTE
 from io_mesh_w3d.common.utils.material_import import *
 from io_mesh_w3d.common.utils.object_settings_bridge import populate_object_settings_from_mesh
 from io_mesh_w3d.common.utils.hierarchy_import import pivot_world_matrix
 
 
-def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None):
+def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None, shared_meshes=None,
+                material_cache=None, links=None):
     context.info(f'creating mesh \'{mesh_struct.name()}\'')
 
-    triangles = []
-    for triangle in mesh_struct.triangles:
-        triangles.append(tuple(triangle.vert_ids))
+    # skins are excluded, rigging writes the skinned positions into the mesh data
+    geometry_key = None
+    if shared_meshes is not None and not mesh_struct.is_skin():
+        geometry_key = mesh_geometry_key(mesh_struct)
+        source_ob = bpy.data.objects.get(shared_meshes.get(geometry_key, ''))
+        if source_ob is not None:
+            return create_shared_mesh_object(context, mesh_struct, coll, hierarchy, sub_object, source_ob, links)
+
+    triangles = triangle_index_array(mesh_struct.triangles)
 
     mesh = bpy.data.meshes.new(mesh_struct.name())
-    mesh.from_pydata(mesh_struct.verts, [], triangles)
+    build_mesh_geometry(mesh, mesh_struct.verts, triangles)
 
     # fix repeated opeing bug: blender will rename the new mesh with .001, .002 suffix
     # we need to save the actual name of the mesh!
@@ -24,7 +35,7 @@ def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None):
     if actual_mesh_name != mesh_struct.name():
         context.warning("Mesh name automatically fixed due to duplication, new name: " + actual_mesh_name)
 
-    mesh.normals_split_custom_set_from_vertices(mesh_struct.normals)
+    mesh.normals_split_custom_set_from_vertices(np.asarray(mesh_struct.normals, dtype=np.float32).reshape(-1, 3))
     if bpy.app.version < (4, 2, 0):
         mesh.use_auto_smooth = True
 
@@ -37,57 +48,13 @@ def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None):
     mesh_ob = bpy.data.objects.new(actual_mesh_name, mesh)
     mesh_struct.header.mesh_name = actual_mesh_name
 
-    mesh_ob.use_empty_image_alpha = True
-    populate_object_settings_from_mesh(mesh_ob, mesh_struct)
-
-    link_object_to_active_scene(mesh_ob, coll)
-
-    if (not mesh_struct.is_skin()) and hierarchy is not None and sub_object is not None:
-        bone_index = getattr(sub_object, 'bone_index', -1)
-        if 0 <= bone_index < len(hierarchy.pivots):
-            rest_matrix = pivot_world_matrix(hierarchy, bone_index)
-            if rest_matrix is not None:
-                mesh_ob.matrix_world = rest_matrix
-
-    if (not mesh_struct.is_skin()) and hierarchy is not None and sub_object is not None:
-        bone_index = getattr(sub_object, 'bone_index', -1)
-        if 0 <= bone_index < len(hierarchy.pivots):
-            rest_matrix = pivot_world_matrix(hierarchy, bone_index)
-            if rest_matrix is not None:
-                mesh_ob.matrix_world = rest_matrix
-
-    if mesh_struct.is_hidden():
-        mesh_ob.hide_set(True)
-
-    if mesh_struct.is_camera_oriented():
-        constraint = mesh_ob.constraints.new('COPY_ROTATION')
-        constraint.target = bpy.context.scene.camera
-        constraint.use_x = False
-        constraint.use_y = False
-        constraint.use_z = True
-        constraint.invert_z = True
+    setup_mesh_object(mesh_struct, mesh_ob, coll, hierarchy, sub_object, links)
 
-    if mesh_struct.is_camera_aligned():
-        constraint = mesh_ob.constraints.new('DAMPED_TRACK')
-        constraint.target = bpy.context.scene.camera
-        constraint.track_axis = 'TRACK_X'
+    if geometry_key is not None:
+        shared_meshes[geometry_key] = mesh_ob.name
 
     if context.file_format == 'W3D':
-        for i, triangle in enumerate(mesh_struct.triangles):
-            surface_type_name = triangle.get_surface_type_name(context, i)
-            if bpy.app.version < (4, 0, 0):
-                if surface_type_name not in mesh_ob.face_maps:
-                    mesh_ob.face_maps.new(name=surface_type_name)
-            else:
-                if surface_type_name not in mesh.face_maps:
-                    face_map = mesh.face_maps.add()
-                    face_map.name = surface_type_name
-
-            if bpy.app.version < (4, 0, 0):
-                mesh_ob.face_maps[surface_type_name].add([i])
-            else:
-                val = mesh.face_maps[surface_type_name].value.add()
-                val.value = i
+        create_surface_types(context, mesh, mesh_ob, mesh_struct.triangles)
 
     for i, mat_pass in enumerate(mesh_struct.material_passes):
         create_vertex_color_layer(mesh, mat_pass.dcg, 'DCG', i)
@@ -97,19 +64,16 @@ def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None):
     principleds = []
 
     # vertex material stuff
-    b_mesh = bmesh.new()
-    b_mesh.from_mesh(mesh)
-
     if mesh_struct.vert_materials:
         create_vertex_material(
-            context, principleds, mesh_struct, mesh, b_mesh, actual_mesh_name, triangles, mesh_ob)
+            context, principleds, mesh_struct, mesh, actual_mesh_name, triangles, mesh_ob, material_cache)
 
         for i, shader in enumerate(mesh_struct.shaders):
             set_shader_properties(mesh.materials[min(i, len(mesh.materials) - 1)], shader)
 
     elif mesh_struct.prelit_vertex:
         create_vertex_material(context, principleds, mesh_struct.prelit_vertex,
-                               mesh, b_mesh, actual_mesh_name, triangles, mesh_ob)
+                               mesh, actual_mesh_name, triangles, mesh_ob, material_cache)
 
         for i, shader in enumerate(mesh_struct.prelit_vertex.shaders):
             set_shader_properties(mesh.materials[i], shader)
@@ -118,13 +82,13 @@ def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None):
     elif mesh_struct.shader_materials:
         for i, shaderMat in enumerate(mesh_struct.shader_materials):
             material, principled = create_material_from_shader_material(
-                context, actual_mesh_name, shaderMat)
+                context, actual_mesh_name, shaderMat, material_cache)
             mesh.materials.append(material)
             principleds.append(principled)
 
         for mat_pass in mesh_struct.material_passes:
-            create_uvlayer(context, mesh, b_mesh, triangles, mat_pass)
-            create_uvlayer_2(context, mesh, b_mesh, triangles, mat_pass)
+            create_uvlayer(context, mesh, triangles, mat_pass)
+            create_uvlayer_2(context, mesh, triangles, mat_pass)
 
     mesh.update()
     if mesh.validate(verbose=True):
@@ -133,6 +97,166 @@ def create_mesh(context, mesh_struct, coll, hierarchy=None, sub_object=None):
     return mesh.name
 
 
+def setup_mesh_object(mesh_struct, mesh_ob, coll, hierarchy=None, sub_object=None, links=None):
+    mesh_ob.use_empty_image_alpha = True
+    populate_object_settings_from_mesh(mesh_ob, mesh_struct)
+
+    link_object_to_active_scene(mesh_ob, coll, links)
+
+    if (not mesh_struct.is_skin()) and hierarchy is not None and sub_object is not None:
+        bone_index = getattr(sub_object, 'bone_index', -1)
+        if 0 <= bone_index < len(hierarchy.pivots):
+            rest_matrix = pivot_world_matrix(hierarchy, bone_index)
+            if rest_matrix is not None:
+                mesh_ob.matrix_world = rest_matrix
+
+    if mesh_struct.is_hidden():
+        hide_object(mesh_ob, links)
+
+    if mesh_struct.is_camera_oriented():
+        constraint = mesh_ob.constraints.new('COPY_ROTATION')
+        constraint.target = bpy.context.scene.camera
+        constraint.use_x = False
+        constraint.use_y = False
+        constraint.use_z = True
+        constraint.invert_z = True
+
+    if mesh_struct.is_camera_aligned():
+        constraint = mesh_ob.constraints.new('DAMPED_TRACK')
+        constraint.target = bpy.context.scene.camera
+        constraint.track_axis = 'TRACK_X'
+
+
+def _update_buffer(hasher, values, dtype):
+    # the shape keeps the content of neighbouring buffers apart
+    if isinstance(values, RGBABuffer):
+        values = values.data
+    elif len(values) and isinstance(values[0], RGBA):
+        values = [(color.r, color.g, color.b, color.a) for color in values]
+    data = np.ascontiguousarray(values, dtype=dtype)
+    hasher.update(repr(data.shape).encode('utf-8'))
+    hasher.update(data.tobytes())
+
+
+def _update_chunks(hasher, structs):
+    io_stream = io.BytesIO()
+    for struct in structs:
+        if struct is not None:
+            struct.write(io_stream)
+    hasher.update(repr(io_stream.tell()).encode('utf-8'))
+    hasher.update(io_stream.getvalue())
+
+
+def mesh_geometry_key(mesh_struct):
+    # only called with share_identical_meshes enabled, the names are left out of the key
+    hasher = hashlib.blake2b(digest_size=20)
+    header = mesh_struct.header
+    hasher.update(repr((header.attrs, header.sort_level, mesh_struct.user_text)).encode('utf-8'))
+    _update_buffer(hasher, mesh_struct.verts, np.float32)
+    _update_buffer(hasher, mesh_struct.normals, np.float32)
+
+    hasher.update(TriangleBuffer.from_triangles(mesh_struct.triangles).data.tobytes())
+
+    for mat_pass in mesh_struct.material_passes:
+        _update_buffer(hasher, mat_pass.vertex_material_ids, np.int32)
+        _update_buffer(hasher, mat_pass.shader_ids, np.int32)
+        _update_buffer(hasher, mat_pass.shader_material_ids, np.int32)
+        for colors in [mat_pass.dcg, mat_pass.dig, mat_pass.scg]:
+            _update_buffer(hasher, colors, np.uint8)
+        _update_buffer(hasher, mat_pass.tx_coords, np.float32)
+        _update_buffer(hasher, mat_pass.tx_coords_2, np.float32)
+        for stage in mat_pass.tx_stages:
+            hasher.update(repr((len(stage.tx_ids), len(stage.tx_coords))).encode('utf-8'))
+            for tx_ids in stage.tx_ids:
+                _update_buffer(hasher, tx_ids, np.int32)
+            for tx_coords in stage.tx_coords:
+                _update_buffer(hasher, tx_coords, np.float32)
+
+    # the material chunks are small, their serialized form is hashed as a whole
+    _update_chunks(hasher, mesh_struct.shaders)
+    _update_chunks(hasher, mesh_struct.vert_materials)
+    _update_chunks(hasher, mesh_struct.textures)
+    _update_chunks(hasher, mesh_struct.shader_materials)
+    _update_chunks(hasher, [mesh_struct.prelit_unlit, mesh_struct.prelit_vertex,
+                            mesh_struct.prelit_lightmap_multi_pass, mesh_struct.prelit_lightmap_multi_texture])
+    return hasher.digest()
+
+
+def create_shared_mesh_object(context, mesh_struct, coll, hierarchy, sub_object, source_ob, links=None):
+    mesh_ob = bpy.data.objects.new(mesh_struct.name(), source_ob.data)
+    actual_mesh_name = mesh_ob.name
+    if actual_mesh_name != mesh_struct.name():
+        context.warning("Mesh name automatically fixed due to duplication, new name: " + actual_mesh_name)
+    mesh_struct.header.mesh_name = actual_mesh_name
+    context.info(f'mesh \'{actual_mesh_name}\' shares the mesh data of \'{source_ob.name}\'')
+
+    setup_mesh_object(mesh_struct, mesh_ob, coll, hierarchy, sub_object, links)
+
+    # before 4.0 the face map names are stored on the object, the mesh only holds the indices
+    if bpy.app.version < (4, 0, 0):
+        for face_map in source_ob.face_maps:
+            mesh_ob.face_maps.new(name=face_map.name)
+    return actual_mesh_name
+
+
+def triangle_index_array(triangles):
+    if isinstance(triangles, TriangleBuffer):
+        return triangles.vert_ids.astype(np.int32)
+    return np.array([triangle.vert_ids for triangle in triangles], dtype=np.int32).reshape(-1, 3)
+
+
+def surface_type_ids(context, triangles):
+    if isinstance(triangles, TriangleBuffer):
+        type_ids = triangles.surface_types.astype(np.int64)
+    else:
+        type_ids = np.array([triangle.surface_type for triangle in triangles], dtype=np.int64)
+
+    invalid = type_ids >= len(surface_types)
+    for index in np.flatnonzero(invalid):
+        context.warning(f'triangle {index} has an invalid surface type \'{type_ids[index]}\'')
+    type_ids[invalid] = surface_types.index('Default')
+    return type_ids
+
+
+def surface_type_groups(type_ids):
+    # face maps are created in the order their surface type first occurs
+    unique_ids, first_faces = np.unique(type_ids, return_index=True)
+    groups = []
+    for type_id in unique_ids[np.argsort(first_faces)]:
+        groups.append((surface_types[type_id], np.flatnonzero(type_ids == type_id)))
+    return groups
+
+
+def create_surface_types(context, mesh, mesh_ob, triangles):
+    type_ids = surface_type_ids(context, triangles)
+    if bpy.app.version < (4, 0, 0):
+        for name, face_ids in surface_type_groups(type_ids):
+            mesh_ob.face_maps.new(name=name).add(face_ids.tolist())
+        return
+
+    attribute = mesh.attributes.new(SURFACE_TYPE_ATTRIBUTE, 'INT', 'FACE')
+    attribute.data.foreach_set('value', (type_ids + 1).astype(np.int32))
+
+
+def build_mesh_geometry(mesh, positions, triangles):
+    # same result as from_pydata, but everything is handed over as flat arrays
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=np.int32).reshape(-1, 3)
+
+    mesh.vertices.add(len(positions))
+    mesh.loops.add(triangles.size)
+    mesh.polygons.add(len(triangles))
+
+    mesh.vertices.foreach_set('co', positions.ravel())
+    mesh.loops.foreach_set('vertex_index', triangles.ravel())
+    mesh.polygons.foreach_set('loop_start', np.arange(0, triangles.size, 3, dtype=np.int32))
+    # newer versions derive the loop totals from the loop starts
+    if not bpy.types.MeshPolygon.bl_rna.properties['loop_total'].is_readonly:
+        mesh.polygons.foreach_set('loop_total', np.full(len(triangles), 3, dtype=np.int32))
+
+    mesh.update(calc_edges=True)
+
+
 def rig_mesh(mesh_struct, hierarchy, rig, sub_object=None):
     mesh_ob = bpy.data.objects[mesh_struct.name()]
 
@@ -141,41 +265,57 @@ def rig_mesh(mesh_struct, hierarchy, rig, sub_object=None):
 
     if mesh_struct.is_skin():
         mesh = bpy.data.meshes[mesh_ob.name]
-        normals = mesh_struct.normals.copy()
-        for i, vert_inf in enumerate(mesh_struct.vert_infs):
-            weight = vert_inf.bone_inf
-            xtra_weight = vert_inf.xtra_inf
-
-            if weight < 0.01 and xtra_weight < 0.01:
-                weight = 1.0
-
-            pivot = hierarchy.pivots[vert_inf.bone_idx]
-            if vert_inf.bone_idx == 0 and rig is not None:
+        vert_infs = mesh_struct.vert_infs
+        count = len(vert_infs)
+
+        bone_ids = np.array([vert_inf.bone_idx for vert_inf in vert_infs], dtype=np.int64)
+        xtra_ids = np.array([vert_inf.xtra_idx for vert_inf in vert_infs], dtype=np.int64)
+        weights = np.array([vert_inf.bone_inf for vert_inf in vert_infs], dtype=np.float64)
+        xtra_weights = np.array([vert_inf.xtra_inf for vert_inf in vert_infs], dtype=np.float64)
+        weights[(weights < 0.01) & (xtra_weights < 0.01)] = 1.0
+
+        # vertex groups are created in the order the bones are first referenced
+        referenced = np.stack([bone_ids, np.where(xtra_ids > 0, xtra_ids, -1)], axis=1).ravel()
+        referenced = referenced[referenced >= 0]
+        unique_ids, first_references = np.unique(referenced, return_index=True)
+        for bone_id in unique_ids[np.argsort(first_references)]:
+            name = hierarchy.pivots[bone_id].name
+            if name not in mesh_ob.vertex_groups:
+                mesh_ob.vertex_groups.new(name=name)
+
+        vertex_ids = np.arange(count)
+        add_vertex_weights(mesh_ob, hierarchy, vertex_ids, bone_ids, weights, 'REPLACE')
+        has_xtra = xtra_ids > 0
+        add_vertex_weights(mesh_ob, hierarchy, vertex_ids[has_xtra], xtra_ids[has_xtra], xtra_weights[has_xtra], 'ADD')
+
+        positions = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', positions)
+        positions = positions.reshape(-1, 3)
+        verts = np.array(mesh_struct.verts[:count], dtype=np.float64).reshape(-1, 3)
+        normals = np.array(mesh_struct.normals, dtype=np.float64).reshape(-1, 3)
+        skin_normals = normals[:count].copy()
+
+        for bone_id in np.unique(bone_ids):
+            if bone_id == 0 and rig is not None:
                 matrix = rig.matrix_local
             else:
-                matrix = rig.data.bones[pivot.name].matrix_local
-
-            if pivot.name not in mesh_ob.vertex_groups:
-                mesh_ob.vertex_groups.new(name=pivot.name)
-            mesh_ob.vertex_groups[pivot.name].add([i], weight, 'REPLACE')
-
-            if vert_inf.xtra_idx > 0:
-                xtra_pivot = hierarchy.pivots[vert_inf.xtra_idx]
-                if xtra_pivot.name not in mesh_ob.vertex_groups:
-                    mesh_ob.vertex_groups.new(name=xtra_pivot.name)
-                mesh_ob.vertex_groups[xtra_pivot.name].add([i], xtra_weight, 'ADD')
+                matrix = rig.data.bones[hierarchy.pivots[bone_id].name].matrix_local
+            _, rotation, _ = matrix.decompose()
+            matrix = np.array(matrix, dtype=np.float64)
+            rotation = np.array(rotation.to_matrix(), dtype=np.float64)
 
-            mesh.vertices[i].co = matrix @ mesh_struct.verts[i]
+            mask = bone_ids == bone_id
+            positions[:count][mask] = verts[mask] @ matrix[:3, :3].T + matrix[:3, 3]
+            normals[:count][mask] = skin_normals[mask] @ rotation.T
 
-            _, rotation, _ = matrix.decompose()
-            normals[i] = rotation @ mesh_struct.normals[i]
+        mesh.vertices.foreach_set('co', positions.ravel())
 
         modifier = mesh_ob.modifiers.new(rig.name, 'ARMATURE')
         modifier.object = rig
         modifier.use_bone_envelopes = False
         modifier.use_vertex_groups = True
 
-        mesh.normals_split_custom_set_from_vertices(normals)
+        mesh.normals_split_custom_set_from_vertices(normals.astype(np.float32))
 
         mesh.update()
         mesh.validate()
@@ -190,10 +330,34 @@ def rig_mesh(mesh_struct, hierarchy, rig, sub_object=None):
                     mesh_ob.matrix_world = rest_matrix
 
 
+def add_vertex_weights(mesh_ob, hierarchy, vertex_ids, bone_ids, weights, mode):
+    # one add call per (bone, weight) pair instead of one per vertex
+    if len(vertex_ids) == 0:
+        return
+    order = np.lexsort((weights, bone_ids))
+    bone_ids, weights, vertex_ids = bone_ids[order], weights[order], vertex_ids[order]
+    starts = np.flatnonzero((np.diff(bone_ids) != 0) | (np.diff(weights) != 0)) + 1
+
+    for group_ids, first in zip(np.split(vertex_ids, starts), np.r_[0, starts]):
+        name = hierarchy.pivots[bone_ids[first]].name
+        mesh_ob.vertex_groups[name].add(group_ids.tolist(), float(weights[first]), mode)
+
+
 def create_vertex_color_layer(mesh, colors, name, index):
     if not colors:
         return
-    layer = mesh.vertex_colors.new(name=f'{name}_{index}')
+    if isinstance(colors, RGBABuffer):
+        vertex_colors = colors.to_vector_rgba()
+    else:
+        vertex_colors = np.array([color.to_vector_rgba() for color in colors], dtype=np.float32)
+
+    vertex_ids = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', vertex_ids)
 
-    for i, loop in enumerate(mesh.loops):
-        layer.data[i].color = colors[loop.vertex_index].to_vector_rgba()
+    # byte color attributes store 4 bytes per loop, 'color_srgb' keeps the values unconverted like vertex_colors
+    if bpy.app.version >= (3, 4, 0):
+        layer = mesh.color_attributes.new(f'{name}_{index}', 'BYTE_COLOR', 'CORNER')
+        layer.data.foreach_set('color_srgb', vertex_colors[vertex_ids].ravel())
+    else:
+        layer = mesh.vertex_colors.new(name=f'{name}_{index}')
+        layer.data.foreach_set('color', vertex_colors[vertex_ids].ravel())
@@ -0,0 +1,305 @@
+# <pep8 compliant>
+# Processing stage of the mesh export on plain arrays, run in worker processes.
+
+import multiprocessing
+import os
+import runpy
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from io_mesh_w3d.common.utils.bounding_sphere import ritter_sphere, minimal_sphere
+from io_mesh_w3d.common.utils.decimation import decimate, face_normals
+from io_mesh_w3d.common.utils.vertex_cache import average_cache_miss_ratio, tipsify, first_use_vertex_order
+
+# the workers import this module without initializing the add-on package, so neither this module nor
+# anything it imports may depend on bpy or mathutils
+WORKER_BOOTSTRAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'process_worker.py')
+
+# below this many triangles starting the worker processes takes longer than the processing itself
+MIN_POOL_TRIANGLES = 20000
+
+TRIANGLE_DTYPE = np.dtype([
+    ('vert_ids', '<u4', (3,)),
+    ('surface_type', '<u4'),
+    ('normal', '<f4', (3,)),
+    ('distance', '<f4')])
+
+AABB_NODE_DTYPE = np.dtype([
+    ('min', '<f4', (3,)),
+    ('max', '<f4', (3,)),
+    ('front', '<u4'),
+    ('back', '<u4')])
+
+LEAF_FLAG = 0x80000000
+
+# per vertex lists that are serialized by the workers, in the layout of their W3D chunks
+PACKED_VECTORS = ['verts', 'verts_2', 'normals', 'normals_2', 'tangents', 'bitangents']
+
+
+def build_aabb_nodes(points, indices, max_polys_per_leaf=4):
+    """Return the nodes (AABB_NODE_DTYPE) and poly indices of an AABB tree over the (n, 3) index buffer.
+
+    Nodes are emitted depth first, a node is followed by its front and then its back subtree. Leaves
+    store the begin of their polys with LEAF_FLAG set in front and their poly count in back.
+    """
+    if len(indices) == 0 or len(points) == 0:
+        return None
+
+    tri_points = np.asarray(points, dtype=np.float32)[indices]
+    tri_mins = tri_points.min(axis=1)
+    tri_maxs = tri_points.max(axis=1)
+    centroids = tri_points.sum(axis=1) / 3.0
+
+    nodes = []
+    poly_indices = []
+
+    def build(triangle_ids):
+        node_min = tri_mins[triangle_ids].min(axis=0)
+        node_max = tri_maxs[triangle_ids].max(axis=0)
+        index = len(nodes)
+        nodes.append(None)
+
+        if len(triangle_ids) > max_polys_per_leaf:
+            extent = node_max - node_min
+            axis = 0
+            if extent[1] > extent[0] and extent[1] >= extent[2]:
+                axis = 1
+            elif extent[2] > extent[0] and extent[2] >= extent[1]:
+                axis = 2
+            triangle_ids = triangle_ids[np.lexsort((triangle_ids, centroids[triangle_ids, axis]))]
+            mid = len(triangle_ids) // 2
+
+            front_index = build(triangle_ids[:mid])
+            back_index = build(triangle_ids[mid:])
+            nodes[index] = (node_min, node_max, front_index, back_index)
+        else:
+            nodes[index] = (node_min, node_max, len(poly_indices) | LEAF_FLAG, len(triangle_ids))
+            poly_indices.extend(triangle_ids.tolist())
+        return index
+
+    build(np.arange(len(indices)))
+    return np.array(nodes, dtype=AABB_NODE_DTYPE), np.array(poly_indices, dtype='<i4')
+
+
+def bounding_sphere(points, exact=False):
+    if exact:
+        center, radius = minimal_sphere(points)
+    else:
+        center, radius = ritter_sphere(points)
+    return tuple(float(value) for value in center), float(radius)
+
+
+def reorder_triangles(triangles, triangle_order, vertex_order, vertex_count):
+    # vertices missing in vertex_order are dropped, the triangles must not use them anymore
+    vertex_remap = np.full(vertex_count, -1, dtype=np.int64)
+    vertex_remap[vertex_order] = np.arange(len(vertex_order))
+    triangles = triangles[triangle_order]
+    triangles['vert_ids'] = vertex_remap[triangles['vert_ids']]
+    return triangles, vertex_remap
+
+
+def process_geometry(job, options):
+    # the processing shared by the meshes and their lods
+    messages = []
+    triangles = job['triangles']
+    vectors = job['vectors']
+    shade_ids = job['shade_ids']
+    vertex_count = job['vertex_count']
+    vertex_order = None
+
+    if options['optimize_vertex_cache'] and len(triangles):
+        indices = triangles['vert_ids'].astype(np.int64)
+        before = average_cache_miss_ratio(indices)
+        triangle_order = tipsify(indices, vertex_count)
+        vertex_order = first_use_vertex_order(indices[triangle_order], vertex_count)
+        triangles, vertex_remap = reorder_triangles(triangles, triangle_order, vertex_order, vertex_count)
+        if shade_ids is not None:
+            shade_ids = vertex_remap[shade_ids[vertex_order]]
+            # shade ids of dropped vertices fall back to the vertex itself
+            unmapped = shade_ids < 0
+            shade_ids[unmapped] = np.flatnonzero(unmapped)
+        vectors = {name: values[vertex_order] for name, values in vectors.items()}
+        after = average_cache_miss_ratio(triangles['vert_ids'].astype(np.int64))
+        messages.append(
+            f'mesh \'{job["name"]}\' vertex cache optimized, ACMR {before:.3f} -> {after:.3f}')
+
+    aabbtree = None
+    # built last, the poly indices refer to the final triangle order
+    if options['build_aabbtree']:
+        aabbtree = build_aabb_nodes(vectors['verts'], triangles['vert_ids'].astype(np.int64))
+
+    packed_data = dict()
+    if options['pack_chunks']:
+        packed_data = {name: values.astype('<f4').tobytes() for name, values in vectors.items()}
+        if shade_ids is not None:
+            packed_data['shade_ids'] = shade_ids.astype('<i4').tobytes()
+
+    result = {
+        'vertex_order': vertex_order,
+        'triangles': triangles,
+        'shade_ids': shade_ids,
+        'sphere': bounding_sphere(job['coords'], exact=options['exact_sphere']),
+        'aabbtree': aabbtree,
+        'packed_data': packed_data,
+    }
+    return messages, result
+
+
+def decimate_levels(job, options):
+    """Simplify the job geometry to its lod levels, every level is simplified further from the previous one.
+
+    Yields the level, the order of the job vertices it keeps and its triangle records.
+    """
+    positions = job['positions']
+    keys = job['skin_keys']
+    vertex_order = np.arange(job['vertex_count'])
+    triangles = job['triangles']
+    for level in range(1, len(job['lod_names']) + 1):
+        target_count = max(1, int(len(job['triangles']) * options['lod_ratio'] ** level))
+        indices = triangles['vert_ids'].astype(np.int64)
+        level_positions = positions[vertex_order]
+        kept, lod_indices = decimate(
+            level_positions, indices, target_count, keys[vertex_order] if keys is not None else None)
+        if len(kept) == len(indices) or len(kept) == 0:
+            return
+
+        triangles = triangles[kept]
+        triangles['vert_ids'] = lod_indices
+        triangles['normal'], _ = face_normals(level_positions, lod_indices)
+        triangles['distance'] = np.linalg.norm(level_positions[lod_indices].mean(axis=1), axis=1)
+
+        # every level keeps only the vertices it uses
+        level_order = first_use_vertex_order(lod_indices, len(vertex_order))[:len(np.unique(lod_indices))]
+        triangles, _ = reorder_triangles(triangles, np.arange(len(triangles)), level_order, len(vertex_order))
+        vertex_order = vertex_order[level_order]
+        yield level, vertex_order, triangles
+
+
+def vertex_subset_job(job, vertex_order, triangles, name, coords):
+    # a job for part of the job vertices, the triangles must already refer to the vertices in vertex_order
+    shade_ids = job['shade_ids']
+    if shade_ids is not None:
+        vertex_remap = np.full(job['vertex_count'], -1, dtype=np.int64)
+        vertex_remap[vertex_order] = np.arange(len(vertex_order))
+        shade_ids = vertex_remap[shade_ids[vertex_order]]
+        unmapped = shade_ids < 0
+        shade_ids[unmapped] = np.flatnonzero(unmapped)
+
+    subset = {
+        'name': name,
+        'vertex_count': len(vertex_order),
+        'coords': coords,
+        'triangles': triangles,
+        'shade_ids': shade_ids,
+        'vectors': {key: values[vertex_order] for key, values in job['vectors'].items()},
+    }
+    if 'positions' in job:
+        subset['positions'] = job['positions'][vertex_order]
+        subset['skin_keys'] = job['skin_keys'][vertex_order] if job['skin_keys'] is not None else None
+    return subset
+
+
+def split_terrain_job(job, positions, grid_size):
+    """Split the job into the cells of a grid on the xy plane, a triangle belongs to the cell containing its center.
+
+    Returns the cell ids, numbered row by row, and the jobs of the non empty cells. Every tile keeps only
+    the vertices it uses, vertices on the tile borders end up in each adjacent tile.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    indices = job['triangles']['vert_ids'].astype(np.int64)
+    if len(indices) == 0:
+        return []
+
+    lower = positions[:, :2].min(axis=0)
+    extent = np.maximum(positions[:, :2].max(axis=0) - lower, 1e-6)
+    centers = positions[indices].mean(axis=1)[:, :2]
+    cells = np.minimum(((centers - lower) / extent * grid_size).astype(np.int64), grid_size - 1)
+    tile_ids = cells[:, 1] * grid_size + cells[:, 0]
+
+    tiles = []
+    for tile_id in np.unique(tile_ids).tolist():
+        triangle_ids = np.flatnonzero(tile_ids == tile_id)
+        tile_indices = indices[triangle_ids]
+        vertex_order = first_use_vertex_order(tile_indices, job['vertex_count'])[:len(np.unique(tile_indices))]
+        triangles, _ = reorder_triangles(job['triangles'], triangle_ids, vertex_order, job['vertex_count'])
+        tile = vertex_subset_job(job, vertex_order, triangles, job['name'], job['coords'][vertex_order])
+        tile['source_order'] = vertex_order
+        tiles.append((tile_id, tile))
+    return tiles
+
+
+def process_mesh_job(job, options):
+    """Process one extracted mesh and its generated lods, the job and the result hold only plain values and arrays.
+
+    The job holds the mesh name, its vertex count, the sphere coords, the triangle records (TRIANGLE_DTYPE),
+    the shade ids and the per vertex lists of PACKED_VECTORS. For lods it also holds their names, the
+    positions and the skin keys of the vertices. Returns the log messages and the processed mesh: its
+    vertex order (None if unchanged), triangles, shade ids, sphere, AABB tree nodes, if requested the
+    serialized chunk data of its per vertex lists and the same for each of its lods. Jobs for part of a
+    mesh hold the order of the source vertices they use, the vertex orders of the result refer to those.
+    """
+    messages, result = process_geometry(job, options)
+    result['lods'] = []
+
+    if job.get('lod_names'):
+        start = time.perf_counter()
+        for level, vertex_order, triangles in decimate_levels(job, options):
+            name = job['lod_names'][level - 1]
+            # the lods are inside the bounds of the source mesh, so its coords work for their spheres as well
+            lod_messages, lod = process_geometry(
+                vertex_subset_job(job, vertex_order, triangles, name, job['coords']), options)
+            if lod['vertex_order'] is not None:
+                vertex_order = vertex_order[lod['vertex_order']]
+            lod['vertex_order'] = vertex_order
+            lod['level'] = level
+            result['lods'].append(lod)
+
+            # locked borders and differing bone influences can keep a lod above its requested ratio
+            reached = len(triangles) / len(job['triangles'])
+            messages.append(
+                f'mesh \'{job["name"]}\' LOD {level} \'{name}\' '
+                f'keeps {len(triangles)} of {len(job["triangles"])} triangles '
+                f'(ratio {reached:.2f}, requested {options["lod_ratio"] ** level:.2f})')
+            messages.extend(lod_messages)
+
+        # the decimation cost grows faster than the triangle count, it is reported for every mesh
+        messages.append(
+            f'mesh \'{job["name"]}\' generated {len(result["lods"])} LODs from {len(job["triangles"])} triangles '
+            f'in {time.perf_counter() - start:.2f} s')
+
+    source_order = job.get('source_order')
+    if source_order is not None:
+        for mesh in [result] + result['lods']:
+            vertex_order = mesh['vertex_order']
+            mesh['vertex_order'] = source_order if vertex_order is None else source_order[vertex_order]
+    return messages, result
+
+
+def process_mesh_jobs(jobs, options, max_workers=None):
+    """Run process_mesh_job for all jobs, in worker processes if there is enough work for them.
+
+    Returns the results in the order of the jobs and the number of worker processes used, 0 if the
+    jobs were processed in this process.
+    """
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if workers < 2 or sum(len(job['triangles']) for job in jobs) < MIN_POOL_TRIANGLES:
+        return [process_mesh_job(job, options) for job in jobs], 0
+
+    # the largest jobs are started first, so none of them ends up alone at the end
+    order = sorted(range(len(jobs)), key=lambda index: len(jobs[index]['triangles']), reverse=True)
+    results = [None] * len(jobs)
+    try:
+        # spawned workers start from a clean interpreter, without the state of blender
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=runpy.run_path,
+                                 initargs=(WORKER_BOOTSTRAP,)) as executor:
+            futures = [(index, executor.submit(process_mesh_job, jobs[index], options)) for index in order]
+            for index, future in futures:
+                results[index] = future.result()
+    except (BrokenProcessPool, OSError):
+        return [process_mesh_job(job, options) for job in jobs], 0
+    return results, workers
@@ -138,6 +138,13 @@ def should_export_geometry(obj):
     return settings.export_geometry
 
 
+def allows_static_batching(obj):
+    settings = get_object_settings(obj)
+    if settings is None:
+        return True
+    return settings.allow_batching
+
+
 def should_export_transform(obj):
     settings = get_object_settings(obj)
     if settings is None:
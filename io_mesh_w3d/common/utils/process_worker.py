@@ -0,0 +1,15 @@
+# <pep8 compliant>
+# Run with runpy.run_path in every export worker process, before the first job is unpickled.
+
+import os
+import sys
+import types
+
+# importing the add-on package runs its __init__, which needs bpy. The modules used by the workers need
+# neither bpy nor mathutils, so an empty package with the right path is all they need.
+package_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+package_name = os.path.basename(package_path)
+if package_name not in sys.modules:
+    package = types.ModuleType(package_name)
+    package.__path__ = [package_path]
+    sys.modules[package_name] = package
@@ -0,0 +1,111 @@
+# <pep8 compliant>
+# Post-transform vertex cache optimization of triangle index buffers.
+
+from collections import deque
+
+import numpy as np
+
+VERTEX_CACHE_SIZE = 16
+
+
+def average_cache_miss_ratio(indices, cache_size=VERTEX_CACHE_SIZE):
+    """Cache misses per triangle of a FIFO vertex cache for the given (n, 3) index buffer."""
+    indices = np.asarray(indices).reshape(-1, 3)
+    if len(indices) == 0:
+        return 0.0
+
+    fifo = deque()
+    cached = set()
+    misses = 0
+    for vert_id in indices.ravel().tolist():
+        if vert_id in cached:
+            continue
+        misses += 1
+        fifo.append(vert_id)
+        cached.add(vert_id)
+        if len(fifo) > cache_size:
+            cached.discard(fifo.popleft())
+    return misses / len(indices)
+
+
+def _triangle_adjacency(indices, vertex_count):
+    flat = indices.ravel()
+    order = np.argsort(flat, kind='stable')
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(flat, minlength=vertex_count), out=offsets[1:])
+    return (order // 3).tolist(), offsets.tolist()
+
+
+def tipsify(indices, vertex_count, cache_size=VERTEX_CACHE_SIZE):
+    """Return a triangle order for the (n, 3) index buffer (Sander et al., 'Fast triangle reordering')."""
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(indices) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    adjacency, offsets = _triangle_adjacency(indices, vertex_count)
+    triangles = indices.tolist()
+    live = np.bincount(indices.ravel(), minlength=vertex_count).tolist()
+    timestamps = [0] * vertex_count
+    emitted = [False] * len(triangles)
+    dead_ends = []
+    output = []
+
+    stamp = cache_size + 1
+    cursor = 0
+
+    def skip_dead_end():
+        nonlocal cursor
+        while dead_ends:
+            vert_id = dead_ends.pop()
+            if live[vert_id] > 0:
+                return vert_id
+        while cursor < vertex_count:
+            if live[cursor] > 0:
+                return cursor
+            cursor += 1
+        return -1
+
+    fanning = skip_dead_end()
+    while fanning >= 0:
+        candidates = []
+        for tri_index in adjacency[offsets[fanning]:offsets[fanning + 1]]:
+            if emitted[tri_index]:
+                continue
+            emitted[tri_index] = True
+            output.append(tri_index)
+            for vert_id in triangles[tri_index]:
+                dead_ends.append(vert_id)
+                candidates.append(vert_id)
+                live[vert_id] -= 1
+                if stamp - timestamps[vert_id] > cache_size:
+                    timestamps[vert_id] = stamp
+                    stamp += 1
+
+        # prefer the candidate that is still in the cache and stays there while its fan is emitted
+        fanning = -1
+        best_priority = -1
+        for vert_id in candidates:
+            if live[vert_id] <= 0:
+                continue
+            priority = 0
+            if stamp - timestamps[vert_id] + 2 * live[vert_id] <= cache_size:
+                priority = stamp - timestamps[vert_id]
+            if priority > best_priority:
+                best_priority = priority
+                fanning = vert_id
+
+        if fanning < 0:
+            fanning = skip_dead_end()
+
+    return np.array(output, dtype=np.int64)
+
+
+def first_use_vertex_order(indices, vertex_count):
+    """Return the vertices ordered by their first use in the index buffer, unused ones at the end."""
+    flat = np.asarray(indices, dtype=np.int64).ravel()
+    used, first = np.unique(flat, return_index=True)
+    used = used[np.argsort(first, kind='stable')]
+
+    unused = np.ones(vertex_count, dtype=bool)
+    unused[used] = False
+    return np.concatenate((used, np.flatnonzero(unused)))
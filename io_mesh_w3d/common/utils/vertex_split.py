@@ -0,0 +1,43 @@
+# <pep8 compliant>
+# Splitting of mesh vertices by per loop attributes on plain arrays.
+
+import numpy as np
+
+
+def split_vertices(loop_vertices, loop_attributes, vertex_count):
+    """Return (vertex_map, loop_map, loop_to_split) for the unique (vertex, attributes) combinations.
+
+    vertex_map and loop_map hold the source vertex and a representative loop (-1 for loose vertices)
+    of each split vertex, loop_to_split maps every loop to its split vertex. Split vertices keep the
+    order of their source vertices, so meshes without seams come out unchanged.
+    """
+    loop_vertices = np.asarray(loop_vertices, dtype=np.uint32).reshape(-1)
+    loop_count = len(loop_vertices)
+    loop_attributes = np.asarray(loop_attributes, dtype=np.float32)
+    if loop_attributes.ndim != 2:
+        loop_attributes = loop_attributes.reshape(loop_count, -1)
+
+    # compare attributes bitwise, but treat -0.0 and 0.0 as equal
+    keys = np.empty((loop_count, 1 + loop_attributes.shape[1]), dtype=np.uint32)
+    keys[:, 0] = loop_vertices
+    keys[:, 1:] = (loop_attributes + np.float32(0.0)).view(np.uint32)
+    keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1])))
+
+    if loop_count > 0:
+        _, first_loops, inverse = np.unique(keys.reshape(-1), return_index=True, return_inverse=True)
+    else:
+        first_loops = np.empty(0, dtype=np.int64)
+        inverse = np.empty(0, dtype=np.int64)
+
+    used = np.zeros(vertex_count, dtype=bool)
+    used[loop_vertices] = True
+    loose = np.flatnonzero(~used)
+
+    vertex_map = np.concatenate((loop_vertices[first_loops].astype(np.int64), loose))
+    loop_map = np.concatenate((first_loops.astype(np.int64), np.full(len(loose), -1, dtype=np.int64)))
+
+    order = np.lexsort((loop_map, vertex_map))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    return vertex_map[order], loop_map[order], rank[inverse.reshape(-1)]
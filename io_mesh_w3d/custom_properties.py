@@ -599,6 +599,10 @@ class W3DMaterialSettings(PropertyGroup):
 class W3DObjectSettings(PropertyGroup):
     export_transform: BoolProperty(name='Export Transform', default=True)
     export_geometry: BoolProperty(name='Export Geometry', default=True)
+    allow_batching: BoolProperty(
+        name='Allow Batching',
+        description='Allow merging this mesh with other rigid meshes on the same pivot and with the same materials when static batching is enabled on export',
+        default=True)
     hlod_role: EnumProperty(
         name='HLOD Role',
         description='Choose whether this object exports as regular geometry, an aggregate attachment, or a proxy attachment',
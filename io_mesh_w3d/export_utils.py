@@ -62,25 +62,51 @@ def retrieve_data(context, export_settings):
         context.error(f'Filename is longer than {STRING_LENGTH} characters, aborting export!')
         return None
 
-    hierarchy, rig, hlod = None, None, None
-
-    if effective_mode != 'M':
-        hierarchy, rig = retrieve_hierarchy(context, container_name)
-        hlod = create_hlod(hierarchy, container_name)
-
-    export_options = {
-        'terrain_mode': terrain_mode,
-        'smooth_vertex_normals': export_settings.get('smooth_vertex_normals', True),
-        'apply_modifiers': export_settings.get('apply_modifiers', True),
-        'optimize_collision': export_settings.get('optimize_collision', True),
-        'deduplicate_reference_meshes': export_settings.get('deduplicate_reference_meshes', False),
-        'build_new_aabtree': export_settings.get('build_new_aabtree', True) or renegade_mode,
-        'existing_skeleton_path': export_settings.get('existing_skeleton_path', ''),
-        'renegade_workflow': renegade_mode,
-    }
-    setattr(context, '_w3d_export_options', export_options)
+    # everything except the animation is captured from one evaluation of the scene in rest pose
+    rigs = get_objects('ARMATURE')
+    rest_rig = rigs[0] if rigs else None
+    previous_pose = switch_to_pose(rest_rig, 'REST')
 
     try:
+        hierarchy, rig, hlod = None, None, None
+
+        if effective_mode != 'M':
+            hierarchy, rig = retrieve_hierarchy(context, container_name)
+            hlod = create_hlod(hierarchy, container_name)
+
+        batch_static = export_settings.get('batch_static_meshes', False)
+        if batch_static and effective_mode not in ['HM', 'HAM']:
+            context.warning('Static batching requires a hierarchical export mode, meshes are not merged.')
+            batch_static = False
+
+        generated_lod_count = export_settings.get('generated_lod_count', 0)
+        if generated_lod_count > 0 and effective_mode not in ['HM', 'HAM']:
+            context.warning('LOD generation requires a hierarchical export mode, no LODs are generated.')
+            generated_lod_count = 0
+        elif generated_lod_count > 0 and len(hlod.lod_arrays) > 1:
+            context.warning('Scene does already contain multiple LODs, no LODs are generated.')
+            generated_lod_count = 0
+
+        export_options = {
+            'terrain_mode': terrain_mode,
+            'smooth_vertex_normals': export_settings.get('smooth_vertex_normals', True),
+            'apply_modifiers': export_settings.get('apply_modifiers', True),
+            'optimize_collision': export_settings.get('optimize_collision', True),
+            'deduplicate_reference_meshes': export_settings.get('deduplicate_reference_meshes', False),
+            'reuse_linked_mesh_data': export_settings.get('reuse_linked_mesh_data', False),
+            'build_new_aabtree': export_settings.get('build_new_aabtree', True) or renegade_mode,
+            'exact_bounding_sphere': export_settings.get('exact_bounding_sphere', False),
+            'optimize_vertex_cache': export_settings.get('optimize_vertex_cache', False),
+            'incremental_export': export_settings.get('incremental_export', False),
+            'batch_static_meshes': batch_static,
+            'generated_lod_count': generated_lod_count,
+            'lod_triangle_ratio': export_settings.get('lod_triangle_ratio', 0.5),
+            'terrain_tile_count': export_settings.get('terrain_tile_count', 1) if terrain_mode else 1,
+            'existing_skeleton_path': export_settings.get('existing_skeleton_path', ''),
+            'renegade_workflow': renegade_mode,
+        }
+        setattr(context, '_w3d_export_options', export_options)
+
         data_context = DataContext(
             container_name=container_name,
             rig=rig,
@@ -97,6 +123,10 @@ def retrieve_data(context, export_settings):
                 context, hierarchy, rig, container_name, export_settings.get('force_vertex_materials', False))
             data_context.meshes = meshes
             data_context.textures = textures
+            if data_context.hlod is not None:
+                apply_static_batches(data_context.hlod, meshes)
+                apply_terrain_tiles(data_context.hlod, meshes)
+                append_generated_lod_arrays(data_context.hlod, meshes)
             has_hlod_attachments = bool(
                 data_context.hlod and (
                     data_context.hlod.aggregate_array is not None
@@ -124,6 +154,8 @@ def retrieve_data(context, export_settings):
                     context.error('aborting export!')
                     return None
 
+        switch_to_pose(rest_rig, previous_pose)
+
         if 'A' in effective_mode:
             timecoded = export_settings['compression'] == 'TC'
             data_context.animation = retrieve_animation(
@@ -139,5 +171,6 @@ def retrieve_data(context, export_settings):
 
         return data_context
     finally:
+        switch_to_pose(rest_rig, previous_pose)
         if hasattr(context, '_w3d_export_options'):
             delattr(context, '_w3d_export_options')
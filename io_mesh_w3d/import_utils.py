@@ -10,11 +10,18 @@ from io_mesh_w3d.common.utils.box_import import *
 from io_mesh_w3d.w3d.utils.dazzle_import import *
 
 
-def create_attachment_placeholder(collection, sub_object, role):
+def index_by_name(items):
+    index = {}
+    for item in items:
+        index.setdefault(item.name(), []).append(item)
+    return index
+
+
+def create_attachment_placeholder(collection, sub_object, role, links=None):
     placeholder = bpy.data.objects.new(sub_object.identifier, None)
     placeholder.empty_display_type = 'SPHERE' if role == 'AGGREGATE' else 'CUBE'
     placeholder.empty_display_size = 0.25
-    link_object_to_active_scene(placeholder, collection)
+    link_object_to_active_scene(placeholder, collection, links)
 
     settings = getattr(placeholder, 'w3d_object_settings', None)
     if settings is not None:
@@ -26,12 +33,15 @@ def create_attachment_placeholder(collection, sub_object, role):
     return placeholder
 
 
+@material_templates()
 def create_data(context, meshes, hlod=None, hierarchy=None, boxes=None, animation=None, compressed_animation=None,
                 dazzles=None):
     boxes = boxes if boxes is not None else []
     dazzles = dazzles if dazzles is not None else []
     collection = get_collection(hlod)
     freeze_rigid = getattr(context, 'keep_rigid_meshes_static', False)
+    shared_meshes = {} if getattr(context, 'share_identical_meshes', False) else None
+    material_cache = {'IMPORT': {}, 'SESSION': MATERIAL_CACHE}.get(getattr(context, 'reuse_materials', 'NONE'))
     reused_rigid_meshes = set()
 
     def _reuse_rigid_mesh(obj):
@@ -52,16 +62,24 @@ def create_data(context, meshes, hlod=None, hierarchy=None, boxes=None, animatio
     mesh_names_map = {}
     reused_rigid_mats = {}
     attachment_objects = []
-    if hlod is not None:
-        current_coll = collection
-        for i, lod_array in enumerate(reversed(hlod.lod_arrays)):
-            if i > 0:
-                current_coll = get_collection(hlod, '.' + str(i))
-                current_coll.hide_viewport = True
-
-            for sub_object in lod_array.sub_objects:
-                for mesh in meshes:
-                    if mesh.name() == sub_object.name:
+
+    # sub objects are resolved by their initial names, create_mesh may rename the meshes
+    meshes_by_name = index_by_name(meshes)
+    boxes_by_name = index_by_name(boxes)
+    dazzles_by_name = index_by_name(dazzles)
+
+    # the objects are linked to their collections at the end of the block, the rig is linked right away for
+    # its mode switches
+    with deferred_links() as links:
+        if hlod is not None:
+            current_coll = collection
+            for i, lod_array in enumerate(reversed(hlod.lod_arrays)):
+                if i > 0:
+                    current_coll = get_collection(hlod, '.' + str(i))
+                    current_coll.hide_viewport = True
+
+                for sub_object in lod_array.sub_objects:
+                    for mesh in meshes_by_name.get(sub_object.name, []):
                         if freeze_rigid and (not mesh.is_skin()):
                             existing_obj = _find_rigid_object(sub_object.name)
                             if existing_obj is not None:
@@ -71,31 +89,29 @@ def create_data(context, meshes, hlod=None, hierarchy=None, boxes=None, animatio
                                 reused_rigid_meshes.add(existing_obj.name)
                                 context.info(f"reusing existing rigid mesh '{existing_obj.name}'")
                                 continue
-                        newname = create_mesh(context, mesh, current_coll, hierarchy, sub_object)
+                        newname = create_mesh(
+                            context, mesh, current_coll, hierarchy, sub_object, shared_meshes, material_cache, links)
                         mesh_names_map[mesh.name()] = newname
 
-                for box in boxes:
-                    if box.name() == sub_object.name:
-                        create_box(box, collection)
+                    for box in boxes_by_name.get(sub_object.name, []):
+                        create_box(box, collection, links)
 
-                for dazzle in dazzles:
-                    if dazzle.name() == sub_object.name:
-                        create_dazzle(context, dazzle, collection)
+                    for dazzle in dazzles_by_name.get(sub_object.name, []):
+                        create_dazzle(context, dazzle, collection, links)
 
-        for role, sub_array in (('AGGREGATE', hlod.aggregate_array), ('PROXY', hlod.proxy_array)):
-            if sub_array is None:
-                continue
-            for sub_object in sub_array.sub_objects:
-                placeholder = create_attachment_placeholder(collection, sub_object, role)
-                attachment_objects.append((placeholder.name, sub_object))
+            for role, sub_array in (('AGGREGATE', hlod.aggregate_array), ('PROXY', hlod.proxy_array)):
+                if sub_array is None:
+                    continue
+                for sub_object in sub_array.sub_objects:
+                    placeholder = create_attachment_placeholder(collection, sub_object, role, links)
+                    attachment_objects.append((placeholder.name, sub_object))
 
-    rig = get_or_create_skeleton(hierarchy, collection)
+        rig = get_or_create_skeleton(hierarchy, collection)
 
-    if hlod is not None:
-        for lod_array in reversed(hlod.lod_arrays):
-            for sub_object in lod_array.sub_objects:
-                for mesh in meshes:
-                    if mesh.name() == sub_object.name:
+        if hlod is not None:
+            for lod_array in reversed(hlod.lod_arrays):
+                for sub_object in lod_array.sub_objects:
+                    for mesh in meshes_by_name.get(sub_object.name, []):
                         mesh.header.mesh_name = mesh_names_map[mesh.name()]
                         if freeze_rigid and (not mesh.is_skin()) and mesh.header.mesh_name in reused_rigid_meshes:
                             obj = bpy.data.objects.get(mesh.header.mesh_name)
@@ -105,33 +121,32 @@ def create_data(context, meshes, hlod=None, hierarchy=None, boxes=None, animatio
                                 obj.matrix_world = world_mat
                             continue
                         rig_mesh(mesh, hierarchy, rig, sub_object)
-                for box in boxes:
-                    if box.name() == sub_object.name:
+                    for box in boxes_by_name.get(sub_object.name, []):
                         rig_box(box, hierarchy, rig, sub_object)
-                for dazzle in dazzles:
-                    if dazzle.name() == sub_object.name:
+                    for dazzle in dazzles_by_name.get(sub_object.name, []):
                         dazzle_object = bpy.data.objects[dazzle.name()]
                         rig_object(dazzle_object, hierarchy, rig, sub_object)
 
-        for object_name, sub_object in attachment_objects:
-            placeholder = bpy.data.objects.get(object_name)
-            if placeholder is not None:
-                rig_object(placeholder, hierarchy, rig, sub_object)
-
-    else:
-        for mesh in meshes:
-            if freeze_rigid and (not mesh.is_skin()):
-                existing_obj = _find_rigid_object(mesh.name())
-                if existing_obj is not None:
-                    reused_rigid_mats[existing_obj.name] = _reuse_rigid_mesh(existing_obj)
-                    mesh.header.mesh_name = existing_obj.name
-                    reused_rigid_meshes.add(existing_obj.name)
-                    context.info(f"reusing existing rigid mesh '{existing_obj.name}'")
-                    continue
-            create_mesh(context, mesh, collection, hierarchy)
-
-    create_animation(context, rig, animation, hierarchy)
-    create_animation(context, rig, compressed_animation, hierarchy)
+            for object_name, sub_object in attachment_objects:
+                placeholder = bpy.data.objects.get(object_name)
+                if placeholder is not None:
+                    rig_object(placeholder, hierarchy, rig, sub_object)
+
+        else:
+            for mesh in meshes:
+                if freeze_rigid and (not mesh.is_skin()):
+                    existing_obj = _find_rigid_object(mesh.name())
+                    if existing_obj is not None:
+                        reused_rigid_mats[existing_obj.name] = _reuse_rigid_mesh(existing_obj)
+                        mesh.header.mesh_name = existing_obj.name
+                        reused_rigid_meshes.add(existing_obj.name)
+                        context.info(f"reusing existing rigid mesh '{existing_obj.name}'")
+                        continue
+                create_mesh(context, mesh, collection, hierarchy, shared_meshes=shared_meshes,
+                            material_cache=material_cache, links=links)
+
+        create_animation(context, rig, animation, hierarchy)
+        create_animation(context, rig, compressed_animation, hierarchy)
 
     animation_names = []
     for candidate in (animation, compressed_animation):
@@ -1,6 +1,9 @@
 # <pep8 compliant>
 # Written by Stephan Vedder and Michael Schnabel
 
+from io_mesh_w3d.common.utils.export_cache import write_mesh_chunk
+from io_mesh_w3d.common.utils.file_output import atomic_output
+
 
 def save(context, export_settings, data_context):
     filepath = context.filepath
@@ -19,53 +22,53 @@ def save(context, export_settings, data_context):
     effective_mode = 'HM' if terrain_flag else export_mode
     context.info(f'export mode: {export_mode}')
 
-    file = open(filepath, 'wb')
+    if effective_mode not in ['M', 'HM', 'HAM', 'A', 'H']:
+        context.error(f'unsupported export mode \'{export_mode}\', aborting export!')
+        return {'CANCELLED'}
 
     if terrain_flag:
         for mesh in data_context.meshes:
             mesh.header.container_name = data_context.container_name
 
-    if effective_mode == 'M':
-        if len(data_context.meshes) > 1:
-            context.warning('Scene does contain multiple meshes, exporting only the first with export mode M!')
-        mesh = data_context.meshes[0]
-        mesh.header.container_name = ''
-        mesh.header.mesh_name = data_context.container_name
-        mesh.write(file)
-
-    elif effective_mode == 'HM' or effective_mode == 'HAM':
-        write_hierarchy = ('H' in effective_mode) and (
-            renegade_mode or effective_mode == 'HAM' or not export_settings['use_existing_skeleton'])
-        if write_hierarchy:
-            data_context.hlod.header.hierarchy_name = data_context.container_name
-            data_context.hierarchy.header.name = data_context.container_name
-            data_context.hierarchy.write(file)
+    # the target is only replaced once everything has been written
+    with atomic_output(filepath, sync=export_settings.get('sync_output', False)) as file:
+        if effective_mode == 'M':
+            if len(data_context.meshes) > 1:
+                context.warning('Scene does contain multiple meshes, exporting only the first with export mode M!')
+            mesh = data_context.meshes[0]
+            mesh.header.container_name = ''
+            mesh.header.mesh_name = data_context.container_name
+            write_mesh_chunk(mesh, file)
 
-        for box in data_context.collision_boxes:
-            box.write(file)
+        elif effective_mode == 'HM' or effective_mode == 'HAM':
+            write_hierarchy = ('H' in effective_mode) and (
+                renegade_mode or effective_mode == 'HAM' or not export_settings['use_existing_skeleton'])
+            if write_hierarchy:
+                data_context.hlod.header.hierarchy_name = data_context.container_name
+                data_context.hierarchy.header.name = data_context.container_name
+                data_context.hierarchy.write(file)
 
-        for dazzle in data_context.dazzles:
-            dazzle.write(file)
+            for box in data_context.collision_boxes:
+                box.write(file)
 
-        for mesh in data_context.meshes:
-            mesh.write(file)
+            for dazzle in data_context.dazzles:
+                dazzle.write(file)
 
-        if renegade_mode or 'H' in effective_mode:
-            data_context.hlod.write(file)
-        if effective_mode == 'HAM':
-            data_context.animation.header.hierarchy_name = data_context.container_name
-            data_context.animation.write(file)
+            for mesh in data_context.meshes:
+                write_mesh_chunk(mesh, file)
 
-    elif effective_mode == 'A':
-        data_context.animation.write(file)
+            if renegade_mode or 'H' in effective_mode:
+                data_context.hlod.write(file)
+            if effective_mode == 'HAM':
+                data_context.animation.header.hierarchy_name = data_context.container_name
+                data_context.animation.write(file)
 
-    elif effective_mode == 'H':
-        data_context.hierarchy.header.name = data_context.container_name.upper()
-        data_context.hierarchy.write(file)
-    else:
-        context.error(f'unsupported export mode \'{export_mode}\', aborting export!')
-        return {'CANCELLED'}
+        elif effective_mode == 'A':
+            data_context.animation.write(file)
+
+        elif effective_mode == 'H':
+            data_context.hierarchy.header.name = data_context.container_name.upper()
+            data_context.hierarchy.write(file)
 
-    file.close()
     context.info('finished')
     return {'FINISHED'}
@@ -1,7 +1,7 @@
 # <pep8 compliant>
 # Written by Stephan Vedder and Michael Schnabel
 
-from io_mesh_w3d.common.structs.rgba import RGBA
+from io_mesh_w3d.common.structs.rgba import RGBA, RGBABuffer, rgba_list_size, write_rgba_list
 from io_mesh_w3d.w3d.utils.helpers import *
 
 W3D_CHUNK_TEXTURE_STAGE = 0x00000048
@@ -94,11 +94,11 @@ class MaterialPass:
             elif chunk_type == W3D_CHUNK_SHADER_IDS:
                 result.shader_ids = read_list(io_stream, subchunk_end, read_ulong)
             elif chunk_type == W3D_CHUNK_DCG:
-                result.dcg = read_list(io_stream, subchunk_end, RGBA.read)
+                result.dcg = RGBABuffer.read(io_stream, subchunk_end)
             elif chunk_type == W3D_CHUNK_DIG:
-                result.dig = read_list(io_stream, subchunk_end, RGBA.read)
+                result.dig = RGBABuffer.read(io_stream, subchunk_end)
             elif chunk_type == W3D_CHUNK_SCG:
-                result.scg = read_list(io_stream, subchunk_end, RGBA.read)
+                result.scg = RGBABuffer.read(io_stream, subchunk_end)
             elif chunk_type == W3D_CHUNK_SHADER_MATERIAL_ID:
                 result.shader_material_ids = read_list(io_stream, subchunk_end, read_ulong)
             elif chunk_type == W3D_CHUNK_TEXTURE_STAGE:
@@ -113,9 +113,9 @@ class MaterialPass:
         size = const_size(0, include_head)
         size += long_list_size(self.vertex_material_ids)
         size += long_list_size(self.shader_ids)
-        size += list_size(self.dcg)
-        size += list_size(self.dig)
-        size += list_size(self.scg)
+        size += rgba_list_size(self.dcg)
+        size += rgba_list_size(self.dig)
+        size += rgba_list_size(self.scg)
         size += long_list_size(self.shader_material_ids)
         size += list_size(self.tx_stages, False)
         size += vec2_list_size(self.tx_coords)
@@ -135,16 +135,16 @@ class MaterialPass:
             write_list(self.shader_ids, io_stream, write_ulong)
 
         if self.dcg:
-            write_chunk_head(W3D_CHUNK_DCG, io_stream, list_size(self.dcg, False))
-            write_list(self.dcg, io_stream, RGBA.write)
+            write_chunk_head(W3D_CHUNK_DCG, io_stream, rgba_list_size(self.dcg, False))
+            write_rgba_list(self.dcg, io_stream)
 
         if self.dig:
-            write_chunk_head(W3D_CHUNK_DIG, io_stream, list_size(self.dig, False))
-            write_list(self.dig, io_stream, RGBA.write)
+            write_chunk_head(W3D_CHUNK_DIG, io_stream, rgba_list_size(self.dig, False))
+            write_rgba_list(self.dig, io_stream)
 
         if self.scg:
-            write_chunk_head(W3D_CHUNK_SCG, io_stream, list_size(self.scg, False))
-            write_list(self.scg, io_stream, RGBA.write)
+            write_chunk_head(W3D_CHUNK_SCG, io_stream, rgba_list_size(self.scg, False))
+            write_rgba_list(self.scg, io_stream)
 
         if self.shader_material_ids:
             write_chunk_head(W3D_CHUNK_SHADER_MATERIAL_ID, io_stream,
@@ -8,13 +8,13 @@ from io_mesh_w3d.common.utils.helpers import *
 from io_mesh_w3d.common.utils.object_settings_bridge import populate_object_settings_for_dazzle
 
 
-def create_dazzle(context, dazzle, coll):
+def create_dazzle(context, dazzle, coll, links=None):
     # Todo: proper dimensions for cone
     (dazzle_mesh, dazzle_cone) = create_cone(dazzle.name())
     dazzle_cone.data.object_type = 'DAZZLE'
     dazzle_cone.data.dazzle_type = dazzle.type_name
     populate_object_settings_for_dazzle(dazzle_cone, dazzle.type_name)
-    link_object_to_active_scene(dazzle_cone, coll)
+    link_object_to_active_scene(dazzle_cone, coll, links)
 
     material = bpy.data.materials.new(dazzle.name())
     material.use_nodes = True
@@ -1,6 +1,7 @@
 # <pep8 compliant>
 # Written by Stephan Vedder and Michael Schnabel
 
+import numpy as np
 from io_mesh_w3d.w3d.io_binary import *
 
 
@@ -22,6 +23,13 @@ def read_chunk_array(context, io_stream, chunk_end, type_, read_func):
     return result
 
 
+def read_vector_list(io_stream, chunk_end):
+    # decodes the whole chunk at once instead of three floats at a time
+    data = io_stream.read(chunk_end - io_stream.tell())
+    values = np.frombuffer(data, dtype='<f4', count=len(data) // 12 * 3).reshape(-1, 3)
+    return [Vector(value) for value in values.tolist()]
+
+
 def const_size(size, include_head=True):
     if include_head:
         size += HEAD
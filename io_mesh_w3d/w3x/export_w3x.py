@@ -3,6 +3,7 @@
 
 from io_mesh_w3d.export_utils import *
 from io_mesh_w3d.w3x.structs.include import *
+from io_mesh_w3d.common.utils.export_cache import create_mesh_node
 
 
 def save(context, export_settings, data_context):
@@ -24,7 +25,7 @@ def save(context, export_settings, data_context):
             context.warning('Scene does contain multiple meshes, exporting only the first with export mode M!')
         data_context.meshes[0].header.container_name = ''
         data_context.meshes[0].header.mesh_name = data_context.container_name
-        data_context.meshes[0].create(root)
+        create_mesh_node(data_context.meshes[0], root)
 
     elif export_mode == 'HM':
         if export_settings['use_existing_skeleton'] or export_settings['individual_files']:
@@ -66,7 +67,7 @@ def save(context, export_settings, data_context):
                 context.info('Saving file :' + path)
                 write_struct(mesh, path)
             else:
-                mesh.create(root)
+                create_mesh_node(mesh, root)
 
         data_context.hlod.create(root)
 
@@ -89,7 +90,7 @@ def save(context, export_settings, data_context):
             box.create(root)
 
         for mesh in data_context.meshes:
-            mesh.create(root)
+            create_mesh_node(mesh, root)
 
         data_context.hlod.create(root)
         data_context.animation.create(root)
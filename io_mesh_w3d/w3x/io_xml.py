@@ -3,6 +3,7 @@
 
 import xml.etree.ElementTree as ET
 from mathutils import Vector, Quaternion, Matrix
+from io_mesh_w3d.common.utils.file_output import atomic_output
 
 
 def create_node(self, identifier):
@@ -33,9 +34,8 @@ def write(root, path):
     xml_spec = '<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n'
     data = bytes(xml_spec, 'utf-8') + ET.tostring(root)
 
-    file = open(path, 'wb')
-    file.write(data)
-    file.close()
+    with atomic_output(path) as file:
+        file.write(data)
 
 
 def strip_namespaces(it):
@@ -21,3 +21,83 @@ class TestTriangle(TestCase):
 
     def test_write_read_xml(self):
         self.write_read_xml_test(get_triangle(), 'T', Triangle.parse, compare_triangles)
+
+    def test_triangle_buffer_write_matches_triangle_write(self):
+        triangles = [get_triangle(), get_triangle([4, 5, 6], 3, get_vec(0.0, 1.0, 0.0), 2.5)]
+        buffer = TriangleBuffer(
+            [tri.vert_ids for tri in triangles],
+            [tri.surface_type for tri in triangles],
+            [tri.normal for tri in triangles],
+            [tri.distance for tri in triangles])
+
+        self.assertEqual(2, len(buffer))
+        self.assertEqual(list_size(triangles), triangles_size(buffer))
+
+        expected = io.BytesIO()
+        write_list(triangles, expected, Triangle.write)
+        actual = io.BytesIO()
+        buffer.write(actual)
+
+        self.assertEqual(expected.getvalue(), actual.getvalue())
+        for i, triangle in enumerate(buffer):
+            compare_triangles(self, triangles[i], triangle)
+
+    def test_triangle_buffer_set_surface_type(self):
+        buffer = TriangleBuffer([[0, 1, 2], [2, 1, 3]], [13, 13], [[0.0, 0.0, 1.0]] * 2, [0.0, 0.0])
+
+        buffer.set_surface_type([1], 'Grass')
+        buffer.set_surface_type([0], 'InvalidSurfaceType')
+
+        self.assertEqual(13, buffer[0].surface_type)
+        self.assertEqual(surface_types.index('Grass'), buffer[1].surface_type)
+
+    def test_triangle_buffer_items_write_back(self):
+        buffer = TriangleBuffer([[0, 1, 2], [2, 1, 3]], [13, 13], [[0.0, 0.0, 1.0]] * 2, [0.0, 0.0])
+
+        buffer[1].surface_type = 3
+        buffer[-1].vert_ids = [3, 1, 2]
+        buffer[0] = get_triangle([4, 5, 6], 2, get_vec(0.0, 1.0, 0.0), 2.5)
+
+        compare_triangles(self, get_triangle([4, 5, 6], 2, get_vec(0.0, 1.0, 0.0), 2.5), buffer[0])
+        self.assertEqual(3, buffer[1].surface_type)
+        self.assertEqual([3, 1, 2], buffer[1].vert_ids)
+        self.assertEqual([[4, 5, 6], [3, 1, 2]], [triangle.vert_ids for triangle in buffer[:]])
+        with self.assertRaises(IndexError):
+            buffer[2]
+
+    def test_triangle_buffer_reorder(self):
+        buffer = TriangleBuffer([[0, 1, 2], [2, 1, 3]], [1, 2], [[0.0, 0.0, 1.0]] * 2, [0.0, 1.0])
+
+        buffer.reorder([1, 0], np.array([3, 2, 1, 0]))
+
+        self.assertEqual([1, 2, 0], list(buffer[0].vert_ids))
+        self.assertEqual(2, buffer[0].surface_type)
+        self.assertEqual([3, 2, 1], list(buffer[1].vert_ids))
+        self.assertEqual(1.0, buffer[1].distance)
+
+    def test_triangle_buffer_concatenate(self):
+        first = TriangleBuffer([[0, 1, 2]], [1], [[0.0, 0.0, 1.0]], [0.5])
+        second = TriangleBuffer.from_triangles([get_triangle([0, 2, 1], 3, get_vec(0.0, 1.0, 0.0), 2.5)])
+
+        buffer = TriangleBuffer.concatenate([first, second], [0, 3])
+
+        self.assertEqual(2, len(buffer))
+        self.assertEqual([0, 1, 2], list(buffer[0].vert_ids))
+        self.assertEqual([3, 5, 4], list(buffer[1].vert_ids))
+        self.assertEqual(3, buffer[1].surface_type)
+        self.assertEqual(2.5, buffer[1].distance)
+
+    def test_triangle_buffer_read_matches_triangle_read(self):
+        triangles = [get_triangle(), get_triangle([4, 5, 6], 3, get_vec(0.0, 1.0, 0.0), 2.5)]
+
+        io_stream = io.BytesIO()
+        write_list(triangles, io_stream, Triangle.write)
+        data = io_stream.getvalue()
+        io_stream = io.BytesIO(data)
+
+        buffer = TriangleBuffer.read(io_stream, len(data))
+
+        self.assertEqual(len(data), io_stream.tell())
+        self.assertEqual(2, len(buffer))
+        for i, triangle in enumerate(buffer):
+            compare_triangles(self, triangles[i], triangle)
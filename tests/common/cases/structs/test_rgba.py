@@ -3,6 +3,7 @@
 
 import io
 from tests.common.helpers.rgba import *
+from io_mesh_w3d.common.structs.rgba import RGBABuffer
 from tests.utils import TestCase
 
 
@@ -38,3 +39,37 @@ class TestRGBA(TestCase):
         rgba = RGBA(r=244, g=123, b=33, a=99)
         expected = 'RGBA(244, 123, 33, 99)'
         self.assertEqual(expected, str(rgba))
+
+    def test_buffer_writes_like_rgba_list(self):
+        colors = [(1.0, 0.5, 0.0, 1.0), (0.2, 0.4, 0.6, 0.0)]
+        expected = [RGBA(vec=color) for color in colors]
+        buffer = RGBABuffer.from_colors(colors)
+
+        self.assertEqual(len(expected), len(buffer))
+        for rgba, actual in zip(expected, buffer):
+            compare_rgbas(self, rgba, actual)
+
+        io_stream = io.BytesIO()
+        buffer.write(io_stream)
+        self.assertEqual(8, buffer.size(False))
+        self.assertEqual(16, buffer.size())
+
+        io_stream = io.BytesIO(io_stream.getvalue())
+        for rgba in expected:
+            compare_rgbas(self, rgba, RGBA.read(io_stream))
+
+    def test_buffer_read_matches_rgba_read(self):
+        expected = [RGBA(r=255, g=128, b=0, a=255), RGBA(r=1, g=2, b=3, a=4)]
+
+        io_stream = io.BytesIO()
+        for rgba in expected:
+            rgba.write(io_stream)
+        data = io_stream.getvalue()
+        io_stream = io.BytesIO(data)
+
+        buffer = RGBABuffer.read(io_stream, len(data))
+
+        self.assertEqual(len(data), io_stream.tell())
+        self.assertEqual(len(expected), len(buffer))
+        for rgba, actual in zip(expected, buffer):
+            compare_rgbas(self, rgba, actual)
@@ -364,6 +364,27 @@ class TestUtils(TestCase):
 
         self.compare_data(meshes, hlod, hierarchy)
 
+    def test_renamed_mesh_is_still_rigged_to_its_sub_object(self):
+        hierarchy = get_hierarchy()
+        hierarchy.pivots = [get_roottransform(), get_hierarchy_pivot(name='turret', parent=0)]
+        hierarchy.header.num_pivots = len(hierarchy.pivots)
+
+        hlod = get_hlod()
+        hlod.lod_arrays[0].sub_objects = [get_hlod_sub_object(bone=1, name='containerName.turret')]
+        hlod.lod_arrays[0].header.model_count = 1
+        hlod.aggregate_array = None
+        hlod.proxy_array = None
+
+        bpy.data.meshes.new('turret')
+        mesh = get_mesh(name='turret')
+
+        create_data(self, [mesh], hlod, hierarchy)
+
+        self.assertEqual('turret.001', mesh.name())
+        mesh_ob = bpy.data.objects['turret.001']
+        self.assertEqual('BONE', mesh_ob.parent_type)
+        self.assertEqual('turret', mesh_ob.parent_bone)
+
     def test_too_many_hierarchies_roundtrip(self):
         hierarchy = get_hierarchy()
         hierarchy2 = get_hierarchy(name='TestHierarchy2')
@@ -20,7 +20,7 @@ class TestBoxExportUtils(TestCase):
         bmesh.ops.create_cube(b_mesh, size=1)
         b_mesh.to_mesh(box)
 
-        prepare_bmesh(self, box)
+        triangulate_mesh(box)
 
         box_object = bpy.data.objects.new(box.name, box)
         box_object.data.object_type = 'BOX'
@@ -43,7 +43,7 @@ class TestBoxExportUtils(TestCase):
         bmesh.ops.create_cube(b_mesh, size=1)
         b_mesh.to_mesh(box)
 
-        prepare_bmesh(self, box)
+        triangulate_mesh(box)
 
         box_object = bpy.data.objects.new(box.name, box)
         box_object.data.object_type = 'BOX'
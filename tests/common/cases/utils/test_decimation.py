@@ -0,0 +1,109 @@
+# <pep8 compliant>
+# Written by Stephan Vedder and Michael Schnabel
+
+import numpy as np
+
+from io_mesh_w3d.common.utils.decimation import *
+from tests.utils import TestCase
+
+
+def get_grid(size=8):
+    positions = np.array([(x, y, 0.0) for y in range(size + 1) for x in range(size + 1)])
+    indices = []
+    for y in range(size):
+        for x in range(size):
+            a = y * (size + 1) + x
+            indices.append([a, a + 1, a + size + 1])
+            indices.append([a + 1, a + size + 2, a + size + 1])
+    return positions, np.array(indices)
+
+
+def split_seam(positions, indices, seam_x):
+    # the triangles right of the seam use copies of the seam vertices, like split uv coordinates
+    seam = np.flatnonzero(positions[:, 0] == seam_x)
+    copies = dict(zip(seam.tolist(), range(len(positions), len(positions) + len(seam))))
+    indices = indices.copy()
+    for tri_index in np.flatnonzero(positions[indices].mean(axis=1)[:, 0] > seam_x):
+        indices[tri_index] = [copies.get(vert_id, vert_id) for vert_id in indices[tri_index].tolist()]
+    return np.concatenate((positions, positions[seam])), indices
+
+
+class TestDecimation(TestCase):
+    def test_border_vertices(self):
+        positions, indices = get_grid(2)
+
+        border = border_vertices(indices, len(positions))
+
+        self.assertEqual([True] * 4 + [False] + [True] * 4, border.tolist())
+
+    def test_decimate_keeps_border_vertices(self):
+        positions, indices = get_grid()
+
+        kept, lod_indices = decimate(positions, indices, 10)
+
+        self.assertEqual(len(kept), len(lod_indices))
+        self.assertTrue(len(lod_indices) < len(indices))
+        used = set(lod_indices.ravel().tolist())
+        self.assertEqual(set(np.flatnonzero(border_vertices(indices, len(positions))).tolist()), used)
+
+        normals, areas = face_normals(positions, lod_indices)
+        self.assertTrue(np.all(normals[:, 2] > 0.0))
+        self.assertAlmostEqual(64.0, areas.sum() / 2.0)
+
+    def test_weld_vertices(self):
+        positions, indices = split_seam(*get_grid(2), 1.0)
+
+        weld = weld_vertices(positions)
+
+        self.assertEqual(list(range(9)) + [1, 4, 7], weld.tolist())
+        self.assertEqual(8, np.count_nonzero(border_vertices(weld[indices], len(positions))))
+
+    def test_decimate_collapses_seam_vertices_together(self):
+        positions, indices = get_grid()
+        split_positions, split_indices = split_seam(positions, indices, 4.0)
+
+        _, lod_indices = decimate(positions, indices, 10)
+        _, split_lod_indices = decimate(split_positions, split_indices, 10)
+
+        self.assertEqual(len(lod_indices), len(split_lod_indices))
+        weld = weld_vertices(split_positions)
+        self.assertEqual(set(np.flatnonzero(border_vertices(indices, len(positions))).tolist()),
+                         set(np.flatnonzero(border_vertices(weld[split_lod_indices], len(split_positions))).tolist()))
+        # the triangles on each side of the seam still only use their own copies
+        right = split_positions[split_lod_indices].mean(axis=1)[:, 0] > 4.0
+        self.assertTrue(np.all(split_lod_indices[~right] < len(positions)))
+        self.assertFalse(np.any(np.isin(split_lod_indices[right], np.flatnonzero(positions[:, 0] == 4.0))))
+
+        normals, areas = face_normals(split_positions, split_lod_indices)
+        self.assertTrue(np.all(normals[:, 2] > 0.0))
+        self.assertAlmostEqual(64.0, areas.sum() / 2.0)
+
+    def test_decimate_only_merges_vertices_with_same_key(self):
+        positions, indices = get_grid()
+
+        kept, _ = decimate(positions, indices, 10, np.arange(len(positions)))
+        self.assertEqual(len(indices), len(kept))
+
+        keys = (positions[:, 0] > 4.0).astype(int)
+        kept, lod_indices = decimate(positions, indices, 10, keys)
+        self.assertTrue(len(kept) < len(indices))
+        # collapsed corners are replaced in place, so every corner keeps its key
+        self.assertEqual(keys[indices[kept]].tolist(), keys[lod_indices].tolist())
+
+    def test_decimate_ignores_loose_copies(self):
+        positions, indices = get_grid()
+        # an unused copy of every vertex, e.g. of loose vertices of the mesh
+        loose_positions = np.concatenate((positions, positions))
+
+        _, lod_indices = decimate(positions, indices, 10)
+        _, loose_lod_indices = decimate(loose_positions, indices, 10)
+
+        self.assertEqual(lod_indices.tolist(), loose_lod_indices.tolist())
+
+    def test_decimate_returns_input_if_target_count_is_reached(self):
+        positions, indices = get_grid(2)
+
+        kept, lod_indices = decimate(positions, indices, 8)
+
+        self.assertEqual(list(range(8)), kept.tolist())
+        self.assertEqual(indices.tolist(), lod_indices.tolist())
@@ -0,0 +1,35 @@
+# <pep8 compliant>
+
+import os
+from io_mesh_w3d.common.utils.file_output import *
+from tests.utils import TestCase
+
+
+class TestFileOutput(TestCase):
+    def test_atomic_output_replaces_the_file(self):
+        path = self.outpath() + 'atomic.w3d'
+        with open(path, 'wb') as file:
+            file.write(b'old')
+
+        with atomic_output(path, sync=True) as file:
+            file.write(b'new content')
+            with open(path, 'rb') as current:
+                self.assertEqual(b'old', current.read())
+
+        with open(path, 'rb') as file:
+            self.assertEqual(b'new content', file.read())
+        self.assertFalse([name for name in os.listdir(self.outpath()) if name.endswith('.tmp')])
+
+    def test_atomic_output_keeps_the_file_on_errors(self):
+        path = self.outpath() + 'atomic.w3d'
+        with open(path, 'wb') as file:
+            file.write(b'old')
+
+        with self.assertRaises(ValueError):
+            with atomic_output(path) as file:
+                file.write(b'partial')
+                raise ValueError('export failed')
+
+        with open(path, 'rb') as file:
+            self.assertEqual(b'old', file.read())
+        self.assertFalse([name for name in os.listdir(self.outpath()) if name.endswith('.tmp')])
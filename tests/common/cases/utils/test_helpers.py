@@ -79,4 +79,56 @@ class TestHelpers(TestCase):
     def test_call_create_uv_layer_without_tx_coords(self):
         fake_mat_pass = FakeClass()
 
-        create_uvlayer(self, None, None, None, fake_mat_pass)
+        create_uvlayer(self, None, None, fake_mat_pass)
+
+    def test_create_uv_layer_assigns_the_coordinates_of_each_loop_vertex(self):
+        fake_mat_pass = FakeClass()
+        fake_mat_pass.tx_coords = [Vector((0.0, 0.1)), Vector((0.2, 0.3)), Vector((0.4, 0.5)), Vector((0.6, 0.7))]
+        triangles = [[0, 1, 2], [2, 3, 0]]
+
+        mesh = bpy.data.meshes.new('mesh')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], [], triangles)
+
+        create_uvlayer(self, mesh, triangles, fake_mat_pass)
+
+        for polygon, triangle in zip(mesh.polygons, triangles):
+            for loop_index, vert_id in zip(polygon.loop_indices, triangle):
+                self.assertEqual(vert_id, mesh.loops[loop_index].vertex_index)
+                expected = fake_mat_pass.tx_coords[vert_id]
+                actual = mesh.uv_layers[0].data[loop_index].uv
+                self.assertAlmostEqual(expected.x, actual.x, 5)
+                self.assertAlmostEqual(expected.y, actual.y, 5)
+
+    def test_deferred_links_link_and_select_objects_once_at_the_end(self):
+        coll = bpy.context.scene.collection
+        objects = [bpy.data.objects.new(f'object{i}', None) for i in range(3)]
+        use_global_undo = bpy.context.preferences.edit.use_global_undo
+
+        with deferred_links() as links:
+            for obj in objects:
+                link_object_to_active_scene(obj, coll, links)
+            hide_object(objects[1], links)
+            self.assertFalse(any(obj.name in coll.objects for obj in objects))
+            self.assertFalse(bpy.context.preferences.edit.use_global_undo)
+
+        self.assertTrue(all(obj.name in coll.objects for obj in objects))
+        self.assertEqual([False, True, False], [obj.hide_get() for obj in objects])
+        self.assertEqual([True, False, True], [obj.select_get() for obj in objects])
+        self.assertEqual(objects[2], bpy.context.view_layer.objects.active)
+        self.assertEqual(use_global_undo, bpy.context.preferences.edit.use_global_undo)
+        self.assertEqual([], links.links)
+
+    def test_switch_to_pose_returns_previous_pose_and_skips_unchanged_updates(self):
+        rig = bpy.data.objects.new('rig', bpy.data.armatures.new('armature'))
+        bpy.context.scene.collection.objects.link(rig)
+        rig.data.pose_position = 'POSE'
+
+        with (patch('io_mesh_w3d.common.utils.helpers.bpy')) as bpy_mock:
+            update_func = bpy_mock.context.view_layer.update
+            self.assertEqual('POSE', switch_to_pose(rig, 'REST'))
+            self.assertEqual('REST', switch_to_pose(rig, 'REST'))
+            self.assertEqual('REST', switch_to_pose(rig, 'POSE'))
+
+            self.assertEqual(2, update_func.call_count)
+        self.assertEqual('POSE', rig.data.pose_position)
+        self.assertIsNone(switch_to_pose(None, 'REST'))
@@ -16,3 +16,33 @@ class TestMaterialUtils(TestCase):
         with (patch.object(self, 'error')) as report_func:
             create_material_from_shader_material(self, 'lorem ipsum', shader_mat)
             report_func.assert_called_with('shader property not implemented: UnimplementedProp')
+
+    def test_shader_material_cache_reuses_identical_materials(self):
+        material_cache = {}
+        (first, _) = create_material_from_shader_material(self, 'first', get_shader_material(), material_cache)
+        (second, _) = create_material_from_shader_material(self, 'second', get_shader_material(), material_cache)
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(material_cache))
+
+        bpy.data.materials.remove(first)
+        (third, _) = create_material_from_shader_material(self, 'third', get_shader_material(), material_cache)
+
+        self.assertEqual('third.' + get_shader_material().header.type_name, third.name)
+
+    def test_materials_are_copies_of_one_template_per_kind(self):
+        shader_mat = get_shader_material()
+        with material_templates() as templates:
+            (first, _) = create_material_from_shader_material(self, 'first', shader_mat)
+            shader_mat.properties = []
+            (second, _) = create_material_from_shader_material(self, 'second', shader_mat)
+
+            template = templates['SHADER_MATERIAL.' + shader_mat.header.type_name]
+            self.assertEqual(1, len(templates))
+            self.assertEqual('SHADER_MATERIAL', second.material_type)
+            self.assertNotEqual(first.node_tree, second.node_tree)
+            self.assertIsNotNone(first.node_tree.nodes[TEXTURE_NODE_NAME].image)
+            self.assertIsNone(template.node_tree.nodes[TEXTURE_NODE_NAME].image)
+            self.assertFalse(TEXTURE_NODE_NAME in second.node_tree.nodes)
+
+        self.assertEqual(2, len(bpy.data.materials))
@@ -10,8 +10,12 @@ from unittest.mock import patch
 from shutil import copyfile
 
 from io_mesh_w3d.common.utils.mesh_export import *
+from io_mesh_w3d.common.utils.export_cache import *
+from io_mesh_w3d.common.utils.hlod_export import append_generated_lod_arrays, apply_static_batches, apply_terrain_tiles
 from io_mesh_w3d.common.utils.mesh_import import *
 from io_mesh_w3d.common.utils.hierarchy_import import *
+from io_mesh_w3d.common.structs.data_context import DataContext
+from io_mesh_w3d.w3d.export_w3d import save
 from tests.common.helpers.mesh import *
 from tests.common.helpers.hierarchy import *
 from tests.common.helpers.hlod import *
@@ -47,7 +51,7 @@ class TestMeshExportUtils(TestCase):
         self.assertEqual(1, len(meshes))
 
         mesh = meshes[0]
-        self.assertEqual(12, len(mesh.verts))
+        self.assertEqual(8, len(mesh.verts))
 
     def test_multiuser_mesh_with_modifiers_export(self):
         self.loadBlend(up(up(up(self.relpath()))) + '/testfiles/multiuser_mesh_with_modifiers.blend')
@@ -63,7 +67,7 @@ class TestMeshExportUtils(TestCase):
         self.assertEqual(42, len(mesh.verts))
 
         mesh2 = meshes[1]
-        self.assertEqual(161, len(mesh2.verts))
+        self.assertEqual(50, len(mesh2.verts))
 
     def test_trianglulation_of_sphere(self):
         mesh = bpy.data.meshes.new('sphere')
@@ -354,10 +358,12 @@ class TestMeshExportUtils(TestCase):
         for i, datum in enumerate(uv_layer.data):
             datum.uv = tx_coords[i]
 
-        _mesh = prepare_bmesh(self, mesh)
+        triangulate_mesh(mesh)
+        vertex_map, _, loop_to_split = split_multi_uv_vertices(self, mesh)
 
-        self.assertEqual(8, len(_mesh.verts))
-        self.assertEqual(12, len(_mesh.faces))
+        self.assertEqual(8, len(vertex_map))
+        self.assertEqual(12, len(mesh.polygons))
+        self.assertEqual(36, len(loop_to_split))
 
     def test_multi_uv_vertex_splitting(self):
         mesh = bpy.data.meshes.new('mesh')
@@ -395,10 +401,13 @@ class TestMeshExportUtils(TestCase):
         for i, datum in enumerate(uv_layer.data):
             datum.uv = tx_coords[i]
 
-        _mesh = prepare_bmesh(self, mesh)
+        triangulate_mesh(mesh)
+        vertex_map, _, loop_to_split = split_multi_uv_vertices(self, mesh)
 
-        self.assertEqual(36, len(_mesh.verts))
-        self.assertEqual(12, len(_mesh.faces))
+        self.assertEqual(24, len(vertex_map))
+        self.assertEqual(12, len(mesh.polygons))
+        for loop_index, vert_index in enumerate(loop_to_split):
+            self.assertEqual(mesh.loops[loop_index].vertex_index, vertex_map[vert_index])
 
     def test_multi_uv_vertex_splitting_triangulated(self):
         mesh = bpy.data.meshes.new('mesh')
@@ -450,10 +459,11 @@ class TestMeshExportUtils(TestCase):
         for i, datum in enumerate(uv_layer.data):
             datum.uv = tx_coords[i]
 
-        _mesh = prepare_bmesh(self, mesh)
+        triangulate_mesh(mesh)
+        vertex_map, _, _ = split_multi_uv_vertices(self, mesh)
 
-        self.assertEqual(36, len(_mesh.verts))
-        self.assertEqual(12, len(_mesh.faces))
+        self.assertEqual(36, len(vertex_map))
+        self.assertEqual(12, len(mesh.polygons))
 
     def test_mesh_with_unconnected_vertex_export(self):
         self.file_format = 'W3X'
@@ -671,6 +681,7 @@ class TestMeshExportUtils(TestCase):
         else:
             mesh = bpy.data.meshes['mesh']
             mesh.face_maps.clear()
+            mesh.attributes.remove(mesh.attributes[SURFACE_TYPE_ATTRIBUTE])
 
         if bpy.app.version < (4, 0, 0):
             mesh.face_maps.new(name='InvalidSurfaceType')
@@ -709,6 +720,7 @@ class TestMeshExportUtils(TestCase):
             mesh_object.face_maps.clear()
         else:
             mesh_object.data.face_maps.clear()
+            mesh_object.data.attributes.remove(mesh_object.data.attributes[SURFACE_TYPE_ATTRIBUTE])
 
         meshes, _ = retrieve_meshes(self, None, None, 'container_name')
 
@@ -716,6 +728,50 @@ class TestMeshExportUtils(TestCase):
         for triangle in meshes[0].triangles:
             self.assertEqual(8, triangle.surface_type)
 
+    def test_mesh_export_surface_type_attribute(self):
+        m = get_mesh('mesh')
+        for i, triangle in enumerate(m.triangles):
+            triangle.surface_type = 2 if i % 2 else 4
+        create_mesh(self, m, get_collection())
+
+        mesh = bpy.data.objects['mesh'].data
+        if bpy.app.version < (4, 0, 0):
+            bpy.data.objects['mesh'].face_maps.clear()
+            attribute = mesh.attributes.new(SURFACE_TYPE_ATTRIBUTE, 'INT', 'FACE')
+            attribute.data.foreach_set('value', [3 if i % 2 else 5 for i in range(len(m.triangles))])
+        for material in mesh.materials:
+            material.w3d_material_settings.surface_type = '8'
+        mesh.attributes[SURFACE_TYPE_ATTRIBUTE].data[0].value = 0
+
+        meshes, _ = retrieve_meshes(self, None, None, 'container_name')
+
+        self.assertEqual(8, meshes[0].triangles[0].surface_type)
+        for i in range(1, len(meshes[0].triangles)):
+            self.assertEqual(2 if i % 2 else 4, meshes[0].triangles[i].surface_type)
+
+    def test_mesh_export_face_maps_take_precedence_over_surface_type_attribute(self):
+        m = get_mesh('mesh')
+        for triangle in m.triangles:
+            triangle.surface_type = 2
+        create_mesh(self, m, get_collection())
+
+        mesh = bpy.data.objects['mesh'].data
+        for material in mesh.materials:
+            material.w3d_material_settings.surface_type = '8'
+        if bpy.app.version < (4, 0, 0):
+            # all zero, the surface types of the materials
+            mesh.attributes.new(SURFACE_TYPE_ATTRIBUTE, 'INT', 'FACE')
+            expected = [2] * len(m.triangles)
+        else:
+            face_map = mesh.face_maps.add()
+            face_map.name = surface_types[6]
+            face_map.value.add().value = 0
+            expected = [6] + [8] * (len(m.triangles) - 1)
+
+        meshes, _ = retrieve_meshes(self, None, None, 'container_name')
+
+        self.assertEqual(expected, [triangle.surface_type for triangle in meshes[0].triangles])
+
     def test_mesh_export_invalid_vertex_color_layer_name(self):
         mesh = get_mesh('mesh')
         create_mesh(self, mesh, get_collection())
@@ -756,3 +812,492 @@ class TestMeshExportUtils(TestCase):
         _, used_textures = retrieve_meshes(self, None, None, 'container_name')
 
         self.assertEqual('texture.tga', used_textures[0])
+
+    def test_calculate_mesh_sphere_contains_all_vertices(self):
+        mesh = bpy.data.meshes.new('mesh_cube')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_cube(b_mesh, size=2)
+        b_mesh.to_mesh(mesh)
+
+        for exact in [False, True]:
+            center, radius = calculate_mesh_sphere(mesh, exact=exact)
+
+            almost_equal(self, 0.0, center.length)
+            almost_equal(self, 3 ** 0.5, radius)
+            for vertex in mesh.vertices:
+                self.assertTrue((vertex.co - center).length <= radius + 0.0001)
+
+    def test_calculate_mesh_sphere_exact_is_not_larger_than_approximation(self):
+        mesh = bpy.data.meshes.new('mesh_sphere')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_uvsphere(b_mesh, u_segments=12, v_segments=6, radius=1.5)
+        bmesh.ops.translate(b_mesh, verts=b_mesh.verts[:6], vec=(0.7, 0.2, 0.0))
+        b_mesh.to_mesh(mesh)
+
+        _, approx_radius = calculate_mesh_sphere(mesh)
+        center, exact_radius = calculate_mesh_sphere(mesh, exact=True)
+
+        self.assertTrue(exact_radius <= approx_radius + 0.0001)
+        for vertex in mesh.vertices:
+            self.assertTrue((vertex.co - center).length <= exact_radius + 0.0001)
+
+    def test_scatter_uv_coords_matches_loop_uvs(self):
+        mesh = bpy.data.meshes.new('mesh')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_cube(b_mesh, size=1)
+        b_mesh.to_mesh(mesh)
+
+        uv_layer = mesh.uv_layers.new(do_init=False)
+        for i, datum in enumerate(uv_layer.data):
+            datum.uv = get_vec2(i / 24.0, 1.0 - i / 24.0)
+
+        triangulate_mesh(mesh)
+        loop_uvs = gather_loop_uvs(mesh)
+        vertex_map, _, loop_to_split = split_multi_uv_vertices(self, mesh, loop_uvs)
+        buffers = scatter_uv_coords(loop_uvs, loop_to_split, len(vertex_map))
+
+        self.assertEqual(1, len(buffers))
+        self.assertEqual(len(vertex_map), len(buffers[0]))
+        for loop_index, vert_index in enumerate(loop_to_split):
+            compare_vectors2(self, uv_layer.data[loop_index].uv, buffers[0][vert_index])
+
+    def test_retrieve_meshes_processes_every_mesh(self):
+        for i in range(3):
+            mesh = bpy.data.meshes.new(f'mesh_cube{i}')
+
+            b_mesh = bmesh.new()
+            bmesh.ops.create_cube(b_mesh, size=i + 1)
+            b_mesh.to_mesh(mesh)
+
+            mesh_ob = bpy.data.objects.new(f'mesh_object{i}', mesh)
+            mesh_ob.data.object_type = 'MESH'
+            bpy.context.scene.collection.objects.link(mesh_ob)
+
+        meshes, _ = retrieve_meshes(self, None, None, 'container_name')
+
+        self.assertEqual(3, len(meshes))
+        for mesh in meshes:
+            index = int(mesh.header.mesh_name[-1])
+            almost_equal(self, (index + 1) * 0.5 * 3 ** 0.5, mesh.header.sph_radius)
+            self.assertIsNotNone(mesh.aabbtree)
+            self.assertEqual(len(mesh.triangles), mesh.aabbtree.header.poly_count)
+
+    def test_incremental_export_reuses_unchanged_meshes(self):
+        mesh = bpy.data.meshes.new('mesh_cube')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_cube(b_mesh, size=1)
+        b_mesh.to_mesh(mesh)
+
+        mesh_ob = bpy.data.objects.new('mesh_object', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        self._w3d_export_options = {'incremental_export': True}
+        try:
+            first, _ = retrieve_meshes(self, None, None, 'container_name')
+            second, _ = retrieve_meshes(self, None, None, 'container_name')
+
+            self.assertIsNot(first[0], second[0])
+            self.assertIs(first[0].verts, second[0].verts)
+            self.assertIs(MESH_CACHE.entry_of(first[0]), MESH_CACHE.entry_of(second[0]))
+            self.assertEqual(1, MESH_CACHE.hits)
+
+            expected = io.BytesIO()
+            first[0].write(expected)
+            for _ in range(2):
+                actual = io.BytesIO()
+                write_mesh_chunk(second[0], actual)
+                self.assertEqual(expected.getvalue(), actual.getvalue())
+
+            mesh.vertices[0].co.x += 1.0
+            third, _ = retrieve_meshes(self, None, None, 'container_name')
+
+            self.assertIsNot(first[0], third[0])
+            self.assertEqual(1, MESH_CACHE.misses)
+        finally:
+            del self._w3d_export_options
+            MESH_CACHE.clear()
+
+    def test_incremental_export_does_not_keep_header_changes_of_previous_exports(self):
+        mesh = bpy.data.meshes.new('mesh_cube')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_cube(b_mesh, size=1)
+        b_mesh.to_mesh(mesh)
+
+        mesh_ob = bpy.data.objects.new('mesh_object', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        self._w3d_export_options = {'incremental_export': True}
+        export_settings = {'mode': 'M', 'compression': 'U'}
+        try:
+            for container_name in ['first_container', 'second_container']:
+                meshes, _ = retrieve_meshes(self, None, None, container_name)
+                self.assertEqual('mesh_object', meshes[0].header.mesh_name)
+                self.assertEqual(container_name, meshes[0].header.container_name)
+
+                # export mode M writes the mesh under the name of the container
+                self.filepath = self.outpath() + container_name + '.w3d'
+                data_context = DataContext(container_name=container_name, meshes=meshes)
+                self.assertEqual({'FINISHED'}, save(self, export_settings, data_context))
+
+                with open(self.filepath, 'rb') as file:
+                    (chunk_type, _, chunk_end) = read_chunk_head(file)
+                    self.assertEqual(W3D_CHUNK_MESH, chunk_type)
+                    written = Mesh.read(self, file, chunk_end)
+                self.assertEqual(container_name, written.header.mesh_name)
+                self.assertEqual('', written.header.container_name)
+
+            self.assertEqual(1, MESH_CACHE.hits)
+        finally:
+            del self._w3d_export_options
+            MESH_CACHE.clear()
+
+    def test_mesh_cache_indexes_entries_by_struct(self):
+        cache = MeshExportCache()
+        first, lod, second = get_mesh('first'), get_mesh('first_LOD1'), get_mesh('second')
+
+        cache.store('first', 'a', first, [], [lod])
+        self.assertIs(cache.entries['first'], cache.entry_of(first))
+        self.assertIs(cache.entries['first'], cache.entry_of(lod))
+
+        cache.store('first', 'b', second, [])
+        self.assertIsNone(cache.entry_of(first))
+        self.assertIsNone(cache.entry_of(lod))
+        self.assertIs(cache.entries['first'], cache.entry_of(second))
+
+        cache.prune({'other'})
+        self.assertIsNone(cache.entry_of(second))
+        self.assertEqual(0, len(cache.struct_entries))
+
+    def test_cached_copies_have_their_own_headers(self):
+        source = get_mesh('mesh_object')
+        MESH_CACHE.store('mesh_object', 'a', source, [], [create_lod_mesh(source, 1)])
+        entry = MESH_CACHE.entries['mesh_object']
+        try:
+            for container_name in ['first', 'second']:
+                mesh_struct, lods = create_cached_copies(entry, 'mesh_object', container_name)
+                self.assertIsNot(source.header, mesh_struct.header)
+                self.assertEqual(container_name, mesh_struct.header.container_name)
+                self.assertEqual([container_name], [lod.header.container_name for lod in lods])
+                self.assertIs(entry, MESH_CACHE.entry_of(mesh_struct))
+                self.assertIs(entry, MESH_CACHE.entry_of(lods[0]))
+
+                # like export mode M
+                mesh_struct.header.container_name = ''
+                mesh_struct.header.mesh_name = container_name
+                io_stream = io.BytesIO()
+                write_mesh_chunk(mesh_struct, io_stream)
+                io_stream.seek(0)
+                (_, _, chunk_end) = read_chunk_head(io_stream)
+                self.assertEqual(container_name, Mesh.read(self, io_stream, chunk_end).header.mesh_name)
+
+            self.assertEqual('mesh_object', source.header.mesh_name)
+            self.assertEqual(2, len(entry.chunks))
+            # only the copies of the last export stay indexed
+            self.assertEqual(4, len(MESH_CACHE.struct_entries))
+        finally:
+            MESH_CACHE.clear()
+
+    def test_vertex_cache_optimization_keeps_geometry(self):
+        mesh = bpy.data.meshes.new('mesh_sphere')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_uvsphere(b_mesh, u_segments=16, v_segments=8, radius=1.0)
+        b_mesh.to_mesh(mesh)
+
+        uv_layer = mesh.uv_layers.new(do_init=False)
+        for i, datum in enumerate(uv_layer.data):
+            datum.uv = get_vec2(i / len(uv_layer.data), 0.5)
+
+        mesh_ob = bpy.data.objects.new('mesh_object', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        expected, _ = retrieve_meshes(self, None, None, 'container_name')
+
+        self._w3d_export_options = {'optimize_vertex_cache': True}
+        try:
+            actual, _ = retrieve_meshes(self, None, None, 'container_name')
+        finally:
+            del self._w3d_export_options
+
+        self.assertEqual(len(expected[0].verts), len(actual[0].verts))
+        self.assertEqual(len(expected[0].triangles), len(actual[0].triangles))
+        self.assertEqual(list(range(len(actual[0].verts))), actual[0].shade_ids)
+
+        expected_tris = sorted(
+            tuple(sorted(tuple(expected[0].verts[i]) for i in tri.vert_ids)) for tri in expected[0].triangles)
+        actual_tris = sorted(
+            tuple(sorted(tuple(actual[0].verts[i]) for i in tri.vert_ids)) for tri in actual[0].triangles)
+        self.assertEqual(expected_tris, actual_tris)
+
+        self.assertEqual(len(actual[0].triangles), actual[0].aabbtree.header.poly_count)
+
+    def test_generated_lods_are_simplified_and_added_to_hlod(self):
+        mesh = bpy.data.meshes.new('sphere')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_uvsphere(b_mesh, u_segments=32, v_segments=16, radius=1.0)
+        b_mesh.to_mesh(mesh)
+
+        mesh_ob = bpy.data.objects.new('sphere', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        self._w3d_export_options = {'generated_lod_count': 2, 'lod_triangle_ratio': 0.5}
+        try:
+            meshes, _ = retrieve_meshes(self, None, None, 'containerName')
+        finally:
+            del self._w3d_export_options
+
+        self.assertEqual(['sphere', 'sphere_LOD1', 'sphere_LOD2'], [mesh.name() for mesh in meshes])
+        self.assertEqual([0, 1, 2], [mesh.lod_level for mesh in meshes])
+        self.assertTrue(len(meshes[0].triangles) > len(meshes[1].triangles) > len(meshes[2].triangles))
+        for lod in meshes[1:]:
+            self.assertEqual('sphere', lod.lod_source)
+            self.assertEqual(len(lod.verts), lod.header.vert_count)
+            self.assertEqual(len(lod.triangles), lod.header.face_count)
+            self.assertTrue(max(max(tri.vert_ids) for tri in lod.triangles) < len(lod.verts))
+
+        hlod = get_hlod()
+        hlod.lod_arrays[0].sub_objects = [get_hlod_sub_object(bone=1, name='containerName.sphere')]
+        append_generated_lod_arrays(hlod, meshes)
+
+        self.assertEqual(3, hlod.header.lod_count)
+        self.assertEqual(['containerName.sphere_LOD2', 'containerName.sphere_LOD1', 'containerName.sphere'],
+                         [array.sub_objects[0].identifier for array in hlod.lod_arrays])
+        self.assertEqual([0.3, 1.0], [array.header.max_screen_size for array in hlod.lod_arrays[:2]])
+        self.assertEqual([1, 1, 1], [array.sub_objects[0].bone_index for array in hlod.lod_arrays])
+
+    def test_static_batching_merges_meshes_on_the_same_pivot(self):
+        for i in range(4):
+            mesh = bpy.data.meshes.new(f'mesh_cube{i}')
+
+            b_mesh = bmesh.new()
+            bmesh.ops.create_cube(b_mesh, size=1)
+            bmesh.ops.translate(b_mesh, verts=b_mesh.verts, vec=(2.0 * i, 0.0, 0.0))
+            b_mesh.to_mesh(mesh)
+
+            mesh_ob = bpy.data.objects.new(f'cube{i}', mesh)
+            mesh_ob.data.object_type = 'MESH'
+            mesh_ob.w3d_object_settings.export_transform = False
+            bpy.context.scene.collection.objects.link(mesh_ob)
+        bpy.data.objects['cube3'].w3d_object_settings.allow_batching = False
+
+        self._w3d_export_options = {'batch_static_meshes': True}
+        try:
+            meshes, _ = retrieve_meshes(self, None, None, 'containerName')
+        finally:
+            del self._w3d_export_options
+
+        self.assertEqual(['cube0', 'cube3'], [mesh.name() for mesh in meshes])
+        batch = meshes[0]
+        self.assertEqual(['cube0', 'cube1', 'cube2'], batch.batched_meshes)
+        self.assertEqual(3 * 8, len(batch.verts))
+        self.assertEqual(3 * 12, len(batch.triangles))
+        self.assertEqual(len(batch.verts), batch.header.vert_count)
+        self.assertEqual(len(batch.triangles), batch.aabbtree.header.poly_count)
+        self.assertEqual(list(range(24)), sorted({i for tri in batch.triangles for i in tri.vert_ids}))
+        almost_equal(self, -0.5, batch.header.min_corner.x)
+        almost_equal(self, 4.5, batch.header.max_corner.x)
+
+        hlod = get_hlod()
+        hlod.lod_arrays[0].sub_objects = [
+            get_hlod_sub_object(name=f'containerName.cube{i}') for i in range(4)]
+        apply_static_batches(hlod, meshes)
+
+        self.assertEqual(2, hlod.lod_arrays[0].header.model_count)
+        self.assertEqual(['containerName.cube0', 'containerName.cube3'],
+                         [sub_object.identifier for sub_object in hlod.lod_arrays[0].sub_objects])
+
+    def test_incremental_export_does_not_cache_batched_meshes(self):
+        for i in range(2):
+            mesh = bpy.data.meshes.new(f'mesh_cube{i}')
+
+            b_mesh = bmesh.new()
+            bmesh.ops.create_cube(b_mesh, size=1)
+            bmesh.ops.translate(b_mesh, verts=b_mesh.verts, vec=(2.0 * i, 0.0, 0.0))
+            b_mesh.to_mesh(mesh)
+
+            mesh_ob = bpy.data.objects.new(f'cube{i}', mesh)
+            mesh_ob.data.object_type = 'MESH'
+            mesh_ob.w3d_object_settings.export_transform = False
+            bpy.context.scene.collection.objects.link(mesh_ob)
+
+        self._w3d_export_options = {'incremental_export': True, 'batch_static_meshes': True}
+        try:
+            first, _ = retrieve_meshes(self, None, None, 'containerName')
+            self.assertEqual(['cube0', 'cube1'], first[0].batched_meshes)
+
+            bpy.data.objects['cube1'].w3d_object_settings.allow_batching = False
+            second, _ = retrieve_meshes(self, None, None, 'containerName')
+        finally:
+            del self._w3d_export_options
+            MESH_CACHE.clear()
+
+        self.assertEqual(['cube0', 'cube1'], [mesh.name() for mesh in second])
+        for mesh in second:
+            self.assertEqual([], mesh.batched_meshes)
+            almost_equal(self, 0.5 * 3 ** 0.5, mesh.header.sph_radius)
+            self.assertIsNotNone(mesh.aabbtree)
+            self.assertEqual(len(mesh.triangles), mesh.aabbtree.header.poly_count)
+
+    def test_materials_are_converted_once_per_export(self):
+        material = bpy.data.materials.new('shared_material')
+        material.use_nodes = True
+
+        for i in range(3):
+            mesh = bpy.data.meshes.new(f'mesh_cube{i}')
+
+            b_mesh = bmesh.new()
+            bmesh.ops.create_cube(b_mesh, size=1)
+            b_mesh.to_mesh(mesh)
+            mesh.materials.append(material)
+
+            mesh_ob = bpy.data.objects.new(f'cube{i}', mesh)
+            mesh_ob.data.object_type = 'MESH'
+            bpy.context.scene.collection.objects.link(mesh_ob)
+
+        with patch('io_mesh_w3d.common.utils.mesh_export.retrieve_vertex_material',
+                   wraps=retrieve_vertex_material) as retrieve:
+            meshes, _ = retrieve_meshes(self, None, None, 'containerName')
+
+        self.assertEqual(1, retrieve.call_count)
+        self.assertEqual(3, len(meshes))
+        for mesh in meshes:
+            self.assertEqual(1, len(mesh.vert_materials))
+            self.assertEqual(1, len(mesh.shaders))
+            self.assertEqual([0], mesh.material_passes[0].vertex_material_ids)
+            self.assertEqual([0], mesh.material_passes[0].shader_ids)
+        self.assertTrue(meshes[0].vert_materials[0] is meshes[2].vert_materials[0])
+        self.assertFalse(meshes[0].shaders[0] is meshes[2].shaders[0])
+
+    def test_linked_duplicates_reuse_the_evaluated_mesh_data(self):
+        mesh = bpy.data.meshes.new('mesh_cube')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_cube(b_mesh, size=1)
+        b_mesh.to_mesh(mesh)
+        mesh.object_type = 'MESH'
+
+        for i in range(4):
+            mesh_ob = bpy.data.objects.new(f'cube{i}', mesh)
+            mesh_ob.location = (2.0 * i, 0.0, 0.0)
+            bpy.context.scene.collection.objects.link(mesh_ob)
+        bpy.data.objects['cube3'].scale = (2.0, 2.0, 2.0)
+        bpy.data.objects['cube2'].w3d_object_settings.geom_two_sided = True
+
+        self._w3d_export_options = {'reuse_linked_mesh_data': True}
+        try:
+            with patch('io_mesh_w3d.common.utils.mesh_export.triangulate_mesh',
+                       wraps=triangulate_mesh) as triangulate:
+                meshes, _ = retrieve_meshes(self, None, None, 'containerName')
+        finally:
+            del self._w3d_export_options
+
+        self.assertEqual(2, triangulate.call_count)
+        self.assertEqual(['cube0', 'cube1', 'cube2', 'cube3'], [mesh.name() for mesh in meshes])
+        for instance in meshes[1:3]:
+            self.assertIsNot(meshes[0].header, instance.header)
+            self.assertIs(meshes[0].verts, instance.verts)
+            self.assertIs(meshes[0].triangles, instance.triangles)
+            self.assertIs(meshes[0].aabbtree, instance.aabbtree)
+            self.assertEqual(meshes[0].header.vert_count, instance.header.vert_count)
+            almost_equal(self, meshes[0].header.sph_radius, instance.header.sph_radius)
+        self.assertFalse(meshes[1].two_sided())
+        self.assertTrue(meshes[2].two_sided())
+        self.assertIsNot(meshes[0].verts, meshes[3].verts)
+
+    def test_mesh_export_vertex_colors(self):
+        mesh = bpy.data.meshes.new('mesh_cube')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_cube(b_mesh, size=1)
+        b_mesh.to_mesh(mesh)
+        mesh.materials.append(bpy.data.materials.new('material'))
+
+        layer = mesh.vertex_colors.new(name='DCG_0')
+        for i, loop in enumerate(mesh.loops):
+            x, y, z = mesh.vertices[loop.vertex_index].co
+            layer.data[i].color = (x + 0.5, y + 0.5, z + 0.5, 1.0)
+
+        mesh_ob = bpy.data.objects.new('cube', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        meshes, _ = retrieve_meshes(self, None, None, 'containerName')
+
+        mat_pass = meshes[0].material_passes[0]
+        self.assertEqual(len(meshes[0].verts), len(mat_pass.dcg))
+        self.assertEqual(0, len(mat_pass.dig))
+        for vert, color in zip(meshes[0].verts, mat_pass.dcg):
+            compare_rgbas(self, RGBA(vec=(vert.x + 0.5, vert.y + 0.5, vert.z + 0.5, 1.0)), color)
+
+    def test_terrain_meshes_are_split_into_tiles(self):
+        mesh = bpy.data.meshes.new('terrain')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_grid(b_mesh, x_segments=8, y_segments=8, size=4)
+        b_mesh.to_mesh(mesh)
+        triangle_count = 2 * len(mesh.polygons)
+
+        mesh_ob = bpy.data.objects.new('terrain', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        self._w3d_export_options = {'terrain_mode': True, 'terrain_tile_count': 2}
+        try:
+            meshes, _ = retrieve_meshes(self, None, None, 'containerName')
+        finally:
+            del self._w3d_export_options
+
+        self.assertEqual(['terrain_T0', 'terrain_T1', 'terrain_T2', 'terrain_T3'], [mesh.name() for mesh in meshes])
+        self.assertEqual(triangle_count, sum(len(mesh.triangles) for mesh in meshes))
+        for tile in meshes:
+            self.assertEqual('terrain', tile.tile_source)
+            self.assertEqual(len(tile.verts), tile.header.vert_count)
+            self.assertEqual(len(tile.triangles), tile.aabbtree.header.poly_count)
+            self.assertEqual(list(range(len(tile.verts))),
+                             sorted({i for tri in tile.triangles for i in tri.vert_ids}))
+            self.assertTrue(tile.header.max_corner.x - tile.header.min_corner.x <= 4.0 + 1e-5)
+
+        hlod = get_hlod()
+        hlod.lod_arrays[0].sub_objects = [get_hlod_sub_object(name='terrain')]
+        apply_terrain_tiles(hlod, meshes)
+
+        self.assertEqual(4, hlod.lod_arrays[0].header.model_count)
+        self.assertEqual([mesh.name() for mesh in meshes],
+                         [sub_object.name for sub_object in hlod.lod_arrays[0].sub_objects])
+
+    def test_terrain_tile_bounds_match_the_untiled_mesh(self):
+        mesh = bpy.data.meshes.new('terrain')
+
+        b_mesh = bmesh.new()
+        bmesh.ops.create_grid(b_mesh, x_segments=8, y_segments=8, size=4)
+        b_mesh.to_mesh(mesh)
+
+        mesh_ob = bpy.data.objects.new('terrain', mesh)
+        mesh_ob.data.object_type = 'MESH'
+        mesh_ob.scale = (2.0, 2.0, 1.0)
+        bpy.context.scene.collection.objects.link(mesh_ob)
+
+        try:
+            self._w3d_export_options = {'terrain_mode': True, 'terrain_tile_count': 1}
+            (source, ), _ = retrieve_meshes(self, None, None, 'containerName')
+            self._w3d_export_options = {'terrain_mode': True, 'terrain_tile_count': 2}
+            tiles, _ = retrieve_meshes(self, None, None, 'containerName')
+        finally:
+            del self._w3d_export_options
+
+        self.assertEqual(4, len(tiles))
+        for tile in tiles:
+            for i in range(3):
+                self.assertTrue(source.header.min_corner[i] - 1e-5 <= tile.header.min_corner[i])
+                self.assertTrue(tile.header.max_corner[i] <= source.header.max_corner[i] + 1e-5)
+            self.assertTrue(tile.header.sph_radius < source.header.sph_radius)
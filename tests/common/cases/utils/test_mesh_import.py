@@ -204,6 +204,88 @@ class TestMeshImportUtils(TestCase):
         self.assertEqual(1, len(mesh.constraints))
         self.assertEqual('Damped Track', mesh.constraints[0].name)
 
+    def test_rig_mesh_assigns_weights_and_skin_positions(self):
+        mesh_struct = get_mesh('mesh', skin=True)
+        hierarchy = get_hierarchy()
+
+        create_mesh(self, mesh_struct, bpy.context.scene.collection)
+        rig = get_or_create_skeleton(hierarchy, bpy.context.scene.collection)
+        rig_mesh(mesh_struct, hierarchy, rig)
+
+        mesh_ob = bpy.data.objects['mesh']
+        for i, vert_inf in enumerate(mesh_struct.vert_infs):
+            pivot = hierarchy.pivots[vert_inf.bone_idx]
+            weights = {mesh_ob.vertex_groups[g.group].name: g.weight for g in mesh_ob.data.vertices[i].groups}
+            expected_weight = vert_inf.bone_inf
+            if vert_inf.bone_inf < 0.01 and vert_inf.xtra_inf < 0.01:
+                expected_weight = 1.0
+            if vert_inf.xtra_idx > 0:
+                xtra_name = hierarchy.pivots[vert_inf.xtra_idx].name
+                if xtra_name == pivot.name:
+                    expected_weight += vert_inf.xtra_inf
+                else:
+                    self.assertAlmostEqual(vert_inf.xtra_inf, weights[xtra_name], 3)
+            self.assertAlmostEqual(expected_weight, weights[pivot.name], 3)
+
+            if vert_inf.bone_idx == 0:
+                matrix = rig.matrix_local
+            else:
+                matrix = rig.data.bones[pivot.name].matrix_local
+            compare_vectors(self, matrix @ mesh_struct.verts[i], mesh_ob.data.vertices[i].co)
+
+    def test_identical_meshes_share_one_mesh_datablock(self):
+        shared_meshes = {}
+        first = get_mesh('first')
+        second = get_mesh('second')
+        second.header.container_name = 'other'
+        different = get_mesh('different')
+        different.verts[0] = get_vec(9.0, 9.0, 9.0)
+
+        for mesh_struct in [first, second, different]:
+            create_mesh(self, mesh_struct, bpy.context.scene.collection, shared_meshes=shared_meshes)
+
+        first_ob = bpy.data.objects['first']
+        second_ob = bpy.data.objects['second']
+        self.assertEqual(first_ob.data, second_ob.data)
+        self.assertNotEqual(first_ob.data, bpy.data.objects['different'].data)
+        self.assertEqual('second', second.name())
+        self.assertEqual(first_ob.data.materials[:], second_ob.data.materials[:])
+        self.assertEqual(2, len(shared_meshes))
+
+    def test_mesh_geometry_key_ignores_names_only(self):
+        first = get_mesh('first')
+        second = get_mesh('second')
+        second.header.container_name = 'other'
+        different_uvs = get_mesh('different_uvs')
+        different_uvs.material_passes[0].tx_stages[0].tx_coords[0][0] = get_vec2(0.5, 0.25)
+        different_surface = get_mesh('different_surface')
+        different_surface.triangles[0].surface_type = 3
+
+        key = mesh_geometry_key(first)
+
+        self.assertEqual(key, mesh_geometry_key(second))
+        self.assertEqual('first', first.name())
+        self.assertNotEqual(key, mesh_geometry_key(different_uvs))
+        self.assertNotEqual(key, mesh_geometry_key(different_surface))
+
+    def test_identical_vertex_materials_are_created_once(self):
+        def texture_node_count(mesh):
+            return sum(len([node for node in material.node_tree.nodes if node.type == 'TEX_IMAGE'])
+                       for material in mesh.materials)
+
+        material_cache = {}
+        create_mesh(self, get_mesh('first'), bpy.context.scene.collection, material_cache=material_cache)
+        first = bpy.data.objects['first'].data
+        expected_texture_nodes = texture_node_count(first)
+
+        create_mesh(self, get_mesh('second'), bpy.context.scene.collection, material_cache=material_cache)
+        second = bpy.data.objects['second'].data
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(first.materials[:], second.materials[:])
+        self.assertEqual(len(first.uv_layers), len(second.uv_layers))
+        self.assertEqual(expected_texture_nodes, texture_node_count(second))
+
     def test_mesh_import_invalid_surface_types(self):
         mesh_name = 'mesh'
         mesh_struct = get_mesh(mesh_name)
@@ -216,11 +298,32 @@ class TestMeshImportUtils(TestCase):
 
         if bpy.app.version < (4, 0, 0):
             mesh = bpy.data.objects[mesh_name]
+            self.assertEqual(1, len(mesh.face_maps))
+            self.assertEqual('Default', mesh.face_maps[0].name)
         else:
-            mesh = bpy.data.meshes[mesh_name]
+            attribute = bpy.data.meshes[mesh_name].attributes[SURFACE_TYPE_ATTRIBUTE]
+            values = [data.value for data in attribute.data]
+            self.assertEqual([surface_types.index('Default') + 1] * len(mesh_struct.triangles), values)
+
+    def test_mesh_import_groups_faces_by_surface_type(self):
+        mesh_name = 'mesh'
+        mesh_struct = get_mesh(mesh_name)
+        for i, triangle in enumerate(mesh_struct.triangles):
+            triangle.surface_type = 2 if i % 2 else 4
 
-        self.assertEqual(1, len(mesh.face_maps))
-        self.assertEqual('Default', mesh.face_maps[0].name)
+        create_mesh(self, mesh_struct, bpy.context.scene.collection)
+
+        mesh_ob = bpy.data.objects[mesh_name]
+        if bpy.app.version < (4, 0, 0):
+            self.assertEqual(['Dirt', 'Water'], [face_map.name for face_map in mesh_ob.face_maps])
+            face_map_ids = [mesh_ob.data.face_maps[0].data[i].value for i in range(len(mesh_struct.triangles))]
+            self.assertEqual([i % 2 for i in range(len(mesh_struct.triangles))], face_map_ids)
+        else:
+            attribute = mesh_ob.data.attributes[SURFACE_TYPE_ATTRIBUTE]
+            self.assertEqual('FACE', attribute.domain)
+            self.assertEqual('INT', attribute.data_type)
+            values = [data.value for data in attribute.data]
+            self.assertEqual([3 if i % 2 else 5 for i in range(len(mesh_struct.triangles))], values)
 
     def test_mesh_import_multiple_uv_coords_in_tx_stage(self):
         mesh_name = 'mesh'
@@ -250,6 +353,21 @@ class TestMeshImportUtils(TestCase):
         self.assertEqual('DIG_1', mesh.vertex_colors[4].name)
         self.assertEqual('SCG_1', mesh.vertex_colors[5].name)
 
+    def test_mesh_import_vertex_colors_are_gathered_per_loop(self):
+        mesh_name = 'mesh'
+        mesh_struct = get_mesh(mesh_name)
+        colors = [[i * 10 % 256, i * 20 % 256, i * 30 % 256, 255] for i in range(len(mesh_struct.verts))]
+        mesh_struct.material_passes[0].dcg = RGBABuffer(colors)
+
+        create_mesh(self, mesh_struct, bpy.context.scene.collection)
+
+        mesh = bpy.data.objects[mesh_name].data
+        layer = mesh.vertex_colors['DCG_0']
+        for i, loop in enumerate(mesh.loops):
+            expected = colors[loop.vertex_index]
+            for channel in range(4):
+                self.assertAlmostEqual(expected[channel] / 255, layer.data[i].color[channel], 2)
+
     def test_mesh_import_tx_stage_has_no_tx_coords(self):
         mesh_name = 'mesh'
         mesh_struct = get_mesh(mesh_name)
@@ -274,3 +392,20 @@ class TestMeshImportUtils(TestCase):
             create_mesh(self, mesh_struct, bpy.context.scene.collection)
         except Exception as e:
             raise e
+
+    def test_build_mesh_geometry_matches_from_pydata(self):
+        mesh_struct = get_mesh('testmesh')
+        triangles = [tuple(triangle.vert_ids) for triangle in mesh_struct.triangles]
+
+        expected = bpy.data.meshes.new('expected')
+        expected.from_pydata(mesh_struct.verts, [], triangles)
+        actual = bpy.data.meshes.new('actual')
+        build_mesh_geometry(actual, mesh_struct.verts, triangle_index_array(mesh_struct.triangles))
+
+        self.assertFalse(actual.validate())
+        self.assertEqual(len(expected.vertices), len(actual.vertices))
+        self.assertEqual(len(expected.edges), len(actual.edges))
+        for expected_vertex, actual_vertex in zip(expected.vertices, actual.vertices):
+            compare_vectors(self, expected_vertex.co, actual_vertex.co)
+        self.assertEqual([tuple(polygon.vertices) for polygon in expected.polygons],
+                         [tuple(polygon.vertices) for polygon in actual.polygons])
@@ -0,0 +1,167 @@
+# <pep8 compliant>
+# Written by Stephan Vedder and Michael Schnabel
+
+import io
+import numpy as np
+from mathutils import Vector
+
+from io_mesh_w3d.common.utils.mesh_processing import *
+from io_mesh_w3d.common.utils.mesh_export import create_aabb_tree
+from io_mesh_w3d.w3d.io_binary import write_list, write_long, write_vector
+from tests.utils import TestCase
+
+
+def get_grid_job(size=20, name='grid'):
+    points = np.array([(x, y, (x * y) % 3) for y in range(size + 1) for x in range(size + 1)], dtype=np.float32)
+    indices = []
+    for y in range(size):
+        for x in range(size):
+            a = y * (size + 1) + x
+            indices.append([a, a + 1, a + size + 1])
+            indices.append([a + 1, a + size + 2, a + size + 1])
+    indices = np.array(indices)[np.random.default_rng(0).permutation(2 * size * size)]
+
+    triangles = np.zeros(len(indices), dtype=TRIANGLE_DTYPE)
+    triangles['vert_ids'] = indices
+    triangles['surface_type'] = np.arange(len(indices)) % 4
+    normals = np.tile(np.array([0.0, 0.0, 1.0], dtype=np.float32), (len(points), 1))
+    return {
+        'name': name,
+        'vertex_count': len(points),
+        'coords': points,
+        'triangles': triangles,
+        'shade_ids': np.arange(len(points)),
+        'vectors': {'verts': points, 'normals': normals},
+    }
+
+
+def get_options(**kwargs):
+    options = {
+        'optimize_vertex_cache': True,
+        'build_aabbtree': True,
+        'pack_chunks': True,
+        'exact_sphere': False,
+        'lod_ratio': 0.5,
+    }
+    options.update(kwargs)
+    return options
+
+
+class TestMeshProcessing(TestCase):
+    def test_build_aabb_nodes(self):
+        job = get_grid_job(size=4)
+        indices = job['triangles']['vert_ids'].astype(np.int64)
+
+        nodes, poly_indices = build_aabb_nodes(job['coords'], indices)
+
+        self.assertEqual(list(range(len(indices))), sorted(poly_indices.tolist()))
+        self.assertEqual([0.0, 0.0, 0.0], nodes['min'][0].tolist())
+        self.assertEqual([4.0, 4.0, 2.0], nodes['max'][0].tolist())
+        leaves = nodes[(nodes['front'] & LEAF_FLAG) != 0]
+        self.assertEqual(len(indices), int(leaves['back'].sum()))
+        self.assertTrue(all(count <= 4 for count in leaves['back'].tolist()))
+
+    def test_build_aabb_nodes_empty(self):
+        self.assertIsNone(build_aabb_nodes(np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)))
+
+    def test_process_mesh_job_keeps_geometry(self):
+        job = get_grid_job()
+        points = job['coords']
+        before = {tuple(sorted(map(tuple, points[tri].tolist()))) for tri in job['triangles']['vert_ids']}
+
+        messages, result = process_mesh_job(job, get_options())
+
+        self.assertEqual(1, len(messages))
+        order = result['vertex_order']
+        self.assertEqual(list(range(len(points))), sorted(order.tolist()))
+        after = {tuple(sorted(map(tuple, points[order][tri].tolist()))) for tri in result['triangles']['vert_ids']}
+        self.assertEqual(before, after)
+        self.assertEqual(list(range(len(points))), result['shade_ids'].tolist())
+        self.assertEqual(len(job['triangles']), len(result['aabbtree'][1]))
+
+    def test_process_mesh_job_generates_lods(self):
+        job = get_grid_job()
+        job['lod_names'] = ['grid_LOD1', 'grid_LOD2']
+        job['positions'] = job['coords'].astype(np.float64)
+        job['skin_keys'] = None
+
+        messages, result = process_mesh_job(job, get_options())
+
+        self.assertEqual([1, 2], [lod['level'] for lod in result['lods']])
+        self.assertEqual([400, 200], [len(lod['triangles']) for lod in result['lods']])
+        self.assertTrue(messages[-1].startswith('mesh \'grid\' generated 2 LODs from 800 triangles in '))
+        for lod in result['lods']:
+            order = lod['vertex_order']
+            self.assertEqual(len(order), len(np.unique(order)))
+            self.assertEqual(len(order) - 1, int(lod['triangles']['vert_ids'].max()))
+            self.assertEqual(job['vectors']['verts'][order].tobytes(), lod['packed_data']['verts'])
+            self.assertEqual(len(lod['triangles']), len(lod['aabbtree'][1]))
+
+    def test_split_terrain_job(self):
+        job = get_grid_job()
+
+        tiles = split_terrain_job(job, job['coords'], 2)
+
+        self.assertEqual([0, 1, 2, 3], [tile_id for tile_id, _ in tiles])
+        self.assertEqual(len(job['triangles']), sum(len(tile['triangles']) for _, tile in tiles))
+        for _, tile in tiles:
+            self.assertEqual(121, tile['vertex_count'])
+            self.assertEqual(job['coords'][tile['source_order']].tolist(), tile['coords'].tolist())
+            self.assertEqual(10.0, float(np.ptp(tile['coords'][:, 0])))
+
+            _, result = process_mesh_job(tile, get_options())
+
+            # the vertex order of the result refers to the vertices of the untiled mesh
+            order = result['vertex_order']
+            self.assertEqual(sorted(tile['source_order'].tolist()), sorted(order.tolist()))
+            self.assertEqual(job['vectors']['verts'][order].tobytes(), result['packed_data']['verts'])
+
+    def test_process_mesh_job_packs_chunks_like_mesh_write(self):
+        job = get_grid_job(size=4)
+
+        _, result = process_mesh_job(job, get_options())
+
+        order = result['vertex_order']
+        for name in ['verts', 'normals']:
+            io_stream = io.BytesIO()
+            write_list([Vector(value) for value in job['vectors'][name][order].tolist()], io_stream, write_vector)
+            self.assertEqual(io_stream.getvalue(), result['packed_data'][name])
+
+        io_stream = io.BytesIO()
+        write_list(result['shade_ids'].tolist(), io_stream, write_long)
+        self.assertEqual(io_stream.getvalue(), result['packed_data']['shade_ids'])
+
+    def test_create_aabb_tree_packs_chunks_like_aabb_tree_write(self):
+        job = get_grid_job(size=4)
+        nodes, poly_indices = build_aabb_nodes(job['coords'], job['triangles']['vert_ids'].astype(np.int64))
+
+        tree = create_aabb_tree(nodes, poly_indices)
+        packed = io.BytesIO()
+        tree.write(packed)
+        tree.packed_data = dict()
+        written = io.BytesIO()
+        tree.write(written)
+
+        self.assertEqual(written.getvalue(), packed.getvalue())
+
+    def test_process_mesh_jobs_matches_serial_processing(self):
+        jobs = [get_grid_job(size=60, name='grid' + str(i)) for i in range(3)]
+        options = get_options()
+
+        results, workers = process_mesh_jobs(jobs, options, max_workers=2)
+
+        # the pool falls back to this process where it can not start, the results must be the same
+        self.assertIn(workers, [0, 2])
+        for job, (messages, result) in zip(jobs, results):
+            expected_messages, expected = process_mesh_job(job, options)
+            self.assertEqual(expected_messages, messages)
+            self.assertEqual(expected['vertex_order'].tolist(), result['vertex_order'].tolist())
+            self.assertEqual(expected['triangles'].tobytes(), result['triangles'].tobytes())
+            self.assertEqual(expected['packed_data'], result['packed_data'])
+            self.assertEqual(expected['sphere'], result['sphere'])
+
+    def test_process_mesh_jobs_processes_small_exports_in_process(self):
+        results, workers = process_mesh_jobs([get_grid_job(size=4)] * 2, get_options(), max_workers=2)
+
+        self.assertEqual(0, workers)
+        self.assertEqual(2, len(results))
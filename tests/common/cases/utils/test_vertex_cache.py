@@ -0,0 +1,37 @@
+# <pep8 compliant>
+# Written by Stephan Vedder and Michael Schnabel
+
+import numpy as np
+
+from io_mesh_w3d.common.utils.vertex_cache import *
+from tests.utils import TestCase
+
+
+def get_grid_indices(size=20):
+    indices = []
+    for y in range(size):
+        for x in range(size):
+            a = y * (size + 1) + x
+            indices.append([a, a + 1, a + size + 1])
+            indices.append([a + 1, a + size + 2, a + size + 1])
+    return np.array(indices)[np.random.default_rng(0).permutation(2 * size * size)]
+
+
+class TestVertexCache(TestCase):
+    def test_average_cache_miss_ratio(self):
+        self.assertEqual(0.0, average_cache_miss_ratio(np.empty((0, 3))))
+        self.assertEqual(3.0, average_cache_miss_ratio([[0, 1, 2]]))
+        self.assertEqual(2.0, average_cache_miss_ratio([[0, 1, 2], [2, 1, 3]]))
+
+    def test_tipsify_returns_permutation_with_lower_acmr(self):
+        indices = get_grid_indices()
+
+        order = tipsify(indices, 21 * 21)
+
+        self.assertEqual(list(range(len(indices))), sorted(order.tolist()))
+        self.assertTrue(average_cache_miss_ratio(indices[order]) < average_cache_miss_ratio(indices))
+
+    def test_first_use_vertex_order(self):
+        order = first_use_vertex_order([[3, 1, 2], [2, 1, 0]], 5)
+
+        self.assertEqual([3, 1, 2, 0, 4], order.tolist())
@@ -67,7 +67,7 @@ def create_volume(context, name, mass, spinniness, contact_tag, location=Vector(
     bmesh.ops.create_cube(b_mesh, size=1)
     b_mesh.to_mesh(mesh)
 
-    prepare_bmesh(context, mesh)
+    triangulate_mesh(mesh)
 
     object = bpy.data.objects.new(mesh.name, mesh)
     object.location = location
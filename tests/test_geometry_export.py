@@ -107,7 +107,7 @@ def create_mesh(context, name):
     bmesh.ops.create_cube(b_mesh, size=1)
     b_mesh.to_mesh(mesh)
 
-    prepare_bmesh(context, mesh)
+    triangulate_mesh(mesh)
 
     object = bpy.data.objects.new(mesh.name, mesh)
 
@@ -124,7 +124,7 @@ def create_shape(context, name, type, contact_point_type, location=Vector((0, 0,
     bmesh.ops.create_cube(b_mesh, size=1)
     b_mesh.to_mesh(mesh)
 
-    prepare_bmesh(context, mesh)
+    triangulate_mesh(mesh)
 
     object = bpy.data.objects.new(mesh.name, mesh)
     object.location = location